@@ -2,12 +2,12 @@
 import streamlit as st
 from datetime import datetime
 from utils import (
-    init_storage, list_projects, save_project, load_project, delete_project,
+    get_storage, list_project_summaries, save_project, fmt_br, load_project, delete_project,
     DEFAULT_PAVIMENTO, ETAPAS_OBRA, DEFAULT_CUSTOS_INDIRETOS, DEFAULT_CUSTOS_INDIRETOS_FIXOS
 )
 
 st.set_page_config(page_title="Estudo de Viabilidade", layout="wide")
-init_storage("projects.json")
+get_storage()
 
 # Injeta CSS para esconder o menu automático
 st.markdown("""
@@ -59,32 +59,57 @@ def page_project_selection():
     
     st.subheader("📂 Projetos Existentes")
     
-    projetos = list_projects()
+    # Apenas o índice de projetos é lido aqui; o projeto completo só é carregado no "Carregar"
+    projetos = list_project_summaries()
     if not projetos:
         st.info("Nenhum projeto encontrado.")
     else:
-        cols = st.columns((1, 4, 2, 1, 1))
+        larguras = (1, 4, 2, 2, 1.5, 1, 1)
+        cols = st.columns(larguras)
         cols[0].markdown("**ID**")
         cols[1].markdown("**Nome do Projeto**")
         cols[2].markdown("**Data de Criação**")
-        cols[3].markdown("**Ação**")
-        cols[4].markdown("**Excluir**")
+        cols[3].markdown("**VGV**")
+        cols[4].markdown("**Margem**")
+        cols[5].markdown("**Ação**")
+        cols[6].markdown("**Excluir**")
 
         for proj in sorted(projetos, key=lambda p: p['id']):
-            cols = st.columns((1, 4, 2, 1, 1))
+            cols = st.columns(larguras)
             cols[0].write(proj['id'])
             cols[1].write(proj['nome'])
             
-            data_criacao = datetime.fromisoformat(proj.get('created_at', '1970-01-01T00:00:00')).strftime('%d/%m/%Y')
+            data_criacao = datetime.fromisoformat(proj.get('created_at') or '1970-01-01T00:00:00').strftime('%d/%m/%Y')
             cols[2].write(data_criacao)
+            cols[3].write(f"R$ {fmt_br(proj.get('vgv_total'))}")
+            margem = proj.get('margem_lucro_percentual')
+            cols[4].write(f"{margem:.2f}%" if margem is not None else "-")
             
-            if cols[3].button("Carregar", key=f"load_{proj['id']}", use_container_width=True):
+            if cols[5].button("Carregar", key=f"load_{proj['id']}", use_container_width=True):
                 st.session_state.projeto_info = load_project(proj['id'])
                 st.switch_page("pages/1_Custos_Diretos.py")
 
-            if cols[4].button("🗑️", key=f"delete_{proj['id']}", use_container_width=True, help=f"Excluir projeto '{proj['nome']}'"):
+            if cols[6].button("🗑️", key=f"delete_{proj['id']}", use_container_width=True, help=f"Excluir projeto '{proj['nome']}'"):
                 delete_project(proj['id'])
                 st.rerun()
 
+def painel_reprecificacao():
+    """Custo direto de todos os projetos pelo catálogo de custos, comparado com o atual."""
+    from cost_catalog import PADROES, obter_catalogo, reprecificar_portfolio
+    with st.expander("🧮 Reprecificar Carteira pelo Catálogo de Custos"):
+        catalogo = obter_catalogo()
+        with st.form("form_reprecificar"):
+            c1, c2, c3 = st.columns(3)
+            mes = c1.selectbox("Mês de referência", catalogo.meses[::-1] or [None], format_func=lambda m: "Valores-base" if m is None else m)
+            regiao = c2.selectbox("Região", [None] + catalogo.regioes, format_func=lambda r: "A de cada projeto" if r is None else r)
+            padrao = c3.selectbox("Padrão", [None] + catalogo.padroes, format_func=lambda p: "O de cada projeto" if p is None else PADROES.get(p, p))
+            enviado = st.form_submit_button("Reprecificar", use_container_width=True)
+        if enviado:
+            tabela = reprecificar_portfolio(get_storage().iter_projects(), mes, regiao, padrao, catalogo)
+            st.caption(f"Variação total do custo direto: R$ {fmt_br(tabela['variacao'].sum())}")
+            st.dataframe(tabela, use_container_width=True, hide_index=True,
+                         column_config={c: st.column_config.NumberColumn(format="%.2f") for c in tabela.columns[4:]})
+
 # A função page_project_selection agora é a única a ser chamada, sem roteamento condicional
 page_project_selection()
+painel_reprecificacao()
@@ -0,0 +1,368 @@
+# ai_analysis.py
+"""
+Análise de viabilidade com I.A. (Google Gemini), com cache em disco das respostas.
+
+A chave do cache é o hash do prompt, do modelo e da configuração de geração: o
+mesmo projeto, sem alterações, gera o mesmo prompt e a resposta é reaproveitada
+por qualquer sessão ou processo que use o mesmo diretório, sem nova chamada à
+API (nem chave da API). As respostas expiram após `AI_CACHE_TTL_H` horas e o
+tamanho total do cache é limitado a `AI_CACHE_MAX_MB`, removendo primeiro as
+usadas há mais tempo.
+
+As chamadas usam uma `requests.Session` compartilhada pelo processo (conexões
+mantidas abertas e reaproveitadas). Na página, a análise é gerada pelo endpoint de
+streaming (`streamGenerateContent`, em SSE) numa thread do pool `AI_WORKERS`, fora
+da thread do script: a página consulta o job periodicamente e exibe o texto à
+medida que chega, e o job pode ser cancelado. Respostas 429/503 são repetidas
+respeitando o `Retry-After` do servidor (ou com espera exponencial, sem ele).
+`GEMINI_API_BASE` aponta as chamadas para outro servidor, como o substituto local
+`tools/gemini_stub_server.py`.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from disk_cache import DiskCache, hash_chave
+from storage import save_json
+
+MODELO = "gemini-2.5-flash-preview-05-20"
+API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com/v1beta")
+GENERATION_CONFIG = {"temperature": 0.5, "topK": 1, "topP": 1, "maxOutputTokens": 2048, "responseMimeType": "text/plain"}
+MAX_TENTATIVAS = 5
+ESPERA_BASE = 1.0  # segundos; dobra a cada nova tentativa quando o servidor não envia Retry-After
+ESPERA_MAXIMA = 60.0
+RETENTAVEIS = (429, 503)
+TIMEOUT = (5, 60)  # (conexão, leitura entre dois trechos da resposta), em segundos
+AI_WORKERS = int(os.environ.get("AI_WORKERS", 4))
+JOB_TTL_SEGUNDOS = 3600
+
+# Textos de benchmark de mercado citados no prompt (pesquisa na web), com a `versao` dos dados.
+# O arquivo é compartilhado pela página e pelo lote `batch_ai`, para que ambos montem o mesmo prompt.
+BENCHMARKS_PATH = os.path.join("data", "market_benchmarks.json")
+_benchmarks = (None, None)  # (mtime, tamanho) do arquivo -> textos lidos
+
+AI_CACHE_DIR = os.environ.get("AI_CACHE_DIR", os.path.join(".cache", "ai"))
+AI_CACHE_MAX_MB = float(os.environ.get("AI_CACHE_MAX_MB", 32))
+AI_CACHE_TTL_H = float(os.environ.get("AI_CACHE_TTL_H", 24 * 7))
+ai_cache = DiskCache(AI_CACHE_DIR, AI_CACHE_MAX_MB * 1024 * 1024, sufixo=".json")
+
+
+def carregar_benchmarks():
+    """Benchmarks em uso (`BENCHMARKS_PATH`), relidos só quando o arquivo muda."""
+    global _benchmarks
+    st = os.stat(BENCHMARKS_PATH)
+    versao, dados = _benchmarks
+    if versao != (st.st_mtime_ns, st.st_size):
+        with open(BENCHMARKS_PATH, encoding="utf-8") as f:
+            dados = json.load(f)
+        _benchmarks = ((st.st_mtime_ns, st.st_size), dados)
+    return dados
+
+
+def salvar_benchmarks(textos, versao=None):
+    """Substitui os textos em uso (os ausentes em `textos` são mantidos) e retorna os benchmarks gravados."""
+    atuais = carregar_benchmarks()
+    dados = {**atuais, **textos}
+    versao = versao or textos.get("versao")
+    if not versao and all(dados[c] == atuais.get(c) for c in dados if c != "versao"):
+        return atuais  # mesmos textos: mantém a versão (e as análises já geradas com ela)
+    dados["versao"] = versao or datetime.now().strftime("%Y-%m-%d %H:%M")
+    save_json(dados, BENCHMARKS_PATH)
+    return dados
+
+
+def montar_prompt(info, modelo, benchmarks=None):
+    """Prompt da análise a partir do projeto e do seu `ViabilityModel` (benchmarks padrão: `carregar_benchmarks()`)."""
+    benchmarks = benchmarks or carregar_benchmarks()
+    d = modelo.indicadores()
+    composicao = {"Custo Direto": d["p_direto"], "Custo Indireto de Venda": d["p_indireto_venda"],
+                  "Custo Indireto de Obra": d["p_indireto_obra"], "Custo do Terreno": d["p_terreno"]}
+    return f"""
+    Act as a senior real estate development viability analyst. Your task is to analyze a project's data and generate a detailed and analytical report in Portuguese.
+
+    The report should have the following sections, formatted with simple numbered headings followed by the content:
+
+    1. Avaliação da Viabilidade Financeira
+    Start with a paragraph summarizing the financial health of the project. Compare the Gross Profit Margin with the following market benchmarks: "{benchmarks['profit_margin_benchmark']}". Explain the implications of the project's Gross Profit and its overall attractiveness.
+
+    2. Análise Detalhada dos Custos
+    Analyze the composition of the Total Cost. Present the absolute values and percentages of each cost type (Direct Cost, Indirect Sales Cost, Indirect Construction Cost, and Land Cost). Use the following context to enrich your analysis: "{benchmarks['cost_proportions_info']}".
+
+    3. Análise de Desempenho por Área
+    Provide and interpret the cost per square meter (m²) indicators for Direct Cost, Indirect Cost, and Total Cost. Compare these costs with the following market benchmark: "{benchmarks['cost_per_sqm_benchmark']}".
+
+    4. Recomendações Estratégicas
+    Provide a list of 3 to 5 actionable strategic recommendations to improve the project's viability. The recommendations should be specific. For example, cite examples of where cost reduction can occur or how revenue can be increased.
+
+    5. Conclusão e Próximos Passos
+    A final paragraph that summarizes the analysis and offers a perspective on the next steps, such as conducting deeper market studies or starting the detailing phase.
+
+    Below is the project data. Use it for the analysis. The values are in Brazilian Reais (R$).
+
+    Project Data:
+    - Name: {info.get('nome', 'Projeto Sem Nome')}
+    - VGV Total: R$ {d['vgv_total']:.2f}
+    - Custo Total: R$ {d['custo_total']:.2f}
+    - Lucro Bruto: R$ {d['lucro_bruto']:.2f}
+    - Margem de Lucro: {d['margem_lucro_percentual']:.2f}%
+    - Custo Direto: R$ {d['custo_direto']:.2f}
+    - Custo Indireto de Venda: R$ {d['custo_indireto_venda']:.2f}
+    - Custo Indireto de Obra: R$ {d['custo_indireto_obra']:.2f}
+    - Custo do Terreno: R$ {d['custo_terreno']:.2f}
+    - Área Privativa: {d['area_privativa']:.2f} m²
+    - Área Construída: {d['area_construida']:.2f} m²
+    - Composição do Custo (%): {composicao}
+    """
+
+
+def chave_analise(prompt, modelo=MODELO, config=GENERATION_CONFIG):
+    return hash_chave(prompt, modelo, config)
+
+
+def analise_em_cache(prompt, modelo=MODELO, config=GENERATION_CONFIG):
+    """Resposta em cache para o prompt ({"texto", "criado_em", "modelo"}), ou None se ausente ou expirada."""
+    chave = chave_analise(prompt, modelo, config)
+    dados = ai_cache.get(chave)
+    if dados is None:
+        return None
+    try:
+        registro = json.loads(dados)
+    except ValueError:
+        registro = None
+    if registro is None or time.time() - registro.get("criado_em", 0) > AI_CACHE_TTL_H * 3600:
+        ai_cache.delete(chave)
+        return None
+    return registro
+
+
+def extrair_texto(resposta):
+    """Texto da primeira candidata de uma resposta do generateContent; ValueError se não houver."""
+    try:
+        return resposta["candidates"][0]["content"]["parts"][0]["text"]
+    except (KeyError, IndexError, TypeError):
+        raise ValueError("a I.A. não retornou uma resposta válida") from None
+
+
+_sessao = None
+_sessao_lock = threading.Lock()
+
+
+def obter_sessao():
+    """Sessão HTTP do processo, com um pool de conexões mantidas abertas para a API."""
+    global _sessao
+    with _sessao_lock:
+        if _sessao is None:
+            _sessao = requests.Session()
+            _sessao.mount("https://", HTTPAdapter(pool_maxsize=max(AI_WORKERS, 10)))
+            _sessao.mount("http://", HTTPAdapter(pool_maxsize=max(AI_WORKERS, 10)))
+            _sessao.headers["Content-Type"] = "application/json"
+        return _sessao
+
+
+def espera_retry(response, tentativa):
+    """Segundos até a próxima tentativa: o `Retry-After` (em segundos ou data HTTP) ou espera exponencial."""
+    valor = response.headers.get("Retry-After")
+    espera = None
+    if valor:
+        try:
+            espera = float(valor)
+        except ValueError:
+            try:
+                espera = (parsedate_to_datetime(valor) - datetime.now(timezone.utc)).total_seconds()
+            except (TypeError, ValueError):
+                espera = None
+    if espera is None:
+        espera = ESPERA_BASE * (2 ** tentativa)
+    return min(max(espera, 0.0), ESPERA_MAXIMA)
+
+
+def _post(metodo, prompt, api_key, modelo, config, stream, cancelado=None, ao_esperar=None, limitador=None):
+    """
+    POST com novas tentativas em 429/503. Retorna a resposta, ou None se `cancelado` for
+    sinalizado durante uma espera. Com um `limitador` (ver `batch_ai.LimitadorTaxa`), cada
+    tentativa espera a sua vez nele e a espera de um 429/503 vale para todas as threads.
+    """
+    payload = {"contents": [{"parts": [{"text": prompt}]}], "generationConfig": config}
+    params = {"key": api_key, **({"alt": "sse"} if stream else {})}
+    for tentativa in range(MAX_TENTATIVAS):
+        if limitador is not None:
+            limitador.aguardar()
+        response = obter_sessao().post(f"{API_BASE}/models/{modelo}:{metodo}", params=params, data=json.dumps(payload),
+                                       stream=stream, timeout=TIMEOUT)
+        if response.status_code in RETENTAVEIS and tentativa < MAX_TENTATIVAS - 1:
+            espera = espera_retry(response, tentativa)
+            response.close()
+            if ao_esperar: ao_esperar(espera)
+            if limitador is not None:
+                limitador.pausar(espera)  # a próxima tentativa espera no limitador
+            elif cancelado is None:
+                time.sleep(espera)
+            elif cancelado.wait(espera):
+                return None
+            continue
+        response.raise_for_status()
+        return response
+
+
+def chamar_api(prompt, api_key, modelo=MODELO, config=GENERATION_CONFIG, ao_esperar=None, limitador=None):
+    """
+    Chama o generateContent e devolve o texto gerado. Em 429/503 tenta de novo
+    (`ao_esperar(segundos)` é chamado antes de cada espera); outros erros HTTP
+    levantam `requests.HTTPError`.
+    """
+    resposta = _post("generateContent", prompt, api_key, modelo, config, stream=False, ao_esperar=ao_esperar, limitador=limitador)
+    return extrair_texto(resposta.json())
+
+
+class Transmissao:
+    """
+    Uma chamada ao streamGenerateContent: iterar devolve os trechos de texto à medida que
+    chegam. `cancelar` pode ser chamado de outra thread; a iteração termina sem erro.
+    """
+
+    def __init__(self, prompt, api_key, modelo=MODELO, config=GENERATION_CONFIG, ao_esperar=None):
+        self.prompt, self.api_key, self.modelo, self.config = prompt, api_key, modelo, config
+        self.ao_esperar = ao_esperar
+        self.cancelado = threading.Event()
+        self._resposta = None
+
+    def cancelar(self):
+        self.cancelado.set()
+        resposta = self._resposta
+        if resposta is not None:
+            resposta.close()  # interrompe uma leitura bloqueada à espera do próximo trecho
+
+    def __iter__(self):
+        resposta = _post("streamGenerateContent", self.prompt, self.api_key, self.modelo, self.config, stream=True,
+                         cancelado=self.cancelado, ao_esperar=self.ao_esperar)
+        if resposta is None:
+            return
+        self._resposta = resposta
+        try:
+            # Cada evento SSE é uma linha "data: {json}" com uma resposta parcial do generateContent
+            for linha in resposta.iter_lines(decode_unicode=True):
+                if self.cancelado.is_set():
+                    return
+                if not linha or not linha.startswith("data:"):
+                    continue
+                evento = json.loads(linha[5:])
+                if "error" in evento:
+                    raise ValueError(evento["error"].get("message", "erro na resposta da I.A."))
+                partes = ((evento.get("candidates") or [{}])[0].get("content") or {}).get("parts") or []
+                texto = "".join(p.get("text", "") for p in partes)
+                if texto:
+                    yield texto
+        except (requests.exceptions.RequestException, AttributeError, OSError):
+            if not self.cancelado.is_set():
+                raise
+        finally:
+            resposta.close()
+
+
+def gerar_analise(prompt, api_key=None, modelo=MODELO, config=GENERATION_CONFIG, usar_cache=True, ao_esperar=None):
+    """
+    Análise do prompt: do cache quando houver (e `usar_cache`), senão da API, gravando
+    no cache. Retorna {"texto", "criado_em", "modelo", "do_cache"}.
+    """
+    if usar_cache:
+        registro = analise_em_cache(prompt, modelo, config)
+        if registro is not None:
+            return {**registro, "do_cache": True}
+    if not api_key:
+        raise ValueError("chave da API não informada")
+    return {**gravar_analise(prompt, chamar_api(prompt, api_key, modelo, config, ao_esperar), modelo, config), "do_cache": False}
+
+
+def gravar_analise(prompt, texto, modelo=MODELO, config=GENERATION_CONFIG):
+    """Grava no cache a análise gerada para o prompt e retorna o registro."""
+    registro = {"texto": texto, "criado_em": time.time(), "modelo": modelo}
+    ai_cache.set(chave_analise(prompt, modelo, config), json.dumps(registro, ensure_ascii=False).encode("utf-8"))
+    return registro
+
+
+# --- Jobs em segundo plano (página de Resultados) ---
+_executor = None
+_jobs = {}
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=AI_WORKERS, thread_name_prefix="analise-ia")
+        return _executor
+
+
+def _executar_job(job):
+    try:
+        for trecho in job["transmissao"]:
+            job["estado"], job["aviso"] = "gerando", None
+            job["partes"].append(trecho)
+        if job["transmissao"].cancelado.is_set():
+            job["estado"] = "cancelado"
+            return
+        texto = "".join(job["partes"])
+        if not texto.strip():
+            raise ValueError("a I.A. não retornou uma resposta válida")
+        job["resultado"] = {**gravar_analise(job["prompt"], texto, job["modelo"], job["config"]), "do_cache": False}
+        job["estado"] = "concluido"
+    except requests.exceptions.HTTPError as e:
+        job["erro"], job["estado"] = f"{e.response.status_code} - {e.response.text}", "erro"
+    except Exception as e:  # o erro é exibido na página
+        job["erro"], job["estado"] = str(e), "erro"
+
+
+def submit_analise(prompt, api_key=None, modelo=MODELO, config=GENERATION_CONFIG, usar_cache=True):
+    """Agenda a análise e retorna o id do job. Análises em cache ficam prontas na hora."""
+    _limpar_jobs_antigos()
+    job_id = uuid.uuid4().hex
+    job = {"prompt": prompt, "modelo": modelo, "config": config, "criado_em": time.time(), "estado": "na_fila",
+           "partes": [], "aviso": None, "resultado": None, "erro": None, "transmissao": None}
+    registro = analise_em_cache(prompt, modelo, config) if usar_cache else None
+    if registro is not None:
+        job["resultado"], job["estado"] = {**registro, "do_cache": True}, "concluido"
+    elif not api_key:
+        job["erro"], job["estado"] = "chave da API não informada", "erro"
+    else:
+        job["transmissao"] = Transmissao(prompt, api_key, modelo, config,
+                                         ao_esperar=lambda s: job.update(estado="aguardando", aviso=f"Limite de taxa atingido. Tentando novamente em {s:.1f} segundos..."))
+        _get_executor().submit(_executar_job, job)
+    with _lock:
+        _jobs[job_id] = job
+    return job_id
+
+
+def analise_status(job_id):
+    """
+    Retorna (estado, texto até agora, resultado, aviso ou erro), com estado em "desconhecido",
+    "na_fila", "aguardando" (esperando para repetir após 429/503), "gerando", "concluido",
+    "cancelado" ou "erro".
+    """
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return "desconhecido", "", None, None
+    return job["estado"], "".join(job["partes"]), job["resultado"], job["erro"] or job["aviso"]
+
+
+def cancel_analise(job_id):
+    with _lock:
+        job = _jobs.pop(job_id, None)
+    if job and job["transmissao"] is not None:
+        job["transmissao"].cancelar()
+
+
+def _limpar_jobs_antigos():
+    limite = time.time() - JOB_TTL_SEGUNDOS
+    with _lock:
+        for job_id in [j for j, job in _jobs.items() if job["criado_em"] < limite]:
+            del _jobs[job_id]
@@ -0,0 +1,200 @@
+# batch_ai.py
+"""
+Análise de viabilidade com I.A. de todos os projetos, em lote e sem o Streamlit.
+
+Para cada projeto é montado o mesmo prompt da página de Resultados, com os
+benchmarks de mercado em uso (`ai_analysis.BENCHMARKS_PATH`). `--benchmarks` grava
+novos textos nesse arquivo antes do lote, e a página passa a usá-los também, de modo
+que as análises geradas aqui continuam valendo lá. As chamadas são feitas por um
+pool de `--concorrencia` threads. Um token bucket compartilhado limita as
+requisições a `--taxa` por segundo; um 429/503 pausa todas as threads pelo
+`Retry-After` do servidor e reduz a taxa pela metade pelo resto do lote.
+
+O resultado é gravado no próprio projeto (`analise_ia`) e no cache de análises,
+de modo que a página de Resultados o exibe sem nova chamada. Projetos cuja análise
+gravada corresponde ao prompt atual são pulados (retomada após interrupção), e
+prompts já no cache não chamam a API.
+
+Uso:
+    python -m batch_ai [--backend sqlite|json] [--concorrencia 4] [--taxa 1.0] [--benchmarks mercado.json]
+                       [--ids 1 2 3] [--forcar] [--saida resumo.csv]
+    python -m batch_ai --api mock [--mock-falhas 3] [--mock-atraso 0.2]   (offline, sem chave)
+A chave da API vem de `--api-key` ou da variável de ambiente `GEMINI_API_KEY`.
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+import ai_analysis
+from ai_analysis import (BENCHMARKS_PATH, MODELO, analise_em_cache, carregar_benchmarks, chamar_api, chave_analise, gravar_analise,
+                         montar_prompt, salvar_benchmarks)
+from storage import BACKENDS, create_storage
+from utils import normalize_project
+from viability import ViabilityModel
+
+COLUNAS = ("id", "nome", "status", "segundos", "caracteres", "erro")
+
+
+class LimitadorTaxa:
+    """
+    Token bucket compartilhado pelas threads: `taxa` requisições por segundo, com rajadas
+    de até `capacidade`. `pausar` (num 429/503) bloqueia todas as threads até o fim da
+    espera e reduz a taxa pela metade, até `taxa_minima`.
+    """
+
+    def __init__(self, taxa, capacidade=None, taxa_minima=None):
+        self.taxa = float(taxa)
+        self.capacidade = float(capacidade or max(1.0, self.taxa))
+        self.taxa_minima = float(taxa_minima or self.taxa / 8)
+        self.pausas = 0
+        self._tokens = self.capacidade
+        self._ultimo = time.monotonic()
+        self._pausa_ate = 0.0
+        self._lock = threading.Lock()
+
+    def aguardar(self):
+        while True:
+            with self._lock:
+                agora = time.monotonic()
+                if agora < self._pausa_ate:
+                    espera = self._pausa_ate - agora
+                else:
+                    self._tokens = min(self.capacidade, self._tokens + (agora - self._ultimo) * self.taxa)
+                    self._ultimo = agora
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    espera = (1 - self._tokens) / self.taxa
+            time.sleep(espera)
+
+    def pausar(self, segundos):
+        with self._lock:
+            self._pausa_ate = max(self._pausa_ate, time.monotonic() + segundos)
+            # Recomeça sem saldo: a pausa não acumula tokens para uma rajada logo em seguida
+            self._tokens, self._ultimo = 0.0, self._pausa_ate
+            self.taxa = max(self.taxa_minima, self.taxa / 2)
+            self.pausas += 1
+
+
+def _analisar(prompt, api_key, limitador):
+    """Executado numa thread do pool."""
+    inicio = time.perf_counter()
+    texto = chamar_api(prompt, api_key, limitador=limitador)
+    return texto, time.perf_counter() - inicio
+
+
+def analisar_todos(storage, api_key, concorrencia=4, taxa=1.0, benchmarks=None, ids=None, forcar=False, log=print):
+    """
+    Gera as análises pendentes, grava-as nos projetos e retorna as linhas do resumo (uma por projeto).
+    `benchmarks` padrão: os em uso (`carregar_benchmarks()`).
+    """
+    benchmarks = benchmarks or carregar_benchmarks()
+    limitador = LimitadorTaxa(taxa)
+    linhas = []
+    pendentes = {}
+
+    def gravar(info, prompt, registro, status, segundos=0.0):
+        # Só a thread principal grava no armazenamento (os backends não aceitam escritas concorrentes da mesma conexão).
+        # Grava apenas `analise_ia`: o restante de `info` pode ter sido editado no app desde que foi lido.
+        storage.update_project_field(info["id"], "analise_ia", {**registro, "chave": chave_analise(prompt),
+                                                                "benchmarks": benchmarks.get("versao")})
+        linhas.append({"id": info["id"], "nome": info.get("nome", ""), "status": status, "segundos": segundos,
+                       "caracteres": len(registro["texto"]), "erro": ""})
+        log(f"[{len(linhas)}] #{info['id']} {info.get('nome', '')}: {status} ({segundos:.2f} s)")
+
+    def coletar(concluidos):
+        for future in concluidos:
+            info, prompt = pendentes.pop(future)
+            try:
+                texto, segundos = future.result()
+            except Exception as e:
+                linhas.append({"id": info["id"], "nome": info.get("nome", ""), "status": "erro", "segundos": 0.0, "caracteres": 0, "erro": str(e)})
+                log(f"[{len(linhas)}] #{info['id']} {info.get('nome', '')}: erro: {e}")
+                continue
+            gravar(info, prompt, gravar_analise(prompt, texto), "gerado", segundos)
+
+    with ThreadPoolExecutor(max_workers=concorrencia, thread_name_prefix="batch-ia") as executor:
+        for info in storage.iter_projects():
+            if ids and info["id"] not in ids:
+                continue
+            info = normalize_project(info)
+            prompt = montar_prompt(info, ViabilityModel(info), benchmarks)
+            if not forcar:
+                if (info.get("analise_ia") or {}).get("chave") == chave_analise(prompt):
+                    linhas.append({"id": info["id"], "nome": info.get("nome", ""), "status": "inalterado", "segundos": 0.0,
+                                   "caracteres": len(info["analise_ia"].get("texto", "")), "erro": ""})
+                    continue
+                registro = analise_em_cache(prompt)
+                if registro is not None:
+                    gravar(info, prompt, registro, "cache")
+                    continue
+            # Limita os jobs em andamento para não carregar todos os projetos na memória de uma vez
+            while len(pendentes) >= concorrencia * 2:
+                coletar(wait(pendentes, return_when=FIRST_COMPLETED).done)
+            pendentes[executor.submit(_analisar, prompt, api_key, limitador)] = (info, prompt)
+        while pendentes:
+            coletar(wait(pendentes, return_when=FIRST_COMPLETED).done)
+    if limitador.pausas:
+        log(f"{limitador.pausas} pausa(s) por limite de taxa; taxa final {limitador.taxa:.2f} req/s")
+    return linhas
+
+
+def gravar_resumo(linhas, destino):
+    with open(destino, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=COLUNAS, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(sorted(linhas, key=lambda l: l["id"]))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Gera a análise com I.A. de todos os projetos.")
+    parser.add_argument("--backend", choices=BACKENDS, default=os.environ.get("STORAGE_BACKEND", "sqlite"))
+    parser.add_argument("--concorrencia", type=int, default=4, help="chamadas simultâneas à API (padrão: 4)")
+    parser.add_argument("--taxa", type=float, default=1.0, help="requisições por segundo (padrão: 1)")
+    parser.add_argument("--benchmarks", help=f"JSON com novos textos de benchmark de mercado (mesmas chaves de {BENCHMARKS_PATH}); "
+                                             "passam a ser os textos em uso, também na página")
+    parser.add_argument("--ids", type=int, nargs="+", help="analisa apenas estes projetos")
+    parser.add_argument("--forcar", action="store_true", help="gera de novo mesmo com análise gravada ou em cache")
+    parser.add_argument("--saida", help="grava o resumo (um projeto por linha) neste CSV")
+    parser.add_argument("--api", choices=("gemini", "mock"), default="gemini",
+                        help="mock: servidor local com respostas prontas (tools/gemini_stub_server.py)")
+    parser.add_argument("--api-key", default=os.environ.get("GEMINI_API_KEY"))
+    parser.add_argument("--mock-falhas", type=int, default=0, help="mock: quantas das primeiras requisições recebem 429")
+    parser.add_argument("--mock-atraso", type=float, default=0.2, help="mock: segundos por resposta")
+    args = parser.parse_args(argv)
+
+    benchmarks = carregar_benchmarks()
+    if args.benchmarks:
+        with open(args.benchmarks, encoding="utf-8") as f:
+            benchmarks = salvar_benchmarks(json.load(f))
+        print(f"Benchmarks versão {benchmarks['versao']} gravados em {BENCHMARKS_PATH}.", file=sys.stderr)
+    api_key = args.api_key
+    if args.api == "mock":
+        sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "tools"))
+        from gemini_stub_server import iniciar
+        _, ai_analysis.API_BASE = iniciar(atraso=args.mock_atraso, falhas=args.mock_falhas)
+        api_key = "mock"
+    elif not api_key:
+        print("Informe a chave da API (--api-key ou GEMINI_API_KEY).", file=sys.stderr)
+        return 2
+
+    inicio = time.perf_counter()
+    linhas = analisar_todos(create_storage(args.backend), api_key, args.concorrencia, args.taxa, benchmarks,
+                            set(args.ids) if args.ids else None, args.forcar)
+    if args.saida:
+        gravar_resumo(linhas, args.saida)
+    contagem = {}
+    for linha in linhas:
+        contagem[linha["status"]] = contagem.get(linha["status"], 0) + 1
+    print(f"{len(linhas)} projetos em {time.perf_counter() - inicio:.1f} s ({MODELO}): "
+          + ", ".join(f"{n} {status}" for status, n in sorted(contagem.items())), file=sys.stderr)
+    return 1 if contagem.get("erro") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
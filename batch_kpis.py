@@ -0,0 +1,113 @@
+# batch_kpis.py
+"""
+Cálculo dos indicadores de viabilidade de todos os projetos, sem o Streamlit.
+
+Para cada projeto são calculados os mesmos KPIs da página de Resultados (VGV,
+custo total, lucro bruto, margem, composição dos custos e custos por m²), e as
+linhas são gravadas em CSV ou Parquet à medida que são calculadas. Os projetos
+são lidos um a um (leitura incremental do JSON ou cursor do SQLite), então a
+memória usada não cresce com o tamanho da carteira.
+
+Uso:
+    python -m batch_kpis --saida kpis.csv [--entrada projects.json | --backend sqlite|json]
+    python -m batch_kpis --saida kpis.parquet     (requer pyarrow)
+    python -m batch_kpis --saida -                (CSV na saída padrão)
+"""
+import argparse
+import csv
+import os
+import sys
+import time
+
+from storage import BACKENDS, create_storage, iter_json_array
+from viability import ViabilityModel
+
+COLUNAS = (
+    "id", "nome", "vgv_total", "custo_total", "lucro_bruto", "margem_lucro_percentual",
+    "custo_direto", "custo_indireto_venda", "custo_indireto_obra", "custo_terreno",
+    "p_direto", "p_indireto_venda", "p_indireto_obra", "p_terreno",
+    "custo_direto_m2", "custo_indireto_m2", "custo_total_m2",
+    "area_privativa", "area_terreno", "area_construida",
+)
+FORMATOS = ("csv", "parquet")
+LOTE_PARQUET = 10_000  # linhas por row group
+
+
+def calcular_linhas(projetos, erros=None):
+    """Gera uma linha de KPIs por projeto. Projetos com erro são pulados e contados em `erros`."""
+    for info in projetos:
+        try:
+            linha = ViabilityModel(info).indicadores()
+        except Exception as e:
+            if erros is not None:
+                erros.append((info.get("id"), str(e)))
+            continue
+        linha["id"] = info.get("id")
+        linha["nome"] = info.get("nome", "")
+        yield linha
+
+
+def gravar_csv(linhas, destino):
+    f = sys.stdout if destino == "-" else open(destino, "w", newline="", encoding="utf-8")
+    try:
+        writer = csv.DictWriter(f, fieldnames=COLUNAS, extrasaction="ignore")
+        writer.writeheader()
+        n = 0
+        for linha in linhas:
+            writer.writerow(linha)
+            n += 1
+        return n
+    finally:
+        if f is not sys.stdout:
+            f.close()
+
+
+def gravar_parquet(linhas, destino, lote=LOTE_PARQUET):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise SystemExit("Exportação em Parquet requer o pacote pyarrow (pip install pyarrow).")
+    schema = pa.schema([("id", pa.int64()), ("nome", pa.string())] + [(c, pa.float64()) for c in COLUNAS[2:]])
+    n = 0
+    with pq.ParquetWriter(destino, schema) as writer:
+        buffer = []
+        for linha in linhas:
+            buffer.append(linha)
+            if len(buffer) >= lote:
+                writer.write_table(pa.Table.from_pylist(buffer, schema=schema))
+                n += len(buffer)
+                buffer = []
+        if buffer or n == 0:
+            writer.write_table(pa.Table.from_pylist(buffer, schema=schema))
+            n += len(buffer)
+    return n
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Calcula os KPIs de viabilidade de todos os projetos.")
+    parser.add_argument("--saida", required=True, help="arquivo .csv ou .parquet ('-' para CSV na saída padrão)")
+    parser.add_argument("--formato", choices=FORMATOS, help="padrão: deduzido pela extensão da saída")
+    origem = parser.add_mutually_exclusive_group()
+    origem.add_argument("--entrada", help="arquivo JSON com a lista de projetos (ex.: projects.json)")
+    origem.add_argument("--backend", choices=BACKENDS, help="lê do armazenamento configurado (padrão: STORAGE_BACKEND)")
+    args = parser.parse_args(argv)
+
+    formato = args.formato or ("parquet" if args.saida.endswith(".parquet") else "csv")
+    if args.entrada:
+        projetos = iter_json_array(args.entrada)
+    else:
+        projetos = create_storage(args.backend or os.environ.get("STORAGE_BACKEND", "sqlite")).iter_projects()
+
+    inicio = time.perf_counter()
+    erros = []
+    linhas = calcular_linhas(projetos, erros)
+    n = gravar_parquet(linhas, args.saida) if formato == "parquet" else gravar_csv(linhas, args.saida)
+    for pid, erro in erros:
+        print(f"Projeto {pid}: {erro}", file=sys.stderr)
+    print(f"{n} projetos em {time.perf_counter() - inicio:.1f} s ({len(erros)} com erro)", file=sys.stderr)
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,87 @@
+# benchmarks/bench_pdf_render.py
+"""
+Tempo de renderização do relatório PDF: fontes locais x fontes do Google Fonts.
+
+Cenários:
+- local:            assets/ embutidos, FontConfiguration e CSS reaproveitados (caminho atual);
+- local_sem_reuso:  assets/ embutidos, mas FontConfiguration e CSS recriados a cada renderização;
+- remoto:           HTML antigo, com <link> para fonts.googleapis.com (depende da rede);
+- remoto_sem_rede:  HTML antigo apontando para um endereço não roteável, simulando um
+                    servidor sem acesso externo (a renderização espera o timeout da conexão).
+
+Uso: python benchmarks/bench_pdf_render.py [--repeticoes 5] [--pavimentos 50] [--cenarios local remoto ...]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import (  # noqa: E402
+    ETAPAS_OBRA, DEFAULT_CUSTOS_INDIRETOS, TIPOS_PAVIMENTO, ASSETS_DIR, REPORT_CSS_PATH,
+    build_report_html, render_pdf,
+)
+from viability import ViabilityModel  # noqa: E402
+
+LINK_GOOGLE_FONTS = '<link href="https://fonts.googleapis.com/css2?family=Roboto:wght@400;700&display=swap" rel="stylesheet">'
+LINK_SEM_REDE = '<link href="http://10.255.255.1/css2?family=Roboto:wght@400;700&display=swap" rel="stylesheet">'
+CENARIOS = ("local", "local_sem_reuso", "remoto", "remoto_sem_rede")
+
+
+def projeto_sintetico(n_pavimentos):
+    tipos = list(TIPOS_PAVIMENTO)
+    return {
+        "nome": "Benchmark", "area_terreno": 1500.0, "area_privativa": 8000.0, "num_unidades": 80,
+        "custos_config": {"custo_terreno_m2": 2500.0, "custo_area_privativa": 4500.0, "preco_medio_venda_m2": 10000.0},
+        "etapas_percentuais": {e: {"percentual": v[1], "fonte": "Manual"} for e, v in ETAPAS_OBRA.items()},
+        "custos_indiretos_percentuais": {i: {"percentual": v[1], "fonte": "Manual"} for i, v in DEFAULT_CUSTOS_INDIRETOS.items()},
+        "pavimentos": [{"nome": f"Pav {i}", "tipo": tipos[i % len(tipos)], "rep": 1 + i % 4, "coef": TIPOS_PAVIMENTO[tipos[i % len(tipos)]][0],
+                        "area": 100.0 + i, "constr": True} for i in range(n_pavimentos)],
+    }
+
+
+def _html_legado(html, link):
+    """Reproduz o HTML antigo: link externo de fontes e CSS embutido no documento."""
+    with open(REPORT_CSS_PATH, encoding="utf-8") as f:
+        css = f.read()
+    css = css[css.index("@page"):]  # sem os @font-face locais
+    return html.replace("<head>", f"<head>\n{link}\n<style>{css}</style>", 1)
+
+
+def renderizar(cenario, html):
+    from weasyprint import HTML, CSS
+    from weasyprint.text.fonts import FontConfiguration
+    if cenario == "local":
+        return render_pdf(html)
+    if cenario == "local_sem_reuso":
+        font_config = FontConfiguration()
+        css = CSS(filename=REPORT_CSS_PATH, font_config=font_config)
+        return HTML(string=html, base_url=ASSETS_DIR).write_pdf(stylesheets=[css], font_config=font_config)
+    link = LINK_GOOGLE_FONTS if cenario == "remoto" else LINK_SEM_REDE
+    font_config = FontConfiguration()
+    return HTML(string=_html_legado(html, link)).write_pdf(font_config=font_config)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeticoes", type=int, default=5)
+    parser.add_argument("--pavimentos", type=int, default=50)
+    parser.add_argument("--cenarios", nargs="+", choices=CENARIOS, default=list(CENARIOS))
+    args = parser.parse_args()
+
+    info = projeto_sintetico(args.pavimentos)
+    html = build_report_html(info, ViabilityModel.from_project(info))
+    print(f"{'cenário':<18} {'mediana (s)':>12} {'mín (s)':>10} {'máx (s)':>10}")
+    for cenario in args.cenarios:
+        tempos = []
+        for _ in range(args.repeticoes):
+            inicio = time.perf_counter()
+            renderizar(cenario, html)
+            tempos.append(time.perf_counter() - inicio)
+        print(f"{cenario:<18} {statistics.median(tempos):>12.3f} {min(tempos):>10.3f} {max(tempos):>10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,320 @@
+# benchmarks/bench_suite.py
+"""
+Suíte de benchmarks dos caminhos críticos: cálculo, armazenamento e relatório.
+
+Grupos (todos offline, com projetos sintéticos em diretórios temporários):
+- fmt:            `fmt_br` (um a um) e `fmt_br_array` (em lote) aplicados a N valores;
+- pavimentos:     `calcular_pavimentos` e `ViabilityModel` com N pavimentos;
+- redistribuicao: `handle_percentage_redistribution` com N itens;
+- storage:        `save_project`, `load_project`, `list_projects` e `list_project_summaries`
+                  com N projetos já gravados, nos backends JSON e SQLite;
+- historico:      `save_to_historico`, a leitura direta do histórico e a consulta ao cache
+                  (`obter_historico`) com N entradas já no histórico;
+- colunar:        `acrescentar` (uma entrada), `percentis`, `tendencia` e filtro por data no
+                  histórico colunar com N entradas;
+- similares:      montagem do índice e busca das obras semelhantes num histórico de N entradas;
+- catalogo:       compilação do catálogo de custos (27 regiões × 60 meses), N consultas de
+                  custo por m² e a reprecificação de uma carteira de N projetos;
+- pdf:            `generate_pdf_report` (sem cache) com 10 a 5.000 pavimentos
+                  (pulado se o WeasyPrint não puder ser carregado).
+
+Os resultados (mediana por caso) podem ser gravados como baseline em JSON e
+comparados nas execuções seguintes; casos mais lentos que a baseline além da
+tolerância são listados como regressão e o script termina com código 1.
+A baseline depende da máquina: gere-a no mesmo ambiente em que for comparada.
+
+Uso:
+    python benchmarks/bench_suite.py --atualizar-baseline        # grava benchmarks/baseline.json
+    python benchmarks/bench_suite.py                             # compara com a baseline
+    python benchmarks/bench_suite.py --escalas 10 1000 --grupos fmt storage --tolerancia 0.3
+"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+from streamlit import config as st_config  # noqa: E402
+from streamlit.logger import set_log_level  # noqa: E402
+
+import cost_catalog  # noqa: E402
+import historico  # noqa: E402
+import historico_colunar  # noqa: E402
+import storage  # noqa: E402
+import utils  # noqa: E402
+from bench_pdf_render import projeto_sintetico  # noqa: E402
+from disk_cache import DiskCache  # noqa: E402
+from similares import projetos_similares  # noqa: E402
+from storage import JSONStorage, SQLiteStorage, save_json  # noqa: E402
+from viability import ViabilityModel, calcular_pavimentos  # noqa: E402
+
+# Sem os avisos de "bare mode" a cada chamada a st.* fora do `streamlit run`. O nível definido por
+# set_log_level é refeito quando o Streamlit lê a configuração (na primeira chamada a st.*), então o
+# aviso de "missing ScriptRunContext" é desligado no próprio logger.
+set_log_level("error")
+logging.getLogger("streamlit.runtime.scriptrunner_utils.script_run_context").disabled = True
+st_config.set_option("global.showWarningOnDirectExecution", False)
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+ESCALAS = (10, 1_000, 100_000)
+PAVIMENTOS_PDF = (10, 100, 1_000, 5_000)
+GRUPOS = ("fmt", "pavimentos", "redistribuicao", "storage", "historico", "colunar", "similares", "catalogo", "pdf")
+# Diferenças absolutas abaixo disso são ruído de medição, mesmo que a razão seja grande
+RUIDO_S = 0.001
+
+
+def medir(fn, preparar=None, tempo_min=0.2, rep_min=3, rep_max=50, tempo_max=10.0):
+    """
+    Executa `fn` até somar `tempo_min` segundos (entre rep_min e rep_max vezes).
+    Casos muito lentos param ao passar de `tempo_max`. `preparar` não é cronometrado.
+    """
+    tempos = []
+    while not tempos or (len(tempos) < rep_min and sum(tempos) < tempo_max) or (sum(tempos) < tempo_min and len(tempos) < rep_max):
+        if preparar:
+            preparar()
+        inicio = time.perf_counter()
+        fn()
+        tempos.append(time.perf_counter() - inicio)
+    return {"mediana_s": statistics.median(tempos), "min_s": min(tempos), "repeticoes": len(tempos)}
+
+
+def projeto_leve(i):
+    """Projeto pequeno (3 pavimentos) para popular o armazenamento."""
+    info = projeto_sintetico(3)
+    info.update(id=i, nome=f"Projeto {i}", created_at="2024-01-01T00:00:00", updated_at="2024-01-01T00:00:00")
+    return info
+
+
+def bench_fmt(n):
+    valores = np.random.default_rng(0).uniform(-1e7, 1e9, n)
+    valores[::97] = np.nan
+    yield f"fmt_br[n={n}]", medir(lambda: [utils.fmt_br(v) for v in valores])
+    yield f"fmt_br_array[n={n}]", medir(lambda: utils.fmt_br_array(valores))
+
+
+def bench_pavimentos(n):
+    info = projeto_sintetico(n)
+    custo = info["custos_config"]["custo_area_privativa"]
+    yield f"calcular_pavimentos[n={n}]", medir(lambda: calcular_pavimentos(info["pavimentos"], custo))
+    yield f"ViabilityModel[n={n}]", medir(lambda: ViabilityModel(info))
+
+
+def bench_redistribuicao(n):
+    chaves = [f"Item {i}" for i in range(n)]
+    constantes = {k: (0.0, 100.0 / n, 100.0) for k in chaves}
+    estado = utils.st.session_state
+
+    def preparar():
+        estado["bench_pct"] = {k: {"percentual": 100.0 / n, "fonte": "Manual"} for k in chaves}
+        estado["previous_bench_pct"] = {k: v.copy() for k, v in estado["bench_pct"].items()}
+        estado["bench_pct"][chaves[0]]["percentual"] += 1.0  # a edição do usuário
+    yield f"handle_percentage_redistribution[n={n}]", medir(
+        lambda: utils.handle_percentage_redistribution("bench_pct", constantes), preparar)
+
+
+def _popular(diretorio, n):
+    """Grava N projetos e N entradas de histórico em arquivos JSON e num banco SQLite."""
+    caminhos = {"projects": os.path.join(diretorio, "projects.json"),
+                "direto": os.path.join(diretorio, "historico_direto.json"),
+                "indireto": os.path.join(diretorio, "historico_indireto.json"),
+                "indice": os.path.join(diretorio, "projects_index.json"),
+                "db": os.path.join(diretorio, "bench.db")}
+    save_json([projeto_leve(i) for i in range(1, n + 1)], caminhos["projects"])
+    percentuais = {e: v[1] for e, v in utils.ETAPAS_OBRA.items()}
+    historico = [{"id": i, "nome": f"Projeto {i}", "data": "2024-01-01", "percentuais": percentuais} for i in range(1, n + 1)]
+    save_json(historico, caminhos["direto"])
+    save_json([], caminhos["indireto"])
+    historico_paths = {"direto": caminhos["direto"], "indireto": caminhos["indireto"]}
+    backends = {
+        "json": JSONStorage(caminhos["projects"], historico_paths, caminhos["indice"]),
+        "sqlite": SQLiteStorage(caminhos["db"]),
+    }
+    backends["sqlite"].import_json(caminhos["projects"], historico_paths)
+    return backends
+
+
+def bench_storage(n, grupos):
+    with tempfile.TemporaryDirectory() as diretorio:
+        backends = _popular(diretorio, n)
+        for nome, backend in backends.items():
+            storage._storage = backend  # as funções de utils usam get_storage()
+            historico_colunar.DIRETORIO = os.path.join(diretorio, f"colunar_{nome}")
+            utils.list_project_summaries()  # constrói o índice antes de medir
+            meio = n // 2 + 1
+            if "storage" in grupos:
+                info = utils.load_project(meio)
+                yield f"save_project[{nome},n={n}]", medir(lambda: utils.save_project(info))
+                yield f"load_project[{nome},n={n}]", medir(lambda: utils.load_project(meio))
+                yield f"list_projects[{nome},n={n}]", medir(utils.list_projects)
+                yield f"list_project_summaries[{nome},n={n}]", medir(utils.list_project_summaries)
+            if "historico" in grupos:
+                info = projeto_leve(meio)
+                yield f"save_to_historico[{nome},n={n}]", medir(lambda: utils.save_to_historico(info, "direto"), rep_max=20)
+                yield f"load_historico[{nome},n={n}]", medir(lambda: backend.load_historico("direto"))
+                yield f"obter_historico[{nome},n={n}]", medir(lambda: historico.obter_historico("direto"))
+        storage._storage = None
+        historico_colunar.DIRETORIO = "historico_colunar"
+
+
+def entradas_historico(n, seed=0):
+    """Histórico sintético: percentuais dentro das faixas das etapas, atributos e mix de pavimentos."""
+    rng = np.random.default_rng(seed)
+    faixas = np.array(list(utils.ETAPAS_OBRA.values()))
+    percentuais = rng.uniform(faixas[:, 0], faixas[:, 2], (n, len(faixas)))
+    tipos = list(utils.TIPOS_PAVIMENTO)[:8]
+    entradas = []
+    for i in range(n):
+        mix = rng.dirichlet(np.ones(3))
+        entradas.append({"id": i + 1, "nome": f"Obra {i + 1}", "data": str(np.datetime64("2020-01-01") + int(rng.integers(0, 1800))),
+                         "percentuais": dict(zip(utils.ETAPAS_OBRA, percentuais[i].tolist())),
+                         "atributos": {"area_privativa": float(rng.uniform(500, 20_000)), "area_terreno": float(rng.uniform(300, 5_000)),
+                                       "num_unidades": int(rng.integers(4, 300)), "num_pavimentos": int(rng.integers(1, 40))},
+                         "mix_pavimentos": dict(zip(rng.choice(tipos, 3, replace=False).tolist(), mix.tolist()))})
+    return entradas
+
+
+def bench_colunar(n):
+    entradas = entradas_historico(n)
+    with tempfile.TemporaryDirectory() as diretorio:
+        colunar = historico_colunar.HistoricoColunar(diretorio)
+        colunar.reconstruir(entradas)
+        nova = dict(entradas[-1])
+
+        def acrescentar():
+            nova["id"] += 1
+            colunar.acrescentar([nova])
+        yield f"colunar_acrescentar[n={n}]", medir(acrescentar, rep_max=20)
+        yield f"colunar_percentis[n={n}]", medir(colunar.percentis)
+        yield f"colunar_tendencia[n={n}]", medir(lambda: colunar.tendencia("M"))
+        yield f"colunar_filtro_data[n={n}]", medir(lambda: colunar.percentis(mascara=colunar.filtro("2024-01-01", "2024-06-30")))
+
+
+def bench_similares(n):
+    entradas = entradas_historico(n)
+    yield f"indice_similares[n={n}]", medir(lambda: historico.Historico(entradas).indice, rep_max=5)
+    hist = historico.Historico(entradas)
+    info = projeto_leve(0)
+    percentuais = entradas[0]["percentuais"]
+    yield f"projetos_similares[n={n}]", medir(lambda: projetos_similares(hist, info, percentuais, k=10))
+
+
+def bench_catalogo(n):
+    rng = np.random.default_rng(0)
+    with open(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), cost_catalog.PARAMETROS_PATH), encoding="utf-8") as f:
+        parametros = json.load(f)
+    regioes = [f"R{i:02d}" for i in range(27)]
+    meses = [f"{2020 + m // 12}-{m % 12 + 1:02d}" for m in range(60)]
+    padroes = list(parametros)
+    tabelas = {(r, m): pd.DataFrame({"padrao": padroes, "custo_m2": rng.uniform(1500, 5000, len(padroes))})
+               for r in regioes for m in meses}
+    yield "catalogo_compilar[27x60]", medir(lambda: cost_catalog.Catalogo(parametros, tabelas), rep_max=5)
+    catalogo = cost_catalog.Catalogo(parametros, tabelas)
+    consulta = (rng.choice(regioes, n), rng.choice(meses, n), rng.choice(padroes, n))
+    yield f"catalogo_custo_m2[n={n}]", medir(lambda: catalogo.custo_m2(*consulta))
+    projetos = [projeto_leve(i) for i in range(n)]
+    yield f"reprecificar_portfolio[n={n}]", medir(lambda: cost_catalog.reprecificar_portfolio(projetos, meses[-1], "R01", catalogo=catalogo))
+
+
+def bench_pdf(n):
+    with tempfile.TemporaryDirectory() as diretorio:
+        utils.pdf_cache = DiskCache(diretorio, 1 << 30, sufixo=".pdf")
+        info = projeto_sintetico(n)
+        modelo = ViabilityModel(info)
+        yield f"generate_pdf_report[pavimentos={n}]", medir(
+            lambda: utils.generate_pdf_report(info, modelo), utils.pdf_cache.clear, tempo_min=1.0, rep_min=1, rep_max=5)
+
+
+def pdf_disponivel():
+    try:
+        utils.get_render_resources()
+        return True
+    except Exception as e:  # WeasyPrint ou bibliotecas do sistema (pango) ausentes
+        print(f"pdf: pulado ({e})")
+        return False
+
+
+def executar(escalas, grupos):
+    casos = []
+    for n in escalas:
+        if "fmt" in grupos: casos.append(bench_fmt(n))
+        if "pavimentos" in grupos: casos.append(bench_pavimentos(n))
+        if "redistribuicao" in grupos: casos.append(bench_redistribuicao(n))
+        if "storage" in grupos or "historico" in grupos: casos.append(bench_storage(n, grupos))
+        if "colunar" in grupos: casos.append(bench_colunar(n))
+        if "similares" in grupos: casos.append(bench_similares(n))
+        if "catalogo" in grupos: casos.append(bench_catalogo(n))
+    if "pdf" in grupos and pdf_disponivel():
+        casos.extend(bench_pdf(n) for n in PAVIMENTOS_PDF)
+    resultados = {}
+    for gerador in casos:
+        for nome, resultado in gerador:
+            resultados[nome] = resultado
+            print(f"{nome:<52} {resultado['mediana_s'] * 1000:>12.3f} ms  ({resultado['repeticoes']}x)", flush=True)
+    return resultados
+
+
+def comparar(resultados, baseline, tolerancia):
+    """Imprime a comparação com a baseline e retorna os nomes dos casos que regrediram."""
+    regressoes = []
+    print(f"\n{'caso':<52} {'baseline (ms)':>14} {'atual (ms)':>12} {'razão':>7}")
+    for nome, atual in resultados.items():
+        base = baseline.get(nome)
+        if base is None:
+            print(f"{nome:<52} {'-':>14} {atual['mediana_s'] * 1000:>12.3f}   (novo)")
+            continue
+        razao = atual["mediana_s"] / base["mediana_s"] if base["mediana_s"] else float("inf")
+        regrediu = razao > 1 + tolerancia and atual["mediana_s"] - base["mediana_s"] > RUIDO_S
+        print(f"{nome:<52} {base['mediana_s'] * 1000:>14.3f} {atual['mediana_s'] * 1000:>12.3f} {razao:>7.2f}"
+              + ("  REGRESSÃO" if regrediu else ""))
+        if regrediu:
+            regressoes.append(nome)
+    return regressoes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--escalas", type=int, nargs="+", default=list(ESCALAS))
+    parser.add_argument("--grupos", nargs="+", choices=GRUPOS, default=list(GRUPOS))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--atualizar-baseline", action="store_true", help="grava os resultados como nova baseline")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="aumento relativo aceito (padrão: 0.25 = 25%%)")
+    parser.add_argument("--saida", help="também grava os resultados desta execução neste JSON")
+    args = parser.parse_args()
+
+    resultados = executar(args.escalas, args.grupos)
+    documento = {"meta": {"data": datetime.now().isoformat(timespec="seconds"), "python": platform.python_version(),
+                          "plataforma": platform.platform(), "processador": platform.processor()},
+                 "resultados": resultados}
+    if args.saida:
+        save_json(documento, args.saida)
+    if args.atualizar_baseline:
+        if os.path.exists(args.baseline):
+            # Mantém os casos que não foram executados desta vez
+            with open(args.baseline, encoding="utf-8") as f:
+                documento["resultados"] = {**json.load(f)["resultados"], **resultados}
+        save_json(documento, args.baseline)
+        print(f"\nBaseline gravada em {args.baseline}")
+        return 0
+    if not os.path.exists(args.baseline):
+        print(f"\nSem baseline em {args.baseline}; use --atualizar-baseline para criá-la.")
+        return 0
+    with open(args.baseline, encoding="utf-8") as f:
+        regressoes = comparar(resultados, json.load(f)["resultados"], args.tolerancia)
+    if regressoes:
+        print(f"\n{len(regressoes)} regressão(ões) acima de {args.tolerancia:.0%}: {', '.join(regressoes)}")
+        return 1
+    print("\nSem regressões.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
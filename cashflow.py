@@ -0,0 +1,223 @@
+# cashflow.py
+"""
+Fluxo de caixa mensal do empreendimento, com VPL, TIR e exposição máxima.
+
+O mês 0 é o lançamento (compra do terreno e início das vendas). A obra começa
+em `inicio_obra` e dura `duracao_obra` meses; o custo direto de cada etapa é
+distribuído na sua janela do cronograma (frações da duração da obra) segundo uma
+curva S, e os custos indiretos de obra são mensais durante a construção.
+As vendas seguem uma curva ao longo de `meses_vendas`; cada venda é recebida em
+entrada (no mês da venda), parcelas mensais até as chaves e o saldo nas chaves
+(mês seguinte ao fim da obra). Vendas após as chaves são recebidas à vista.
+Os custos indiretos de venda (% do VGV) acompanham os recebimentos.
+
+Tudo é calculado sobre arrays: cada entrada aceita um escalar ou um array (N,),
+e o resultado tem uma linha por cronograma (N, meses), sem laços sobre meses.
+Os totais de cada linha coincidem com os do `ViabilityModel`.
+"""
+import numpy as np
+import pandas as pd
+
+from utils import ETAPAS_OBRA
+
+# Curvas S acumuladas: (inclinação, centro) de uma logística normalizada; inclinação 0 é linear
+CURVAS_S = {
+    "Linear": (0.0, 0.5),
+    "S suave": (6.0, 0.5),
+    "S acentuada": (12.0, 0.5),
+    "Antecipada": (8.0, 0.35),
+    "Postergada": (8.0, 0.65),
+}
+# Janela de cada etapa como fração da duração da obra (início, fim)
+CRONOGRAMA_ETAPAS = {
+    "Serviços Preliminares e Fundações":        (0.00, 0.20),
+    "Estrutura (Supraestrutura)":               (0.10, 0.55),
+    "Vedações (Alvenaria)":                     (0.30, 0.70),
+    "Cobertura e Impermeabilização":            (0.50, 0.75),
+    "Revestimentos de Fachada":                 (0.55, 0.90),
+    "Instalações (Elétrica e Hidráulica)":      (0.25, 0.90),
+    "Esquadrias (Portas e Janelas)":            (0.60, 0.90),
+    "Revestimentos de Piso":                    (0.60, 0.95),
+    "Revestimentos de Parede":                  (0.55, 0.90),
+    "Revestimentos de Forro":                   (0.70, 0.95),
+    "Pintura":                                  (0.75, 1.00),
+    "Serviços Complementares e Externos":       (0.80, 1.00),
+}
+PREMISSAS_PADRAO = {
+    "inicio_obra": 3, "meses_vendas": 24, "curva_vendas": "Antecipada", "curva_obra": "S suave",
+    "percentual_entrada": 10.0, "percentual_obra": 20.0, "meses_terreno": 1, "taxa_desconto": 12.0,
+}
+COMPONENTES = {
+    "receitas": "Recebimentos",
+    "custo_terreno": "Terreno",
+    "custo_direto": "Custo Direto",
+    "custo_indireto_obra": "Indiretos de Obra",
+    "custo_indireto_venda": "Indiretos de Venda",
+}
+
+
+def curva_s(u, inclinacao=0.0, centro=0.5):
+    """Fração acumulada da curva S em u ∈ [0, 1] (0 em u=0 e 1 em u=1)."""
+    u = np.clip(u, 0.0, 1.0)
+    k, c = np.asarray(inclinacao, dtype=float), np.asarray(centro, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore", over="ignore"):
+        sig = lambda x: 1.0 / (1.0 + np.exp(-x))
+        s0, s1 = sig(-k * c), sig(k * (1.0 - c))
+        s = (sig(k * (u - c)) - s0) / (s1 - s0)
+    return np.where(k > 1e-9, s, u)
+
+
+def parcelas_mensais(inicio, duracao, horizonte, inclinacao=0.0, centro=0.5):
+    """
+    Fração do total que cai em cada mês para uma atividade de `inicio` a `inicio + duracao`
+    (meses, podem ser fracionários). As entradas são broadcast entre si; o resultado
+    tem um eixo extra de `horizonte` meses no final e soma 1 quando a atividade cabe no horizonte.
+    """
+    inicio, duracao = (np.asarray(v, dtype=float)[..., None] for v in (inicio, duracao))
+    k, c = (np.asarray(v, dtype=float)[..., None] for v in (inclinacao, centro))
+    t = np.arange(horizonte + 1, dtype=float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        u = np.where(duracao > 0, (t - inicio) / duracao, (t > inicio).astype(float))
+    acumulado = curva_s(u, k, c)
+    return np.diff(acumulado, axis=-1)
+
+
+def base_fluxo(modelo):
+    """Extrai de um `ViabilityModel` os totais usados no fluxo de caixa."""
+    pesos = np.array([modelo.custos_etapas.get(e, (0.0, 0.0))[0] for e in ETAPAS_OBRA], dtype=float)
+    # As etapas só repartem o custo direto: normalizadas, o total distribuído é o do modelo
+    pesos = pesos / pesos.sum() if pesos.sum() > 0 else np.full(len(pesos), 1.0 / len(pesos))
+    return {
+        "vgv_total": modelo.vgv_total,
+        "custo_direto": modelo.custo_direto_total,
+        "custo_terreno": modelo.custo_terreno_total,
+        "custo_mensal_obra": modelo.custo_mensal_obra,
+        "percentual_indireto": sum(p for p, _ in modelo.custos_indiretos.values()),
+        "duracao_obra": modelo.duracao_obra,
+        "pesos_etapas": pesos,
+    }
+
+
+def fluxo_de_caixa(base, duracao_obra=None, inicio_obra=3, meses_vendas=24, curva_vendas="Linear", curva_obra="S suave",
+                   percentual_entrada=10.0, percentual_obra=20.0, meses_terreno=1, cronograma=None, horizonte=None):
+    """
+    Fluxo de caixa mensal de N cronogramas de uma vez.
+
+    `base` vem de `base_fluxo` (seus valores também podem ser arrays (N,)); os parâmetros
+    numéricos aceitam escalares ou arrays (N,). O saldo nas chaves é o que falta de
+    100% após a entrada e as parcelas de obra.
+    Retorna um dicionário de arrays (N, meses): os componentes de COMPONENTES (custos
+    negativos), "saldo" e "acumulado".
+    """
+    duracao = base["duracao_obra"] if duracao_obra is None else duracao_obra
+    vgv, custo_direto, custo_terreno, custo_mensal, percentual_indireto, duracao, inicio, vendas, entrada, obra, terreno = (
+        np.atleast_1d(np.asarray(v, dtype=float)) for v in np.broadcast_arrays(
+            base["vgv_total"], base["custo_direto"], base["custo_terreno"], base["custo_mensal_obra"], base["percentual_indireto"],
+            duracao, inicio_obra, meses_vendas, percentual_entrada, percentual_obra, meses_terreno))
+    chaves_pct = 100.0 - entrada - obra
+    if (chaves_pct < -1e-9).any() or (entrada < 0).any() or (obra < 0).any():
+        raise ValueError("Entrada e parcelas de obra devem somar no máximo 100%.")
+    # Mês das chaves: o seguinte ao fim da obra
+    chaves = np.ceil(inicio + duracao).astype(int)
+    if horizonte is None:
+        horizonte = int(max(chaves.max(), np.ceil(vendas.max()), np.ceil(terreno.max()))) + 1
+    meses = np.arange(horizonte)
+
+    # --- Receitas ---
+    kv, cv = CURVAS_S[curva_vendas]
+    vendido = parcelas_mensais(0.0, vendas, horizonte, kv, cv)            # fração do VGV vendida em cada mês
+    antes = meses[None, :] < chaves[:, None]                              # meses antes das chaves
+    with np.errstate(divide="ignore", invalid="ignore"):
+        # Cada venda no mês m < chaves paga o percentual de obra em (chaves - m) parcelas iguais, de m até chaves - 1
+        por_parcela = np.where(antes, vendido / (chaves[:, None] - meses[None, :]), 0.0)
+    parcelas_obra = np.where(antes, np.cumsum(por_parcela, axis=1), 0.0) * obra[:, None] / 100
+    no_chaves = (meses[None, :] == chaves[:, None]) * (np.where(antes, vendido, 0.0).sum(axis=1) * chaves_pct / 100)[:, None]
+    recebido = np.where(antes, vendido * entrada[:, None] / 100, vendido) + parcelas_obra + no_chaves
+    receitas = recebido * vgv[:, None]
+
+    # --- Custos ---
+    cronograma = cronograma or CRONOGRAMA_ETAPAS
+    janelas = np.array([cronograma.get(e, (0.0, 1.0)) for e in ETAPAS_OBRA], dtype=float)   # (E, 2)
+    ko, co = CURVAS_S[curva_obra]
+    inicio_etapas = inicio[:, None] + janelas[None, :, 0] * duracao[:, None]                 # (N, E)
+    duracao_etapas = (janelas[None, :, 1] - janelas[None, :, 0]) * duracao[:, None]
+    pesos = np.broadcast_to(np.asarray(base["pesos_etapas"], dtype=float), (len(vgv), len(janelas)))
+    direto = np.einsum("ne,nem->nm", pesos, parcelas_mensais(inicio_etapas, duracao_etapas, horizonte, ko, co)) * custo_direto[:, None]
+    indireto_obra = parcelas_mensais(inicio, duracao, horizonte) * (custo_mensal * duracao)[:, None]
+    terreno_mes = parcelas_mensais(0.0, terreno, horizonte) * custo_terreno[:, None]
+    indireto_venda = receitas * percentual_indireto[:, None] / 100
+
+    fluxo = {
+        "receitas": receitas,
+        "custo_terreno": -terreno_mes,
+        "custo_direto": -direto,
+        "custo_indireto_obra": -indireto_obra,
+        "custo_indireto_venda": -indireto_venda,
+    }
+    fluxo["saldo"] = sum(fluxo[c] for c in COMPONENTES)
+    fluxo["acumulado"] = np.cumsum(fluxo["saldo"], axis=1)
+    return fluxo
+
+
+def taxa_mensal(taxa_anual):
+    """Taxa mensal equivalente a uma taxa anual, ambas em %."""
+    return ((1 + np.asarray(taxa_anual, dtype=float) / 100) ** (1 / 12) - 1) * 100
+
+
+def vpl(saldos, taxa_anual):
+    """
+    Valor presente (no mês 0) de fluxos mensais `saldos` (..., meses) a uma taxa anual em %.
+    `taxa_anual` é broadcast com saldos.shape[:-1]; ex.: saldos[:, None, :] e taxas[None, :]
+    avaliam todas as taxas para todos os fluxos.
+    """
+    saldos = np.asarray(saldos, dtype=float)
+    r = np.asarray(taxa_mensal(taxa_anual), dtype=float)[..., None] / 100
+    return (saldos / (1 + r) ** np.arange(saldos.shape[-1])).sum(axis=-1)
+
+
+def tir(saldos, iteracoes=200):
+    """
+    Taxa interna de retorno anual (%) de cada fluxo (..., meses), por bissecção vetorizada
+    na taxa mensal. NaN quando o VPL não muda de sinal no intervalo (ex.: fluxo sem investimento).
+    """
+    saldos = np.asarray(saldos, dtype=float)
+    t = np.arange(saldos.shape[-1])
+    vp = lambda r: (saldos * np.exp(-np.log1p(r)[..., None] * t)).sum(axis=-1)
+    forma = saldos.shape[:-1]
+    lo, hi = np.full(forma, -0.99), np.full(forma, 1.0)   # ao mês: de -99% a +100%
+    v_lo, v_hi = vp(lo), vp(hi)
+    valido = np.sign(v_lo) != np.sign(v_hi)
+    for _ in range(iteracoes):
+        meio = (lo + hi) / 2
+        v_meio = vp(meio)
+        mesmo_lado = np.sign(v_meio) == np.sign(v_lo)
+        lo, v_lo = np.where(mesmo_lado, meio, lo), np.where(mesmo_lado, v_meio, v_lo)
+        hi = np.where(mesmo_lado, hi, meio)
+        if (hi - lo).max(initial=0.0) < 1e-12:
+            break
+    return np.where(valido, ((1 + (lo + hi) / 2) ** 12 - 1) * 100, np.nan)
+
+
+def indicadores_fluxo(fluxo, taxa_anual):
+    """Exposição máxima, mês da exposição, payback, VPL e TIR de cada fluxo (arrays (N,))."""
+    acumulado = fluxo["acumulado"]
+    negativo = acumulado < 0
+    # Payback: primeiro mês a partir do qual o acumulado não volta a ficar negativo
+    ultimo_negativo = np.where(negativo.any(axis=1), acumulado.shape[1] - 1 - np.argmax(negativo[:, ::-1], axis=1), -1)
+    payback = np.where(ultimo_negativo < acumulado.shape[1] - 1, ultimo_negativo + 1, np.nan)
+    return {
+        "exposicao_maxima": np.maximum(-acumulado.min(axis=1), 0.0),
+        "mes_exposicao_maxima": acumulado.argmin(axis=1),
+        "payback_mes": payback,
+        "vpl": vpl(fluxo["saldo"], taxa_anual),
+        "tir_anual": tir(fluxo["saldo"]),
+    }
+
+
+def fluxo_dataframe(fluxo, linha=0):
+    """Tabela mensal de um dos cronogramas (uma linha por mês)."""
+    dados = {"Mês": np.arange(fluxo["saldo"].shape[1])}
+    dados.update({rotulo: fluxo[c][linha] for c, rotulo in COMPONENTES.items()})
+    dados["Saldo do Mês"] = fluxo["saldo"][linha]
+    dados["Saldo Acumulado"] = fluxo["acumulado"][linha]
+    return pd.DataFrame(dados)
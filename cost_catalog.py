@@ -0,0 +1,378 @@
+# cost_catalog.py
+"""
+Catálogo paramétrico de custos de construção por padrão, região e mês de referência.
+
+Fontes, todas locais:
+- `data/cost_parameters.json`: valores-base de cada padrão (custo por m² e fator de
+  área equivalente), válidos para qualquer região e mês sem tabela própria. Cada
+  padrão pode ter ainda "coeficientes": {tipo de pavimento: coeficiente}, que
+  substituem o coeficiente de área equivalente dos pavimentos daquele tipo;
+- `data/cost_tables/<REGIAO>_<AAAA-MM>.csv`: tabelas mensais importadas com
+  `importar_tabela` (CUB dos Sinduscons, SINAPI ou planilhas próprias), uma linha
+  por padrão com o custo por m².
+
+O catálogo é compilado uma vez por processo em arrays indexados: `custo` tem forma
+(regiões × 1 + meses × padrões), já preenchido para frente: a posição 0 dos meses é
+o valor-base, um mês sem tabela usa a última anterior da região e, sem nenhuma, a
+nacional; e `coeficientes` tem
+forma (padrões × tipos de pavimento), NaN onde não há substituição. Precificar um
+projeto ou reprecificar a carteira inteira é indexação nesses arrays. A versão
+(mtime e tamanho dos arquivos) é conferida a cada consulta e o catálogo é
+recompilado quando algum arquivo muda.
+
+Uso:
+    python -m cost_catalog listar
+    python -m cost_catalog importar cub_sp.csv --regiao SP --mes 2024-06 [--fonte CUB] [--tipologia R8]
+    python -m cost_catalog reprecificar --mes 2024-06 [--regiao SP] [--padrao medium_standard] [--saida precos.csv]
+"""
+import argparse
+import io
+import json
+import os
+import re
+import sys
+import threading
+import unicodedata
+
+import numpy as np
+import pandas as pd
+
+from utils import TIPOS_PAVIMENTO
+
+PARAMETROS_PATH = os.path.join("data", "cost_parameters.json")
+TABELAS_DIR = os.path.join("data", "cost_tables")
+REGIAO_BASE = "BR"
+PADRAO_BASE = "medium_standard"
+PADROES = {"high_standard": "Alto", "medium_standard": "Normal", "low_standard": "Baixo"}
+# Sufixo do código do CUB (NBR 12721: R8-N, PP4-B, CSL8-A...) -> padrão
+SUFIXOS_CUB = {"A": "high_standard", "N": "medium_standard", "B": "low_standard"}
+ROTULOS = {"alto": "high_standard", "normal": "medium_standard", "medio": "medium_standard", "baixo": "low_standard"}
+# Início do nome (sem acentos, minúsculo) das colunas aceitas na importação
+COLUNAS_PADRAO = ("padrao", "projeto", "codigo", "standard")
+COLUNAS_CUSTO = ("custo", "valor", "r$", "unit_cost")
+_MES = re.compile(r"^\d{4}-(0[1-9]|1[0-2])$")
+
+
+def _normalizar(texto):
+    texto = unicodedata.normalize("NFKD", str(texto)).encode("ascii", "ignore").decode()
+    return texto.strip().lower().replace("²", "2")
+
+
+def _numero_mes(mes):
+    """"AAAA-MM" -> número de meses desde o ano 0 (ordena e permite busca binária)."""
+    if not _MES.match(str(mes)):
+        raise ValueError(f"mês de referência inválido '{mes}' (use AAAA-MM)")
+    ano, m = str(mes).split("-")
+    return int(ano) * 12 + int(m) - 1
+
+
+def _mapear(valores, funcao):
+    """Aplica `funcao` a cada valor distinto de `valores` (escalar ou array) e espalha o resultado."""
+    arr = np.asarray(valores, dtype=object)
+    if not arr.ndim:
+        return np.asarray(funcao(arr.item()))
+    codigos, distintos = pd.factorize(arr.ravel())
+    return np.array([funcao(v) for v in distintos], dtype=np.int64)[codigos].reshape(arr.shape)
+
+
+def _padrao(valor, tipologia=None):
+    """Chave do padrão a partir da chave, do rótulo (Alto/Normal/Baixo) ou de um código CUB."""
+    texto = str(valor).strip()
+    if texto in PADROES:
+        return texto
+    if _normalizar(texto) in ROTULOS:
+        return ROTULOS[_normalizar(texto)]
+    codigo = texto.upper().replace(" ", "")
+    if "-" in codigo:
+        projeto, sufixo = codigo.rsplit("-", 1)
+        if sufixo in SUFIXOS_CUB and (tipologia is None or projeto == tipologia.upper()):
+            return SUFIXOS_CUB[sufixo]
+    return None
+
+
+class Catalogo:
+    """Catálogo compilado. Compartilhado entre sessões: trate os arrays como somente leitura."""
+
+    def __init__(self, parametros, tabelas, versao=None):
+        self.versao = versao
+        self.padroes = list(parametros)
+        self.tipos = list(TIPOS_PAVIMENTO)
+        self.regioes = list(dict.fromkeys([REGIAO_BASE, *sorted({r for r, _ in tabelas})]))
+        self.meses = sorted({m for _, m in tabelas}, key=_numero_mes)
+        self.fontes = {chave: df.attrs.get("fonte", "") for chave, df in tabelas.items()}
+        self.indice_padrao = {p: i for i, p in enumerate(self.padroes)}
+        self.indice_regiao = {r: i for i, r in enumerate(self.regioes)}
+        self.indice_tipo = {t: i for i, t in enumerate(self.tipos)}
+        self._numeros = np.array([_numero_mes(m) for m in self.meses], dtype=np.int64)
+
+        self.base = np.array([float(parametros[p]["unit_cost_per_m2"]) for p in self.padroes])
+        self.fator = np.array([float(parametros[p].get("equivalent_area_factor", 1.0)) for p in self.padroes])
+        self.coeficientes = np.full((len(self.padroes), len(self.tipos)), np.nan)
+        for i, p in enumerate(self.padroes):
+            for tipo, coef in (parametros[p].get("coeficientes") or {}).items():
+                if tipo not in self.indice_tipo:
+                    raise ValueError(f"{PARAMETROS_PATH}: tipo de pavimento desconhecido '{tipo}' em {p}")
+                self.coeficientes[i, self.indice_tipo[tipo]] = float(coef)
+
+        # Tabelas publicadas: (regiões × meses × padrões), NaN onde não houve publicação
+        publicado = np.full((len(self.regioes), len(self.meses), len(self.padroes)), np.nan)
+        indice_mes = {m: i for i, m in enumerate(self.meses)}
+        for (regiao, mes), df in tabelas.items():
+            p = np.array([self.indice_padrao.get(c, -1) for c in df["padrao"]], dtype=int)
+            ok = p >= 0
+            publicado[self.indice_regiao[regiao], indice_mes[mes], p[ok]] = df["custo_m2"].to_numpy(dtype=float)[ok]
+        # Preenche para frente ao longo dos meses (cada padrão separadamente); a posição 0 é o valor-base.
+        # Antes da primeira tabela de uma região vale a nacional (`REGIAO_BASE`), e antes desta o valor-base
+        publicado = np.concatenate([np.broadcast_to(self.base, (len(self.regioes), 1, len(self.padroes))), publicado], axis=1)
+        ultima = np.maximum.accumulate(np.where(np.isnan(publicado), 0, np.arange(len(self.meses) + 1)[None, :, None]), axis=1)
+        custo = np.take_along_axis(publicado, ultima, axis=1)
+        self.custo = np.where(ultima > 0, custo, custo[:1])
+
+    def posicao_mes(self, mes):
+        """Posição em `custo` (eixo dos meses) do mês `mes` ("AAAA-MM", escalar ou array): a última tabela até
+        aquele mês, 0 (valor-base) se anterior a todas. `None` é o mês mais recente do catálogo."""
+        if mes is None:
+            return len(self.meses)
+        numeros = _mapear(mes, _numero_mes)
+        return np.searchsorted(self._numeros, numeros, side="right")
+
+    def indices_padrao(self, padrao):
+        arr = np.asarray(padrao, dtype=object)
+        faltando = sorted(str(v) for v in pd.unique(arr.ravel()) if v not in self.indice_padrao)
+        if faltando:
+            raise KeyError(f"padrão desconhecido: {', '.join(faltando)}")
+        return _mapear(arr, self.indice_padrao.__getitem__)
+
+    def custo_m2(self, regiao=REGIAO_BASE, mes=None, padrao=PADRAO_BASE):
+        """Custo por m² (sem o fator de área equivalente). Aceita escalares ou arrays, combinados por broadcasting.
+        Regiões sem tabela própria usam as do catálogo nacional (`REGIAO_BASE`)."""
+        r = _mapear(regiao, lambda x: self.indice_regiao.get(x, 0))
+        valor = self.custo[r, self.posicao_mes(mes), self.indices_padrao(padrao)]
+        return valor if np.ndim(valor) else float(valor)
+
+    def coeficientes_padrao(self, padrao):
+        """{tipo de pavimento: coeficiente} substituídos pelo padrão `padrao`."""
+        linha = self.coeficientes[self.indice_padrao[padrao]]
+        return {t: float(c) for t, c in zip(self.tipos, linha) if not np.isnan(c)}
+
+    def tabela(self, regiao=REGIAO_BASE):
+        """DataFrame meses × padrões (rótulos) com o custo por m² vigente em cada mês da região."""
+        return pd.DataFrame(self.custo[self.indice_regiao.get(regiao, 0), 1:], index=pd.Index(self.meses, name="mes"),
+                            columns=[PADROES.get(p, p) for p in self.padroes])
+
+
+def _versao():
+    """mtime e tamanho do arquivo de parâmetros e de cada tabela: muda quando qualquer fonte muda."""
+    arquivos = [PARAMETROS_PATH] + sorted(os.path.join(TABELAS_DIR, a) for a in
+                                          (os.listdir(TABELAS_DIR) if os.path.isdir(TABELAS_DIR) else ()) if a.endswith(".csv"))
+    versao = []
+    for caminho in arquivos:
+        try:
+            st = os.stat(caminho)
+            versao.append((caminho, st.st_mtime_ns, st.st_size))
+        except FileNotFoundError:
+            pass
+    return tuple(versao)
+
+
+def _ler_tabelas():
+    tabelas = {}
+    if not os.path.isdir(TABELAS_DIR):
+        return tabelas
+    for arquivo in sorted(os.listdir(TABELAS_DIR)):
+        nome, ext = os.path.splitext(arquivo)
+        if ext != ".csv" or "_" not in nome:
+            continue
+        regiao, mes = nome.rsplit("_", 1)
+        if not _MES.match(mes):
+            continue
+        df = pd.read_csv(os.path.join(TABELAS_DIR, arquivo))
+        df.attrs["fonte"] = str(df["fonte"].iloc[0]) if "fonte" in df and len(df) else ""
+        tabelas[(regiao.upper(), mes)] = df
+    return tabelas
+
+
+class CatalogoCache:
+    def __init__(self):
+        self._atual = None
+        self._lock = threading.Lock()
+        self.compilacoes = 0  # quantas vezes o catálogo foi compilado (diagnóstico)
+
+    def obter(self):
+        versao = _versao()
+        atual = self._atual
+        if atual is not None and atual.versao == versao:
+            return atual
+        with self._lock:
+            if self._atual is None or self._atual.versao != versao:
+                with open(PARAMETROS_PATH, "r", encoding="utf-8") as f:
+                    parametros = json.load(f)
+                self._atual = Catalogo(parametros, _ler_tabelas(), versao)
+                self.compilacoes += 1
+            return self._atual
+
+    def invalidar(self):
+        with self._lock:
+            self._atual = None
+
+
+_cache = CatalogoCache()
+
+
+def obter_catalogo():
+    """Catálogo compilado, do cache do processo."""
+    return _cache.obter()
+
+
+def ler_tabela(conteudo, tipologia="R8"):
+    """
+    Lê uma tabela de custos (texto CSV, "," ou ";" como separador; com ";" os decimais
+    são lidos com vírgula) e devolve um DataFrame padrao × custo_m2. A coluna de padrão
+    aceita a chave, o rótulo (Alto/Normal/Baixo) ou o código do CUB; com códigos CUB
+    só as linhas do projeto-padrão `tipologia` (ex.: R8) são usadas.
+    """
+    sep = ";" if conteudo.split("\n", 1)[0].count(";") > conteudo.split("\n", 1)[0].count(",") else ","
+    df = pd.read_csv(io.StringIO(conteudo), sep=sep, decimal="," if sep == ";" else ".", thousands="." if sep == ";" else None)
+    df.columns = [_normalizar(c) for c in df.columns]
+    col_padrao = next((c for c in df.columns if c.startswith(COLUNAS_PADRAO)), None)
+    col_custo = next((c for c in df.columns if c.startswith(COLUNAS_CUSTO)), None)
+    if col_padrao is None or col_custo is None:
+        raise ValueError("a tabela precisa das colunas 'padrao' e 'custo_m2'")
+    padroes = [_padrao(v, tipologia) for v in df[col_padrao]]
+    custos = pd.to_numeric(df[col_custo], errors="coerce")
+    tabela = pd.DataFrame({"padrao": padroes, "custo_m2": custos}).dropna()
+    if tabela.empty:
+        raise ValueError("nenhuma linha da tabela corresponde a um padrão do catálogo")
+    if (tabela["custo_m2"] <= 0).any():
+        raise ValueError("custos por m² devem ser positivos")
+    if tabela["padrao"].duplicated().any():
+        raise ValueError("mais de uma linha para o mesmo padrão (informe a tipologia do CUB)")
+    return tabela.reset_index(drop=True)
+
+
+def importar_tabela(conteudo, regiao, mes, fonte="", tipologia="R8"):
+    """Grava a tabela `conteudo` (ver `ler_tabela`) como a de `regiao` em `mes` (AAAA-MM), substituindo a existente."""
+    regiao = str(regiao).strip().upper()
+    if not regiao or "_" in regiao:
+        raise ValueError("região inválida")
+    _numero_mes(mes)
+    tabela = ler_tabela(conteudo, tipologia).assign(fonte=fonte)
+    os.makedirs(TABELAS_DIR, exist_ok=True)
+    destino = os.path.join(TABELAS_DIR, f"{regiao}_{mes}.csv")
+    tabela.to_csv(destino + ".tmp", index=False)
+    os.replace(destino + ".tmp", destino)
+    return tabela
+
+
+def _pavimentos_projetos(projetos, regiao, padrao):
+    """Achata os pavimentos de todos os projetos em listas paralelas (uma passada pelos dicionários)."""
+    ids, nomes, regioes, padroes, custos = [], [], [], [], []
+    dono, tipos, area_total, coef = [], [], [], []
+    for n, info in enumerate(projetos):
+        config = info.get("custos_config") or {}
+        escolha = config.get("catalogo") or {}
+        ids.append(info.get("id"))
+        nomes.append(info.get("nome", ""))
+        regioes.append(regiao or escolha.get("regiao") or REGIAO_BASE)
+        padroes.append(padrao or escolha.get("padrao") or PADRAO_BASE)
+        custos.append(float(config.get("custo_area_privativa", 4500.0)))
+        for p in info.get("pavimentos") or []:
+            dono.append(n)
+            tipos.append(p.get("tipo"))
+            area_total.append(float(p.get("area", 0) or 0) * float(p.get("rep", 1) or 1))
+            coef.append(float(p.get("coef", 1.0)))
+    return ids, nomes, regioes, padroes, np.array(custos), np.array(dono, dtype=int), tipos, np.array(area_total), np.array(coef)
+
+
+def reprecificar_portfolio(projetos, mes=None, regiao=None, padrao=None, catalogo=None):
+    """
+    Custo direto de cada projeto pelo catálogo em `mes` (None: o mais recente), comparado com o atual.
+    `regiao`/`padrao` valem para todos; sem eles, usa-se o que cada projeto escolheu no catálogo
+    (`custos_config["catalogo"]`), ou o padrão nacional Normal.
+    """
+    catalogo = catalogo or obter_catalogo()
+    ids, nomes, regioes, padroes, custo_atual, dono, tipos, area_total, coef = _pavimentos_projetos(projetos, regiao, padrao)
+    n = len(ids)
+    colunas = ("id", "nome", "regiao", "padrao", "custo_m2_atual", "custo_m2_catalogo", "custo_direto_atual",
+               "custo_direto_catalogo", "variacao", "variacao_percentual")
+    if not n:
+        return pd.DataFrame(columns=colunas)
+    p = catalogo.indices_padrao(np.array(padroes, dtype=object))
+    custo_m2 = catalogo.custo_m2(np.array(regioes, dtype=object), mes, np.array(padroes, dtype=object)) * catalogo.fator[p]
+    # Coeficiente de cada pavimento: o do padrão do projeto quando o catálogo o substitui, senão o do próprio pavimento
+    t = _mapear(np.array(tipos, dtype=object), lambda tp: catalogo.indice_tipo.get(tp, -1))
+    substituto = np.where(t >= 0, catalogo.coeficientes[p[dono], np.maximum(t, 0)], np.nan) if len(dono) else np.empty(0)
+    coef_catalogo = np.where(np.isnan(substituto), coef, substituto)
+    area_eq_atual = np.bincount(dono, weights=area_total * coef, minlength=n)
+    area_eq_catalogo = np.bincount(dono, weights=area_total * coef_catalogo, minlength=n)
+    atual = area_eq_atual * custo_atual
+    novo = area_eq_catalogo * custo_m2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        percentual = np.where(atual > 0, (novo / atual - 1) * 100, np.nan)
+    return pd.DataFrame({"id": ids, "nome": nomes, "regiao": regioes, "padrao": [PADROES.get(x, x) for x in padroes],
+                         "custo_m2_atual": custo_atual, "custo_m2_catalogo": custo_m2, "custo_direto_atual": atual,
+                         "custo_direto_catalogo": novo, "variacao": novo - atual, "variacao_percentual": percentual},
+                        columns=colunas)
+
+
+def aplicar_catalogo(info, regiao, mes, padrao, catalogo=None):
+    """Grava no projeto o custo por m² do catálogo (com o fator do padrão) e os coeficientes substituídos."""
+    catalogo = catalogo or obter_catalogo()
+    p = catalogo.indice_padrao[padrao]
+    custo = catalogo.custo_m2(regiao, mes, padrao) * float(catalogo.fator[p])
+    config = info.setdefault("custos_config", {})
+    config["custo_area_privativa"] = round(float(custo), 2)
+    config["catalogo"] = {"regiao": regiao, "mes": mes or (catalogo.meses[-1] if catalogo.meses else None), "padrao": padrao}
+    coeficientes = catalogo.coeficientes_padrao(padrao)
+    for pav in info.get("pavimentos") or []:
+        if pav.get("tipo") in coeficientes:
+            pav["coef"] = coeficientes[pav["tipo"]]
+    return config["custo_area_privativa"]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Catálogo de custos de construção por padrão, região e mês.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    lst = sub.add_parser("listar", help="custos por m² vigentes em cada mês")
+    lst.add_argument("--regiao", default=REGIAO_BASE)
+    imp = sub.add_parser("importar", help="importa uma tabela CSV (CUB, SINAPI ou própria)")
+    imp.add_argument("arquivo")
+    imp.add_argument("--regiao", required=True)
+    imp.add_argument("--mes", required=True, help="mês de referência (AAAA-MM)")
+    imp.add_argument("--fonte", default="")
+    imp.add_argument("--tipologia", default="R8", help="projeto-padrão do CUB usado (padrão: R8)")
+    rep = sub.add_parser("reprecificar", help="custo direto de todos os projetos pelo catálogo")
+    rep.add_argument("--mes", help="mês de referência (padrão: o mais recente)")
+    rep.add_argument("--regiao")
+    rep.add_argument("--padrao", choices=tuple(PADROES))
+    rep.add_argument("--backend", choices=("json", "sqlite"), default=os.environ.get("STORAGE_BACKEND", "sqlite"))
+    rep.add_argument("--saida", help="arquivo CSV (padrão: tabela na saída padrão)")
+    args = parser.parse_args(argv)
+
+    try:
+        if args.comando == "importar":
+            with open(args.arquivo, "r", encoding="utf-8-sig") as f:
+                tabela = importar_tabela(f.read(), args.regiao, args.mes, args.fonte, args.tipologia)
+            print(tabela.assign(padrao=tabela["padrao"].map(PADROES)).to_string(index=False))
+            return 0
+        catalogo = obter_catalogo()
+        if args.comando == "listar":
+            print(f"Base ({PARAMETROS_PATH}): " + ", ".join(f"{PADROES.get(p, p)} R$ {c:.2f}" for p, c in zip(catalogo.padroes, catalogo.base)))
+            print(catalogo.tabela(args.regiao.upper()).round(2).to_string())
+            return 0
+        from storage import create_storage
+        resultado = reprecificar_portfolio(create_storage(args.backend).iter_projects(), args.mes,
+                                           args.regiao.upper() if args.regiao else None, args.padrao, catalogo)
+    except (ValueError, KeyError, OSError) as e:
+        print(f"Erro: {e}", file=sys.stderr)
+        return 1
+    if args.saida:
+        resultado.to_csv(args.saida, index=False)
+    else:
+        with pd.option_context("display.width", 200, "display.max_columns", 20):
+            print(resultado.round(2).to_string(index=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
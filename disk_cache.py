@@ -0,0 +1,87 @@
+# disk_cache.py
+"""
+Cache em disco endereçado por conteúdo.
+
+Cada entrada é um arquivo nomeado pelo hash da chave, gravado de forma atômica,
+de modo que o cache pode ser compartilhado por várias sessões e processos. O
+tamanho total é limitado: quando excedido, os arquivos usados há mais tempo
+(pela data de modificação, atualizada a cada acerto) são removidos primeiro.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+
+def hash_chave(*partes):
+    """sha256 de partes arbitrárias serializáveis em JSON."""
+    payload = json.dumps(partes, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class DiskCache:
+    def __init__(self, diretorio, max_bytes, sufixo=".bin"):
+        self.diretorio = diretorio
+        self.max_bytes = int(max_bytes)
+        self.sufixo = sufixo
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    def _caminho(self, chave):
+        return os.path.join(self.diretorio, f"{chave}{self.sufixo}")
+
+    def get(self, chave):
+        caminho = self._caminho(chave)
+        try:
+            with open(caminho, "rb") as f:
+                dados = f.read()
+            os.utime(caminho)  # marca como usado recentemente (LRU)
+        except FileNotFoundError:
+            with self._lock: self.misses += 1
+            return None
+        with self._lock: self.hits += 1
+        return dados
+
+    def set(self, chave, dados):
+        os.makedirs(self.diretorio, exist_ok=True)
+        with tempfile.NamedTemporaryFile("wb", dir=self.diretorio, suffix=".tmp", delete=False) as f:
+            f.write(dados)
+        os.replace(f.name, self._caminho(chave))
+        self._evict()
+
+    def delete(self, chave):
+        try:
+            os.remove(self._caminho(chave))
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        entradas = []
+        with os.scandir(self.diretorio) as it:
+            for e in it:
+                if e.name.endswith(self.sufixo):
+                    try:
+                        st = e.stat()
+                    except FileNotFoundError:
+                        continue
+                    entradas.append((st.st_mtime, st.st_size, e.path))
+        total = sum(tamanho for _, tamanho, _ in entradas)
+        for _, tamanho, caminho in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(caminho)
+            except FileNotFoundError:
+                pass
+            total -= tamanho
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def clear(self):
+        if os.path.isdir(self.diretorio):
+            for nome in os.listdir(self.diretorio):
+                if nome.endswith(self.sufixo):
+                    os.remove(os.path.join(self.diretorio, nome))
@@ -0,0 +1,153 @@
+# export_reports.py
+"""
+Exportação em lote dos relatórios PDF de todos os projetos, sem o Streamlit.
+
+Os projetos são lidos do armazenamento configurado, calculados pelo
+`ViabilityModel` e renderizados por `generate_pdf_report` num pool de processos.
+Um manifesto no diretório de saída guarda a chave de cada relatório gerado, de
+modo que uma nova execução pula os projetos que não mudaram (retomada após
+interrupção). Ao final é exibido o tempo de cada projeto.
+
+Uso:
+    python -m export_reports --saida relatorios [--zip relatorios.zip] [--workers 4]
+                             [--backend sqlite|json] [--ids 1 2 3] [--forcar]
+"""
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+import unicodedata
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from storage import BACKENDS, create_storage, save_json
+from utils import generate_pdf_report, normalize_project, report_cache_key
+from viability import ViabilityModel
+
+MANIFESTO = "manifesto.json"
+
+
+def nome_arquivo(info):
+    """Relatorio_<id>_<nome sem acentos>.pdf"""
+    nome = unicodedata.normalize("NFKD", info.get("nome", "")).encode("ascii", "ignore").decode()
+    nome = re.sub(r"[^A-Za-z0-9]+", "_", nome).strip("_") or "projeto"
+    return f"Relatorio_{info['id']}_{nome}.pdf"
+
+
+def _exportar(info, destino):
+    """Executado no processo do pool: calcula, renderiza e grava o PDF. Retorna os tempos."""
+    inicio = time.perf_counter()
+    modelo = ViabilityModel.from_project(info)
+    calculo = time.perf_counter() - inicio
+    pdf = generate_pdf_report(info, modelo)
+    render = time.perf_counter() - inicio - calculo
+    temporario = destino + ".tmp"
+    with open(temporario, "wb") as f:
+        f.write(pdf)
+    os.replace(temporario, destino)
+    return {"calculo_s": calculo, "render_s": render, "bytes": len(pdf)}
+
+
+def exportar_todos(storage, saida, workers, ids=None, forcar=False, log=print):
+    """Gera os relatórios pendentes e retorna a lista de linhas do resumo (uma por projeto)."""
+    os.makedirs(saida, exist_ok=True)
+    caminho_manifesto = os.path.join(saida, MANIFESTO)
+    manifesto = {}
+    if os.path.exists(caminho_manifesto) and not forcar:
+        with open(caminho_manifesto, encoding="utf-8") as f:
+            manifesto = json.load(f)
+
+    ids = set(ids) if ids else None
+    linhas = []
+    pendentes = {}
+    with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+        # Percorre o armazenamento uma única vez (load_project por id relê o arquivo inteiro no backend JSON)
+        for info in storage.iter_projects():
+            if ids and info["id"] not in ids:
+                continue
+            info = normalize_project(info)
+            chave = report_cache_key(info, ViabilityModel.from_project(info))
+            arquivo = nome_arquivo(info)
+            registro = manifesto.get(str(info["id"]))
+            if registro and registro["chave"] == chave and os.path.exists(os.path.join(saida, registro["arquivo"])):
+                linhas.append({"id": info["id"], "nome": info.get("nome", ""), "arquivo": registro["arquivo"], "status": "inalterado",
+                               "calculo_s": 0.0, "render_s": 0.0, "total_s": 0.0})
+                continue
+            # Limita os jobs em andamento para não carregar todos os projetos na memória de uma vez
+            while len(pendentes) >= workers * 2:
+                _coletar(wait(pendentes, return_when=FIRST_COMPLETED).done, pendentes, manifesto, caminho_manifesto, linhas, log)
+            inicio = time.perf_counter()
+            future = executor.submit(_exportar, info, os.path.join(saida, arquivo))
+            pendentes[future] = (info["id"], info.get("nome", ""), arquivo, chave, inicio)
+        while pendentes:
+            _coletar(wait(pendentes, return_when=FIRST_COMPLETED).done, pendentes, manifesto, caminho_manifesto, linhas, log)
+    return linhas
+
+
+def _coletar(concluidos, pendentes, manifesto, caminho_manifesto, linhas, log):
+    for future in concluidos:
+        pid, nome, arquivo, chave, inicio = pendentes.pop(future)
+        linha = {"id": pid, "nome": nome, "arquivo": arquivo, "total_s": time.perf_counter() - inicio}
+        try:
+            linha.update(future.result(), status="gerado")
+            manifesto[str(pid)] = {"chave": chave, "arquivo": arquivo}
+            # O manifesto é regravado a cada projeto concluído, para permitir retomar a exportação
+            save_json(manifesto, caminho_manifesto)
+        except Exception as e:
+            linha.update(status=f"erro: {e}", calculo_s=0.0, render_s=0.0)
+        linhas.append(linha)
+        log(f"[{len(linhas)}] #{pid} {nome}: {linha['status']} ({linha['total_s']:.2f} s)")
+
+
+def gravar_zip(saida, linhas, destino_zip):
+    # PDFs já são comprimidos; ZIP_STORED evita gastar CPU à toa
+    with zipfile.ZipFile(destino_zip, "w", compression=zipfile.ZIP_STORED) as zf:
+        for linha in linhas:
+            caminho = os.path.join(saida, linha["arquivo"])
+            if linha["status"] in ("gerado", "inalterado") and os.path.exists(caminho):
+                zf.write(caminho, linha["arquivo"])
+
+
+def gravar_resumo(saida, linhas):
+    caminho = os.path.join(saida, "resumo_tempos.csv")
+    campos = ["id", "nome", "arquivo", "status", "calculo_s", "render_s", "total_s"]
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=campos, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(sorted(linhas, key=lambda l: l["id"]))
+    return caminho
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Exporta os relatórios PDF de todos os projetos.")
+    parser.add_argument("--saida", default="relatorios", help="diretório dos PDFs (padrão: relatorios)")
+    parser.add_argument("--zip", help="também grava todos os PDFs neste arquivo .zip")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--backend", choices=BACKENDS, default=os.environ.get("STORAGE_BACKEND", "sqlite"))
+    parser.add_argument("--ids", type=int, nargs="+", help="exporta apenas estes projetos")
+    parser.add_argument("--forcar", action="store_true", help="ignora o manifesto e gera tudo novamente")
+    args = parser.parse_args(argv)
+
+    inicio = time.perf_counter()
+    linhas = exportar_todos(create_storage(args.backend), args.saida, args.workers, args.ids, args.forcar)
+    caminho_resumo = gravar_resumo(args.saida, linhas)
+    if args.zip:
+        gravar_zip(args.saida, linhas, args.zip)
+
+    gerados = [l for l in linhas if l["status"] == "gerado"]
+    erros = [l for l in linhas if l["status"].startswith("erro")]
+    print(f"\n{len(gerados)} gerados, {len(linhas) - len(gerados) - len(erros)} inalterados, {len(erros)} com erro "
+          f"em {time.perf_counter() - inicio:.1f} s")
+    if gerados:
+        tempos = sorted(l["total_s"] for l in gerados)
+        print(f"Tempo por projeto: mediana {tempos[len(tempos) // 2]:.2f} s, máximo {tempos[-1]:.2f} s")
+    print(f"Resumo por projeto: {caminho_resumo}")
+    return 1 if erros else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,133 @@
+# goal_seek.py
+"""
+Busca de meta: qual valor de uma entrada leva um indicador a um alvo.
+
+Ex.: o preço de venda para margem de 15%, o preço de equilíbrio (lucro zero) ou o
+custo de construção que mantém o custo total/m² em um teto. O modelo usado é o de
+`scenarios.evaluate_scenarios`, que aceita arrays, então vários projetos são
+resolvidos juntos:
+
+1. forma fechada: o indicador é afim na maioria das entradas, então duas
+   avaliações dão a reta e o valor que atinge o alvo; uma terceira avaliação
+   confirma o resultado. A margem em função do preço (100·(1 − s/100) − 100·C/(A·p))
+   também tem solução direta, `_preco_para_margem`;
+2. para os demais casos não afins, bissecção vetorizada num intervalo que é
+   ampliado até conter o alvo.
+
+Projetos sem solução (alvo inatingível ou fora do domínio) recebem NaN.
+"""
+import numpy as np
+import pandas as pd
+
+from scenarios import PARAMETROS_CENARIO, base_do_modelo, evaluate_scenarios
+from viability import ViabilityModel
+
+METAS = {
+    "margem_lucro_percentual": "Margem de Lucro (%)",
+    "lucro_bruto": "Lucro Bruto (R$)",
+    "custo_total_m2": "Custo Total / m² (R$)",
+}
+# Domínio de cada entrada (os percentuais indiretos são % do VGV)
+LIMITES = {"percentual_indireto": (0.0, 100.0)}
+ITERACOES_BISSECCAO = 200
+EXPANSOES_MAX = 60
+
+
+def _avaliar(base, parametro, metrica, valores):
+    return evaluate_scenarios(base, **{("custos_indiretos_percentuais" if parametro == "percentual_indireto" else parametro): valores})[metrica]
+
+
+def _preco_para_margem(base, alvo):
+    """
+    Preço de venda que leva a margem ao alvo: p = C / (A·(1 − s/100 − alvo/100)), com C os custos
+    que não dependem do VGV, A a área privativa e s o percentual indireto. NaN se não houver preço positivo.
+    """
+    custos = (base["area_equivalente"] * base["custo_area_privativa"] + base["custo_mensal_obra"] * base["duracao_obra"]
+              + base["area_terreno"] * base["custo_terreno_m2"])
+    denominador = base["area_privativa"] * (1 - base["percentual_indireto"] / 100 - alvo / 100)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        preco = custos / denominador
+    return np.where((denominador > 0) & np.isfinite(preco) & (preco > 0), preco, np.nan)
+
+
+def goal_seek(base, parametro, metrica, alvo, tolerancia=1e-9):
+    """
+    Resolve `metrica(parametro) = alvo` para um projeto ou vários.
+
+    `base` vem de `base_do_modelo` (ou de `empilhar_bases`, com um valor por projeto);
+    `parametro` é uma chave de PARAMETROS_CENARIO e `metrica` uma de METAS.
+    Retorna um array com o valor da entrada para cada projeto (NaN quando não há solução).
+    """
+    if parametro not in PARAMETROS_CENARIO:
+        raise ValueError(f"Parâmetro desconhecido: {parametro}")
+    if metrica not in METAS:
+        raise ValueError(f"Métrica desconhecida: {metrica}")
+    x0 = np.atleast_1d(np.asarray(base[parametro], dtype=float))
+    n = len(x0)
+    base = {k: np.broadcast_to(np.asarray(v, dtype=float), (n,)) for k, v in base.items()}
+    alvo = np.broadcast_to(np.asarray(alvo, dtype=float), (n,))
+    minimo, maximo = LIMITES.get(parametro, (0.0, np.inf))
+    if parametro == "preco_medio_venda_m2" and metrica == "margem_lucro_percentual":
+        return _preco_para_margem(base, alvo)
+
+    # 1) Forma fechada por dois pontos, conferida num terceiro
+    x1 = x0 * 1.1 + 1.0
+    f0, f1 = _avaliar(base, parametro, metrica, x0), _avaliar(base, parametro, metrica, x1)
+    # Erro aceito relativo à escala do indicador (lucros em milhões não chegam a 1e-9 absoluto)
+    erro_aceito = tolerancia * np.maximum.reduce([np.ones(n), np.abs(alvo), np.abs(f0), np.abs(f1)])
+    with np.errstate(divide="ignore", invalid="ignore"):
+        x = x0 + (alvo - f0) * (x1 - x0) / (f1 - f0)
+    x = np.where(np.isfinite(x), x, np.nan)
+    resolvido = np.isfinite(x) & (x >= minimo) & (x <= maximo)
+    resolvido &= np.abs(_avaliar(base, parametro, metrica, np.where(resolvido, x, x0)) - alvo) <= erro_aceito
+    if resolvido.all():
+        return x
+
+    # 2) Bissecção vetorizada para os demais: amplia [lo, hi] até o alvo ficar entre f(lo) e f(hi)
+    lo = np.full(n, minimo)
+    hi = np.where(x0 > minimo, x0, minimo + 1.0) if np.isinf(maximo) else np.full(n, maximo)
+    g_lo = _avaliar(base, parametro, metrica, lo) - alvo
+    g_hi = _avaliar(base, parametro, metrica, hi) - alvo
+    for _ in range(EXPANSOES_MAX):
+        sem_troca = np.sign(g_lo) == np.sign(g_hi)
+        if not (sem_troca & ~resolvido).any() or np.isfinite(maximo):
+            break
+        hi = np.where(sem_troca, hi * 2, hi)
+        g_hi = _avaliar(base, parametro, metrica, hi) - alvo
+    pendente = ~resolvido & (np.sign(g_lo) != np.sign(g_hi))
+    for _ in range(ITERACOES_BISSECCAO):
+        meio = (lo + hi) / 2
+        g_meio = _avaliar(base, parametro, metrica, meio) - alvo
+        mesmo_lado = np.sign(g_meio) == np.sign(g_lo)
+        lo, g_lo = np.where(mesmo_lado, meio, lo), np.where(mesmo_lado, g_meio, g_lo)
+        hi = np.where(mesmo_lado, hi, meio)
+        if (np.abs(hi - lo) <= 1e-12 * np.maximum(1.0, np.abs(hi)))[pendente].all():
+            break
+    x_bisseccao = (lo + hi) / 2
+    ok = pendente & (np.abs(_avaliar(base, parametro, metrica, x_bisseccao) - alvo) <= 1e3 * erro_aceito)
+    return np.where(resolvido, x, np.where(ok, x_bisseccao, np.nan))
+
+
+def empilhar_bases(bases):
+    """Junta várias bases (`base_do_modelo`) num único dicionário de arrays, um valor por projeto."""
+    return {k: np.array([b[k] for b in bases], dtype=float) for k in bases[0]} if bases else {}
+
+
+def goal_seek_projetos(projetos, parametro, metrica, alvo):
+    """
+    Busca de meta para vários projetos (ex.: `get_storage().iter_projects()`) numa única chamada.
+    Retorna um DataFrame com id, nome, valor atual, valor que atinge o alvo e a variação (%).
+    """
+    ids, nomes, bases = [], [], []
+    for info in projetos:
+        # Só a base (alguns escalares) é guardada por projeto, não o modelo inteiro
+        ids.append(info.get("id")); nomes.append(info.get("nome", "")); bases.append(base_do_modelo(ViabilityModel(info)))
+    colunas = ["id", "nome", "valor_atual", "valor_meta", "variacao_percentual"]
+    if not bases:
+        return pd.DataFrame(columns=colunas)
+    base = empilhar_bases(bases)
+    solucao = goal_seek(base, parametro, metrica, alvo)
+    atual = base[parametro]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        variacao = np.where(atual != 0, (solucao / atual - 1) * 100, np.nan)
+    return pd.DataFrame({"id": ids, "nome": nomes, "valor_atual": atual, "valor_meta": solucao, "variacao_percentual": variacao}, columns=colunas)
@@ -0,0 +1,105 @@
+# historico.py
+"""
+Cache do histórico de custos, compartilhado por todas as sessões do processo.
+
+Cada tipo de histórico ("direto" ou "indireto") é lido do armazenamento uma vez
+e mantido em memória junto com as estruturas derivadas: um dicionário por id e
+as estatísticas de cada etapa/item (mínimo, quartis, média, máximo), além do
+índice da busca por obras semelhantes, montado na primeira busca. A cada
+consulta só a versão do histórico é conferida (mtime do arquivo JSON ou uma
+consulta pela chave primária no SQLite); o cache é reconstruído quando ela muda,
+inclusive por gravações de outros processos, ou quando `invalidar` é chamado
+após `save_to_historico`.
+
+Os objetos retornados são compartilhados entre sessões: trate-os como somente leitura.
+"""
+import threading
+import warnings
+from functools import cached_property
+
+import numpy as np
+import pandas as pd
+
+from similares import IndiceSimilares
+from storage import get_storage
+
+ESTATISTICAS = ("n", "minimo", "p25", "media", "mediana", "p75", "maximo")
+
+
+class Historico:
+    """Retrato imutável de um histórico e das estruturas derivadas dele."""
+
+    def __init__(self, entradas, versao=None):
+        self.versao = versao
+        self.entradas = entradas
+        self.por_id = {e["id"]: e for e in entradas}
+        self.ids = [e["id"] for e in entradas]
+        # Itens na ordem em que aparecem (entradas antigas podem não ter todos)
+        self.itens = list(dict.fromkeys(item for e in entradas for item in e.get("percentuais", {})))
+        # Matriz entradas × itens dos percentuais; itens ausentes numa entrada ficam NaN
+        self.matriz = np.array([[float(e.get("percentuais", {}).get(item, np.nan)) for item in self.itens] for e in entradas],
+                               dtype=float).reshape(len(entradas), len(self.itens))
+        self.agregados = self._agregar()
+
+    def _agregar(self):
+        if not self.itens or not len(self.matriz):
+            return pd.DataFrame(columns=ESTATISTICAS, dtype=float)
+        m = self.matriz
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore", RuntimeWarning)  # itens sem nenhum valor ficam NaN
+            p25, mediana, p75 = np.nanpercentile(m, [25, 50, 75], axis=0)
+            dados = {"n": (~np.isnan(m)).sum(axis=0), "minimo": np.nanmin(m, axis=0), "p25": p25, "media": np.nanmean(m, axis=0),
+                     "mediana": mediana, "p75": p75, "maximo": np.nanmax(m, axis=0)}
+        return pd.DataFrame(dados, index=pd.Index(self.itens, name="item"), columns=ESTATISTICAS)
+
+    @cached_property
+    def indice(self):
+        """Índice da busca por obras semelhantes (`similares`), montado na primeira consulta."""
+        return IndiceSimilares(self.entradas, self.itens, self.matriz)
+
+    def __len__(self):
+        return len(self.entradas)
+
+    def rotulo(self, hid):
+        """Texto exibido nas seleções: "id – nome"."""
+        return f"{hid} – {self.por_id[hid].get('nome', '')}"
+
+
+class HistoricoCache:
+    def __init__(self):
+        self._dados = {}
+        self._lock = threading.Lock()
+        self.leituras = 0  # quantas vezes o histórico foi lido do armazenamento (diagnóstico)
+
+    def obter(self, tipo):
+        storage = get_storage()
+        versao = storage.versao_historico(tipo)
+        atual = self._dados.get((id(storage), tipo))
+        if atual is not None and atual.versao == versao:
+            return atual
+        with self._lock:
+            # Outra sessão pode ter recarregado enquanto esta esperava o lock
+            atual = self._dados.get((id(storage), tipo))
+            if atual is None or atual.versao != versao:
+                atual = Historico(storage.load_historico(tipo), versao)
+                self._dados[(id(storage), tipo)] = atual
+                self.leituras += 1
+        return atual
+
+    def invalidar(self, tipo=None):
+        with self._lock:
+            for chave in [c for c in self._dados if tipo is None or c[1] == tipo]:
+                del self._dados[chave]
+
+
+_cache = HistoricoCache()
+
+
+def obter_historico(tipo):
+    """Histórico `tipo` ("direto" ou "indireto"), do cache do processo."""
+    return _cache.obter(tipo)
+
+
+def invalidar(tipo=None):
+    """Descarta o cache de um tipo (ou de todos); a próxima consulta relê o armazenamento."""
+    _cache.invalidar(tipo)
@@ -0,0 +1,304 @@
+# historico_colunar.py
+"""
+Histórico de custos em formato colunar, para análises sobre muitas obras arquivadas.
+
+Cada tipo de histórico ("direto" ou "indireto") fica num diretório com um arquivo
+binário por coluna (arrays NumPy crus, lidos com `np.memmap`):
+- `id.i8` (int64) e `data.d8` (datetime64[D]);
+- `item_<k>.f8` (float64): o percentual do k-ésimo item de `esquema.json` (NaN se ausente);
+- `nome.txt` com os nomes concatenados em UTF-8 e `nome.i8` com o fim de cada um.
+As gravações só acrescentam bytes ao fim dos arquivos (um grupo de linhas por
+chamada a `acrescentar`); `id.i8` é gravado por último e define quantas linhas
+valem, então uma gravação interrompida é descartada na próxima. Itens novos ganham
+uma coluna preenchida com NaN para as linhas anteriores.
+
+As consultas (`filtro`, `percentis`, `estatisticas`, `tendencia`) trabalham coluna a
+coluna sobre os arrays mapeados, sem criar um dicionário por linha.
+
+Uso:
+    python -m historico_colunar importar [--backend sqlite|json]   # reconstrói a partir do armazenamento
+    python -m historico_colunar percentis --tipo direto [--de 2024-01-01] [--ate 2024-12-31]   # reconstrói se atrasado
+    python -m historico_colunar tendencia --tipo direto --freq Y
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import threading
+
+import numpy as np
+import pandas as pd
+
+from storage import BACKENDS, create_storage, save_json
+
+DIRETORIO = os.environ.get("HISTORICO_COLUNAR_DIR", "historico_colunar")
+logger = logging.getLogger(__name__)
+FREQUENCIAS = {"Y": "Ano", "Q": "Trimestre", "M": "Mês"}
+LOTE_IMPORTACAO = 100_000
+
+
+class HistoricoColunar:
+    """Um tipo de histórico em colunas append-only."""
+
+    def __init__(self, diretorio):
+        self.diretorio = diretorio
+        self._lock = threading.Lock()
+        os.makedirs(diretorio, exist_ok=True)
+        self.itens = []
+        if os.path.exists(self._caminho("esquema.json")):
+            with open(self._caminho("esquema.json"), encoding="utf-8") as f:
+                self.itens = json.load(f)["itens"]
+
+    def _caminho(self, nome):
+        return os.path.join(self.diretorio, nome)
+
+    def _arquivo_item(self, k):
+        return f"item_{k}.f8"
+
+    def __len__(self):
+        try:
+            return os.path.getsize(self._caminho("id.i8")) // 8
+        except FileNotFoundError:
+            return 0
+
+    def _mapear(self, arquivo, dtype, n=None):
+        n = len(self) if n is None else n
+        if n == 0:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self._caminho(arquivo), dtype=dtype, mode="r", shape=(n,))
+
+    # --- Leitura ---
+
+    def ids(self):
+        return self._mapear("id.i8", np.int64)
+
+    def datas(self):
+        return self._mapear("data.d8", "datetime64[D]")
+
+    def coluna(self, item):
+        return self._mapear(self._arquivo_item(self.itens.index(item)), np.float64)
+
+    def nomes(self, mascara=None):
+        fins = self._mapear("nome.i8", np.int64)
+        if not len(fins):
+            return []
+        with open(self._caminho("nome.txt"), "rb") as f:
+            dados = f.read(int(fins[-1]))
+        inicios = np.concatenate([[0], fins[:-1]])
+        posicoes = np.flatnonzero(mascara) if mascara is not None else range(len(fins))
+        return [dados[inicios[i]:fins[i]].decode("utf-8") for i in posicoes]
+
+    def ultimo_id(self):
+        ids = self.ids()
+        return int(ids[-1]) if len(ids) else 0
+
+    # --- Gravação ---
+
+    def _descartar_incompletas(self, n):
+        """Corta bytes de uma gravação interrompida (além das n linhas confirmadas em id.i8)."""
+        tamanhos = {"data.d8": 8 * n, "nome.i8": 8 * n, **{self._arquivo_item(k): 8 * n for k in range(len(self.itens))}}
+        fins = self._mapear("nome.i8", np.int64, n)
+        tamanhos["nome.txt"] = int(fins[-1]) if n else 0
+        for arquivo, tamanho in tamanhos.items():
+            caminho = self._caminho(arquivo)
+            if not os.path.exists(caminho):
+                open(caminho, "wb").close()
+            if os.path.getsize(caminho) > tamanho:
+                with open(caminho, "r+b") as f:
+                    f.truncate(tamanho)
+
+    def acrescentar(self, entradas):
+        """Acrescenta um grupo de entradas ({"id", "nome", "data", "percentuais"}) ao fim das colunas."""
+        if not entradas:
+            return 0
+        with self._lock:
+            n = len(self)
+            self._descartar_incompletas(n)
+            novos = [i for i in dict.fromkeys(i for e in entradas for i in e.get("percentuais", {})) if i not in self.itens]
+            for item in novos:
+                # Coluna nova: NaN para as linhas já gravadas
+                with open(self._caminho(self._arquivo_item(len(self.itens))), "wb") as f:
+                    np.full(n, np.nan).tofile(f)
+                self.itens.append(item)
+            if novos:
+                save_json({"itens": self.itens}, self._caminho("esquema.json"))
+
+            # Uma passada pelas entradas monta o grupo inteiro; cada coluna é gravada de uma vez
+            valores = np.array([[e.get("percentuais", {}).get(item, np.nan) for item in self.itens] for e in entradas], dtype=np.float64)
+            for k in range(len(self.itens)):
+                with open(self._caminho(self._arquivo_item(k)), "ab") as f:
+                    np.ascontiguousarray(valores[:, k]).tofile(f)
+            datas = np.array([e.get("data") or "NaT" for e in entradas], dtype="datetime64[D]")
+            with open(self._caminho("data.d8"), "ab") as f:
+                datas.tofile(f)
+            nomes = [str(e.get("nome", "")).encode("utf-8") for e in entradas]
+            base = int(self._mapear("nome.i8", np.int64, n)[-1]) if n else 0
+            with open(self._caminho("nome.txt"), "ab") as f:
+                f.write(b"".join(nomes))
+            with open(self._caminho("nome.i8"), "ab") as f:
+                (base + np.cumsum([len(b) for b in nomes], dtype=np.int64)).tofile(f)
+            # Por último: só agora as linhas passam a valer
+            with open(self._caminho("id.i8"), "ab") as f:
+                np.array([e["id"] for e in entradas], dtype=np.int64).tofile(f)
+        return len(entradas)
+
+    def limpar(self):
+        with self._lock:
+            for nome in os.listdir(self.diretorio):
+                os.remove(self._caminho(nome))
+            self.itens = []
+
+    def reconstruir(self, entradas, lote=LOTE_IMPORTACAO):
+        """Apaga as colunas e grava `entradas` (qualquer iterável) em grupos de `lote` linhas."""
+        self.limpar()
+        total, grupo = 0, []
+        for entrada in entradas:
+            grupo.append(entrada)
+            if len(grupo) >= lote:
+                total += self.acrescentar(grupo)
+                grupo = []
+        return total + self.acrescentar(grupo)
+
+    # --- Consultas ---
+
+    def filtro(self, inicio=None, fim=None, ids=None, nome=None):
+        """Máscara booleana das linhas com data em [inicio, fim], id em `ids` e `nome` contido no nome."""
+        mascara = np.ones(len(self), dtype=bool)
+        if inicio is not None or fim is not None:
+            datas = self.datas()
+            if inicio is not None:
+                mascara &= datas >= np.datetime64(inicio, "D")
+            if fim is not None:
+                mascara &= datas <= np.datetime64(fim, "D")
+        if ids is not None:
+            mascara &= np.isin(self.ids(), np.asarray(list(ids), dtype=np.int64))
+        if nome:
+            nome = nome.lower()
+            mascara &= np.array([nome in n.lower() for n in self.nomes()], dtype=bool)
+        return mascara
+
+    def _itens(self, itens):
+        return self.itens if itens is None else [i for i in itens if i in self.itens]
+
+    def percentis(self, q=(10, 25, 50, 75, 90), itens=None, mascara=None):
+        """Percentis de cada item (DataFrame itens × percentis), ignorando NaN."""
+        linhas = []
+        for item in self._itens(itens):
+            valores = self.coluna(item)
+            valores = valores[mascara] if mascara is not None else np.asarray(valores)
+            valores = valores[~np.isnan(valores)]
+            linhas.append(np.percentile(valores, q) if len(valores) else np.full(len(q), np.nan))
+        return pd.DataFrame(linhas, index=pd.Index(self._itens(itens), name="item"), columns=[f"p{p}" for p in q])
+
+    def estatisticas(self, itens=None, mascara=None):
+        """n, média, desvio, mínimo e máximo de cada item."""
+        linhas = []
+        for item in self._itens(itens):
+            valores = self.coluna(item)
+            valores = valores[mascara] if mascara is not None else np.asarray(valores)
+            valores = valores[~np.isnan(valores)]
+            linhas.append((len(valores),) + ((valores.mean(), valores.std(), valores.min(), valores.max()) if len(valores) else (np.nan,) * 4))
+        return pd.DataFrame(linhas, index=pd.Index(self._itens(itens), name="item"), columns=["n", "media", "desvio", "minimo", "maximo"])
+
+    def tendencia(self, freq="Y", itens=None, mascara=None):
+        """Média de cada item por período ("Y", "Q" ou "M") da data de arquivamento (DataFrame períodos × itens)."""
+        datas = self.datas()
+        validas = ~np.isnat(datas)
+        if mascara is not None:
+            validas &= mascara
+        datas = datas[validas]
+        if not len(datas):
+            return pd.DataFrame(columns=self._itens(itens), dtype=float)
+        meses = datas.astype("datetime64[M]").astype(np.int64)  # meses desde 1970-01
+        passo = {"Y": 12, "Q": 3, "M": 1}[freq]
+        codigos = meses // passo
+        base = codigos.min()
+        codigos = codigos - base
+        tamanho = int(codigos.max()) + 1
+        medias = {}
+        for item in self._itens(itens):
+            valores = np.asarray(self.coluna(item)[validas])
+            presentes = ~np.isnan(valores)
+            soma = np.bincount(codigos[presentes], weights=valores[presentes], minlength=tamanho)
+            contagem = np.bincount(codigos[presentes], minlength=tamanho)
+            medias[item] = np.divide(soma, contagem, out=np.full(tamanho, np.nan), where=contagem > 0)
+        inicio_periodos = ((np.arange(tamanho) + base) * passo).astype("datetime64[M]")
+        indice = pd.PeriodIndex(pd.DatetimeIndex(inicio_periodos), freq={"Y": "Y", "Q": "Q", "M": "M"}[freq])
+        usados = np.bincount(codigos, minlength=tamanho) > 0
+        return pd.DataFrame(medias, index=indice)[usados]
+
+
+_colunares = {}
+_colunares_lock = threading.Lock()
+
+
+def obter_colunar(tipo, diretorio=None):
+    """O histórico colunar de `tipo` (um por processo e diretório)."""
+    caminho = os.path.join(diretorio or DIRETORIO, tipo)
+    with _colunares_lock:
+        if caminho not in _colunares:
+            _colunares[caminho] = HistoricoColunar(caminho)
+        return _colunares[caminho]
+
+
+def registrar(tipo, entrada, storage):
+    """
+    Espelha uma entrada recém-gravada no histórico do armazenamento. Roda dentro do
+    salvamento, que já foi confirmado: se o colunar estiver atrasado (ex.: criado depois
+    do histórico) a entrada não é acrescentada, e a reconstrução fica para a próxima
+    consulta pela linha de comando (ou `importar`). Erros são só registrados no log.
+    """
+    try:
+        colunar = obter_colunar(tipo)
+        if colunar.ultimo_id() == entrada["id"] - 1:
+            colunar.acrescentar([entrada])
+        else:
+            logger.info("Histórico colunar '%s' desatualizado; será reconstruído na próxima consulta.", tipo)
+    except Exception:
+        logger.exception("Falha ao espelhar a entrada %s no histórico colunar '%s'.", entrada.get("id"), tipo)
+
+
+def sincronizar(tipo, storage):
+    """O colunar de `tipo`, reconstruído a partir do armazenamento se estiver atrasado."""
+    colunar = obter_colunar(tipo)
+    entradas = storage.load_historico(tipo)
+    if colunar.ultimo_id() != (entradas[-1]["id"] if entradas else 0):
+        colunar.reconstruir(entradas)
+    return colunar
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Histórico de custos em formato colunar.")
+    sub = parser.add_subparsers(dest="comando", required=True)
+    imp = sub.add_parser("importar", help="reconstrói as colunas a partir do armazenamento")
+    imp.add_argument("--backend", choices=BACKENDS, default=os.environ.get("STORAGE_BACKEND", "sqlite"))
+    for nome in ("percentis", "tendencia"):
+        p = sub.add_parser(nome)
+        p.add_argument("--backend", choices=BACKENDS, default=os.environ.get("STORAGE_BACKEND", "sqlite"))
+        p.add_argument("--tipo", choices=("direto", "indireto"), default="direto")
+        p.add_argument("--de", help="data inicial (AAAA-MM-DD)")
+        p.add_argument("--ate", help="data final (AAAA-MM-DD)")
+        p.add_argument("--nome", help="só obras cujo nome contém este texto")
+        if nome == "tendencia":
+            p.add_argument("--freq", choices=FREQUENCIAS, default="Y")
+    args = parser.parse_args(argv)
+
+    if args.comando == "importar":
+        storage = create_storage(args.backend)
+        for tipo in ("direto", "indireto"):
+            print(f"{tipo}: {obter_colunar(tipo).reconstruir(storage.load_historico(tipo))} entradas")
+        return 0
+    colunar = sincronizar(args.tipo, create_storage(args.backend))
+    mascara = colunar.filtro(args.de, args.ate, nome=args.nome)
+    with pd.option_context("display.width", 200, "display.max_columns", 20):
+        if args.comando == "percentis":
+            print(f"{int(mascara.sum())} de {len(colunar)} entradas")
+            print(colunar.percentis(mascara=mascara).round(2))
+        else:
+            print(colunar.tendencia(args.freq, mascara=mascara).round(2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
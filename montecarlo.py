@@ -0,0 +1,144 @@
+# montecarlo.py
+"""
+Simulação de Monte Carlo da margem de lucro.
+
+Sorteia os percentuais das etapas da obra e dos custos indiretos dentro das
+faixas (mínimo, padrão, máximo) de `ETAPAS_OBRA` e `DEFAULT_CUSTOS_INDIRETOS`,
+além de faixas configuráveis para o preço de venda e o custo por m². Os sorteios
+são processados em blocos, acumulando apenas um histograma de tamanho fixo, de
+modo que a memória usada não depende do número de sorteios.
+"""
+import numpy as np
+
+from utils import ETAPAS_OBRA, DEFAULT_CUSTOS_INDIRETOS
+
+DISTRIBUICOES = ("triangular", "pert")
+TAMANHO_BLOCO = 100_000
+BINS_HISTOGRAMA = 20_000
+
+
+def _faixas(constantes, atuais):
+    """Matriz (3, k) com mínimo, moda e máximo; a moda é o valor atual do projeto, limitado à faixa."""
+    minimo = np.array([v[0] for v in constantes.values()], dtype=float)
+    maximo = np.array([v[2] for v in constantes.values()], dtype=float)
+    moda = np.array([atuais.get(item, v[1]) for item, v in constantes.items()], dtype=float)
+    return np.vstack([minimo, np.clip(moda, minimo, maximo), maximo])
+
+
+def amostrar(rng, faixas, n, distribuicao="triangular"):
+    """Sorteia n linhas de uma matriz (3, k) de faixas. Faixas degeneradas (mín = máx) são constantes."""
+    minimo, moda, maximo = (np.asarray(f, dtype=float) for f in faixas)
+    largura = maximo - minimo
+    degenerada = largura <= 0
+    largura = np.where(degenerada, 1.0, largura)
+    posicao = (moda - minimo) / largura
+    if distribuicao == "pert":
+        alfa = 1 + 4 * posicao
+        beta = 1 + 4 * (1 - posicao)
+        u = rng.beta(alfa, beta, size=(n, minimo.size))
+    else:
+        # Inversa da CDF triangular no intervalo [0, 1]
+        r = rng.random(size=(n, minimo.size))
+        u = np.where(r < posicao, np.sqrt(r * posicao), 1 - np.sqrt((1 - r) * (1 - posicao)))
+    return np.where(degenerada, minimo, minimo + u * largura)
+
+
+def simulate_margin(modelo, info, n_sorteios=1_000_000, preco_m2=None, custo_m2=None, distribuicao="triangular",
+                    seed=None, tamanho_bloco=TAMANHO_BLOCO):
+    """
+    Simula a margem de lucro (%) do projeto.
+
+    `preco_m2` e `custo_m2` são tuplas (mínimo, moda, máximo); se omitidas, o
+    valor atual do projeto é usado como constante. Os percentuais de etapas
+    escalam o custo direto em relação à distribuição atual do projeto; os
+    indiretos incidem sobre o VGV sorteado.
+    Retorna um dicionário com percentis, probabilidade de prejuízo e o histograma.
+    """
+    if distribuicao not in DISTRIBUICOES:
+        raise ValueError(f"Distribuição desconhecida: {distribuicao}")
+    rng = np.random.default_rng(seed)
+
+    etapas_atuais = {k: v['percentual'] for k, v in (info.get('etapas_percentuais') or {}).items()}
+    indiretos_atuais = {k: v['percentual'] for k, v in (info.get('custos_indiretos_percentuais') or {}).items()}
+    faixas_etapas = _faixas(ETAPAS_OBRA, etapas_atuais)
+    faixas_indiretos = _faixas(DEFAULT_CUSTOS_INDIRETOS, indiretos_atuais)
+    # Itens fora das constantes (ex.: adicionados manualmente) entram como valor fixo
+    indireto_extra = sum(v for k, v in indiretos_atuais.items() if k not in DEFAULT_CUSTOS_INDIRETOS)
+    soma_etapas_atual = faixas_etapas[1].sum() or 100.0
+
+    faixa_preco = np.array(preco_m2 or (modelo.preco_medio_venda_m2,) * 3, dtype=float).reshape(3, 1)
+    faixa_custo = np.array(custo_m2 or (modelo.custo_area_privativa,) * 3, dtype=float).reshape(3, 1)
+    custo_fixo = modelo.custo_terreno_total + modelo.custo_indireto_obra_total
+    area_privativa, area_eq = modelo.area_privativa, modelo.area_equivalente_total
+
+    # Limites analíticos da margem (o modelo é monótono em cada entrada) para o histograma
+    def _margem(preco, custo, soma_etapas, soma_indiretos):
+        vgv = area_privativa * preco
+        custo_total = area_eq * custo * soma_etapas / soma_etapas_atual + vgv * (soma_indiretos + indireto_extra) / 100 + custo_fixo
+        return (vgv - custo_total) / vgv * 100
+    if area_privativa <= 0 or faixa_preco[0, 0] <= 0:
+        raise ValueError("A simulação requer área privativa e preço de venda positivos.")
+    margem_min = _margem(faixa_preco[0, 0], faixa_custo[2, 0], faixas_etapas[2].sum(), faixas_indiretos[2].sum())
+    margem_max = _margem(faixa_preco[2, 0], faixa_custo[0, 0], faixas_etapas[0].sum(), faixas_indiretos[0].sum())
+    if margem_max <= margem_min:
+        margem_max = margem_min + 1e-9
+    bordas = np.linspace(margem_min, margem_max, BINS_HISTOGRAMA + 1)
+    contagem = np.zeros(BINS_HISTOGRAMA, dtype=np.int64)
+
+    soma_lucro = soma_lucro2 = soma_margem = 0.0
+    prejuizos = 0
+    restantes = int(n_sorteios)
+    while restantes > 0:
+        n = min(restantes, tamanho_bloco)
+        preco = amostrar(rng, faixa_preco, n, distribuicao)[:, 0]
+        custo = amostrar(rng, faixa_custo, n, distribuicao)[:, 0]
+        soma_etapas = amostrar(rng, faixas_etapas, n, distribuicao).sum(axis=1)
+        soma_indiretos = amostrar(rng, faixas_indiretos, n, distribuicao).sum(axis=1) + indireto_extra
+
+        vgv = area_privativa * preco
+        custo_total = area_eq * custo * (soma_etapas / soma_etapas_atual) + vgv * (soma_indiretos / 100) + custo_fixo
+        lucro = vgv - custo_total
+        margem = lucro / vgv * 100
+
+        indices = np.clip(np.searchsorted(bordas, margem, side="right") - 1, 0, BINS_HISTOGRAMA - 1)
+        contagem += np.bincount(indices, minlength=BINS_HISTOGRAMA)
+        soma_lucro += lucro.sum(); soma_lucro2 += np.square(lucro).sum(); soma_margem += margem.sum()
+        prejuizos += int(np.count_nonzero(lucro < 0))
+        restantes -= n
+
+    total = int(n_sorteios)
+    media_lucro = soma_lucro / total
+    return {
+        "n_sorteios": total,
+        "distribuicao": distribuicao,
+        "seed": seed,
+        "p5": percentil_histograma(bordas, contagem, 5),
+        "p50": percentil_histograma(bordas, contagem, 50),
+        "p95": percentil_histograma(bordas, contagem, 95),
+        "margem_media": float(soma_margem / total),
+        "lucro_medio": float(media_lucro),
+        "lucro_desvio": float(np.sqrt(max(soma_lucro2 / total - media_lucro ** 2, 0.0))),
+        "prob_prejuizo": prejuizos / total,
+        "bordas": bordas,
+        "contagem": contagem,
+    }
+
+
+def percentil_histograma(bordas, contagem, q):
+    """Percentil q (0-100) interpolado linearmente dentro do bin do histograma acumulado."""
+    acumulado = np.cumsum(contagem)
+    alvo = acumulado[-1] * q / 100
+    i = int(np.searchsorted(acumulado, alvo, side="left"))
+    i = min(i, len(contagem) - 1)
+    antes = acumulado[i - 1] if i > 0 else 0
+    fracao = (alvo - antes) / contagem[i] if contagem[i] > 0 else 0.0
+    return float(bordas[i] + fracao * (bordas[i + 1] - bordas[i]))
+
+
+def histograma_reduzido(bordas, contagem, bins=100):
+    """Agrupa o histograma fino em `bins` faixas para exibição."""
+    fator = max(len(contagem) // bins, 1)
+    n = len(contagem) // fator * fator
+    contagem_reduzida = contagem[:n].reshape(-1, fator).sum(axis=1)
+    centros = (bordas[:n:fator] + bordas[fator:n + 1:fator]) / 2
+    return centros, contagem_reduzida
@@ -1,4 +1,5 @@
 # pages/1_Custos_Diretos.py
+import io
 import streamlit as st
 import pandas as pd
 import plotly.express as px
@@ -7,8 +8,11 @@ from utils import (
     list_projects, save_project, load_project, delete_project,
     DEFAULT_PAVIMENTO, ETAPAS_OBRA, DEFAULT_CUSTOS_INDIRETOS, DEFAULT_CUSTOS_INDIRETOS_FIXOS,
     DEFAULT_CUSTOS_INDIRETOS_OBRA, JSON_PATH, HISTORICO_DIRETO_PATH, HISTORICO_INDIRETO_PATH,
-    load_json, save_to_historico, TIPOS_PAVIMENTO
+    load_json, save_to_historico, TIPOS_PAVIMENTO, normalizar_pavimentos
 )
+from historico import obter_historico
+from similares import GRUPOS as GRUPOS_SIMILARIDADE, GRUPOS_PADRAO, projetos_similares
+from viability import ViabilityModel
 
 st.set_page_config(page_title="Custos Diretos", layout="wide")
 
@@ -32,29 +36,6 @@ if 'custos_indiretos_obra' not in st.session_state:
 if 'duracao_obra' not in st.session_state:
     st.session_state.duracao_obra = info.get('duracao_obra', 12)
 
-# --- CÁLCULOS PRELIMINARES ---
-pavimentos_df = pd.DataFrame(info.get('pavimentos', []))
-custos_config = info.get('custos_config', {})
-custo_direto_total, area_construida_total = 0, 0
-custo_indireto_obra_total = 0
-
-if not pavimentos_df.empty:
-    custo_area_privativa = custos_config.get('custo_area_privativa', 4500.0)
-    pavimentos_df["area_total"] = pavimentos_df["area"] * pavimentos_df["rep"]
-    pavimentos_df["area_eq"] = pavimentos_df["area_total"] * pavimentos_df["coef"]
-    pavimentos_df["area_constr"] = pavimentos_df.apply(lambda r: r["area_total"] if r["constr"] else 0.0, axis=1)
-    pavimentos_df["custo_direto"] = pavimentos_df["area_eq"] * custo_area_privativa
-    custo_direto_total = pavimentos_df["custo_direto"].sum()
-    area_construida_total = pavimentos_df["area_constr"].sum()
-
-# Calcular novos custos indiretos da obra (será usado na página de resultados)
-for item, valor_mensal in st.session_state.custos_indiretos_obra.items():
-    custo_indireto_obra_total += valor_mensal * st.session_state.duracao_obra
-
-# O custo direto do projeto agora inclui os custos indiretos de obra
-custo_direto_total_final = custo_direto_total
-
-
 with st.expander("📝 Dados Gerais do Projeto", expanded=True):
     c1, c2, c3, c4 = st.columns(4)
     cores = ["#31708f", "#3c763d", "#8a6d3b", "#a94442"]
@@ -63,59 +44,28 @@ with st.expander("📝 Dados Gerais do Projeto", expanded=True):
     c3.markdown(render_metric_card("Área Privativa", f"{fmt_br(info['area_privativa'])} m²", cores[2]), unsafe_allow_html=True)
     c4.markdown(render_metric_card("Nº Unidades", str(info["num_unidades"]), cores[3]), unsafe_allow_html=True)
 
-with st.expander("🏢 Dados dos Pavimentos", expanded=True):
-    b1, b2, _ = st.columns([0.2, 0.2, 0.6])
-    if b1.button("➕ Adicionar Pavimento"): st.session_state.pavimentos.append(DEFAULT_PAVIMENTO.copy()); st.rerun()
-    if b2.button("➖ Remover Último"):
-        if st.session_state.pavimentos: st.session_state.pavimentos.pop(); st.rerun()
-
-    col_widths = [3, 3, 1, 1.2, 1.5, 1.5, 1.5, 1.5]
-    headers = ["Nome", "Tipo", "Rep.", "Coef.", "Área (m²)", "Área Eq. Total", "Área Constr.", "Considerar A.C?"]
-    header_cols = st.columns(col_widths)
-    for hc, title in zip(header_cols, headers): hc.markdown(f'**{title}**')
-
-    for i, pav in enumerate(st.session_state.pavimentos):
-        cols = st.columns(col_widths)
-        pav['nome'] = cols[0].text_input("nome", pav['nome'], key=f"nome_{i}", label_visibility="collapsed")
-        pav['tipo'] = cols[1].selectbox("tipo", list(TIPOS_PAVIMENTO.keys()), list(TIPOS_PAVIMENTO.keys()).index(pav.get('tipo', next(iter(TIPOS_PAVIMENTO)))), key=f"tipo_{i}", label_visibility="collapsed")
-        pav['rep'] = cols[2].number_input("rep", min_value=1, value=pav['rep'], step=1, key=f"rep_{i}", label_visibility="collapsed")
-        min_c, max_c = TIPOS_PAVIMENTO[pav['tipo']]
-        pav['coef'] = min_c if min_c == max_c else cols[3].slider("coef", min_c, max_c, float(pav.get('coef', min_c)), 0.01, format="%.2f", key=f"coef_{i}", label_visibility="collapsed")
-        if min_c == max_c: cols[3].markdown(f"<div style='text-align:center; padding-top: 8px;'>{pav['coef']:.2f}</div>", unsafe_allow_html=True)
-        pav['area'] = cols[4].number_input("area", min_value=0.0, value=float(pav['area']), step=10.0, format="%.2f", key=f"area_{i}", label_visibility="collapsed")
-        pav['constr'] = cols[7].selectbox("incluir", ["Sim", "Não"], 0 if pav.get('constr', True) else 1, key=f"constr_{i}", label_visibility="collapsed") == "Sim"
-        total_i, area_eq_i = pav['area'] * pav['rep'], (pav['area'] * pav['rep']) * pav['coef']
-        cols[5].markdown(f"<div style='text-align:center; padding-top: 8px;'>{fmt_br(area_eq_i)}</div>", unsafe_allow_html=True)
-        cols[6].markdown(f"<div style='text-align:center; padding-top: 8px;'>{fmt_br(total_i)}</div>", unsafe_allow_html=True)
-
-info['pavimentos'] = st.session_state.pavimentos
-info['custos_indiretos_obra'] = st.session_state.custos_indiretos_obra
-info['duracao_obra'] = st.session_state.duracao_obra
+# --- Fragmentos ---
+# A página é dividida em fragmentos que reexecutam sozinhos: editar uma etapa reexecuta
+# só a tabela de etapas; editar um pavimento reexecuta os pavimentos, o resumo e, por
+# estarem aninhadas, as etapas (cujo custo depende do custo direto). A sidebar e os dados
+# gerais só rodam na execução completa da página. O histórico vem do cache do processo
+# (`historico.obter_historico`), que só relê o armazenamento quando ele muda.
 
-
-if not pavimentos_df.empty:
-    df = pd.DataFrame(info['pavimentos'])
-    custos_config = info.get('custos_config', {})
-    df["area_total"] = df["area"] * df["rep"]
-    df["area_eq"] = df["area_total"] * df["coef"]
-    df["area_constr"] = df.apply(lambda r: r["area_total"] if r["constr"] else 0.0, axis=1)
-    df["custo_direto"] = df["area_eq"] * custos_config.get('custo_area_privativa', 4500.0)
-    
-    # O custo direto do projeto agora é a soma simples dos custos diretos da construção
-    custo_direto_total_final = df["custo_direto"].sum()
-    
+def secao_resumo(modelo):
+    """Cards, gráfico por tipo e detalhamento; dependem apenas dos pavimentos."""
+    df = modelo.pavimentos_df
+    custo_direto_total_final = modelo.custo_direto_total
     with st.expander("📊 Análise e Resumo Financeiro", expanded=True):
-        total_constr = df["area_constr"].sum()
-        custo_por_ac = custo_direto_total_final / total_constr if total_constr > 0 else 0.0
-        custo_med_unit = custo_direto_total_final / info["num_unidades"] if info["num_unidades"] > 0 else 0.0
+        total_constr = modelo.area_construida_total
+        custo_por_ac = modelo.custo_direto_m2
+        custo_med_unit = modelo.custo_medio_unidade
         card_cols = st.columns(4)
         card_cols[0].markdown(render_metric_card("Custo Direto do Projeto", f"R$ {fmt_br(custo_direto_total_final)}", cores[3]), unsafe_allow_html=True)
         card_cols[1].markdown(render_metric_card("Custo Médio / Unidade", f"R$ {fmt_br(custo_med_unit)}", "#337ab7"), unsafe_allow_html=True)
         card_cols[2].markdown(render_metric_card("Custo / m² (Área Constr.)", f"R$ {fmt_br(custo_por_ac)}", cores[1]), unsafe_allow_html=True)
         card_cols[3].markdown(render_metric_card("Área Construída Total", f"{fmt_br(total_constr)} m²", cores[2]), unsafe_allow_html=True)
-        
-        custo_por_tipo = df.groupby("tipo")["custo_direto"].sum().reset_index()
-        fig = px.bar(custo_por_tipo, x='tipo', y='custo_direto', text_auto='.2s', title="Custo Direto por Tipo de Pavimento")
+
+        fig = px.bar(modelo.custo_por_tipo, x='tipo', y='custo_direto', text_auto='.2s', title="Custo Direto por Tipo de Pavimento")
         fig.update_traces(textfont_size=12, textangle=0, textposition="outside", cliponaxis=False); fig.update_layout(xaxis_title=None, yaxis_title="Custo (R$)")
         st.plotly_chart(fig, use_container_width=True)
 
@@ -128,6 +78,16 @@ if not pavimentos_df.empty:
                 "Área Constr. (m²)": st.column_config.NumberColumn(format="%.2f"), "Custo Direto (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
             })
 
+
+def buscar_semelhantes(historico):
+    """Obras do histórico mais parecidas com o projeto, pelos critérios escolhidos no painel de semelhantes."""
+    percentuais = {e: v['percentual'] for e, v in st.session_state.get('etapas_percentuais', {}).items()}
+    pesos = {g: 1.0 for g in st.session_state.get("sim_grupos", list(GRUPOS_PADRAO))}
+    return projetos_similares(historico, info, percentuais, int(st.session_state.get("sim_k", 5)), pesos)
+
+
+@st.fragment
+def tabela_etapas(custo_direto_total_final):
     with st.expander("💸 Custo Direto por Etapa da Obra", expanded=True):
         if 'etapas_percentuais' not in st.session_state:
             etapas_salvas = info.get('etapas_percentuais', {})
@@ -138,49 +98,234 @@ if not pavimentos_df.empty:
 
         if 'previous_etapas_percentuais' not in st.session_state:
             st.session_state.previous_etapas_percentuais = {k: v.copy() for k, v in st.session_state.etapas_percentuais.items()}
-        
+
         st.markdown("##### Comparativo com Histórico de Obras")
-        obras_historicas = load_json(HISTORICO_DIRETO_PATH)
-        obra_ref_selecionada = st.selectbox("Usar como Referência:", ["Nenhuma"] + [f"{o['id']} – {o['nome']}" for o in obras_historicas], index=0, key="ref_direto")
-        
+        historico = obter_historico('direto')
+        opcoes = [None] + (["mediana", "semelhantes"] if len(historico) else []) + historico.ids
+        rotulos = {None: "Nenhuma", "mediana": f"Mediana do histórico ({len(historico)} obras)",
+                   "semelhantes": f"Mediana das {int(st.session_state.get('sim_k', 5))} obras mais semelhantes"}
+        obra_ref_selecionada = st.selectbox("Usar como Referência:", opcoes, index=0, key="ref_direto",
+                                            format_func=lambda o: rotulos[o] if o in rotulos else historico.rotulo(o))
+
         ref_percentuais, ref_nome = {}, None
-        if obra_ref_selecionada != "Nenhuma":
-            ref_id = int(obra_ref_selecionada.split("–")[0].strip())
-            ref_nome = obra_ref_selecionada.split("–")[1].strip()
-            obra_ref_data = next((o for o in obras_historicas if o['id'] == ref_id), None)
-            if obra_ref_data: ref_percentuais = obra_ref_data['percentuais']
-        
+        if obra_ref_selecionada == "mediana":
+            ref_percentuais, ref_nome = historico.agregados["mediana"].dropna().to_dict(), "Mediana do histórico"
+        elif obra_ref_selecionada == "semelhantes":
+            ref_percentuais, ref_nome = buscar_semelhantes(historico)[1]["p50"].dropna().to_dict(), "Obras semelhantes"
+        elif obra_ref_selecionada is not None:
+            obra_ref_data = historico.por_id[obra_ref_selecionada]
+            ref_percentuais, ref_nome = obra_ref_data['percentuais'], obra_ref_data['nome']
+
         st.divider()
         cols = st.columns([2.5, 1.5, 1, 1.5, 1, 1.5, 1])
         cols[0].markdown("**Etapa**"); cols[1].markdown("**Fonte**"); cols[2].markdown("**Ref. (%)**")
         cols[3].markdown("**Seu Projeto (%)**"); cols[5].markdown("<p style='text-align: center;'>Custo (R$)</p>", unsafe_allow_html=True); cols[6].markdown("<p style='text-align: center;'>Ação</p>", unsafe_allow_html=True)
 
+        st.multiselect("Manter fixas na redistribuição:", list(ETAPAS_OBRA), key="etapas_fixas",
+                      help="Ao alterar uma etapa, a diferença é compensada apenas pelas etapas não fixadas, respeitando os limites de cada uma.")
+
+        def sincronizar_widgets():
+            for e, v in st.session_state.etapas_percentuais.items():
+                st.session_state[f"slider_etapa_{e}"] = st.session_state[f"input_etapa_{e}"] = v['percentual']
+
+        def editar_etapa(etapa, valor, fonte):
+            # Callback: roda antes da próxima execução, então a edição custa um único rerun
+            st.session_state.etapas_percentuais[etapa]['percentual'] = valor
+            st.session_state.etapas_percentuais[etapa]['fonte'] = fonte
+            handle_percentage_redistribution('etapas_percentuais', ETAPAS_OBRA, fixos=st.session_state.get("etapas_fixas", ()))
+            sincronizar_widgets()
+
         for etapa, (min_val, default_val, max_val) in ETAPAS_OBRA.items():
             c = st.columns([2.5, 1.5, 1, 1.5, 1, 1.5, 1])
             c[0].container(height=38, border=False).write(etapa)
-            etapa_info = st.session_state.etapas_percentuais.get(etapa, {"percentual": default_val, "fonte": "Manual"})
+            etapa_info = st.session_state.etapas_percentuais.setdefault(etapa, {"percentual": default_val, "fonte": "Manual"})
             c[1].container(height=38, border=False).write(etapa_info['fonte'])
             ref_val = ref_percentuais.get(etapa, 0)
-            c[2].container(height=38, border=False).write(f"{ref_val:.2f}%" if obra_ref_selecionada != "Nenhuma" else "-")
-            
+            c[2].container(height=38, border=False).write(f"{ref_val:.2f}%" if ref_nome else "-")
+
             slider_col, input_col = c[3], c[4]
-            current_percent = etapa_info['percentual']
-            
-            percent_slider = slider_col.slider("slider", min_val, max_val, float(current_percent), 0.1, key=f"slider_etapa_{etapa}", label_visibility="collapsed")
-            percent_input = input_col.number_input("input", min_val, max_val, percent_slider, 0.1, key=f"input_etapa_{etapa}", label_visibility="collapsed")
-
-            if percent_input != current_percent:
-                st.session_state.etapas_percentuais[etapa]['percentual'] = percent_input
-                st.session_state.etapas_percentuais[etapa]['fonte'] = "Manual"
-                handle_percentage_redistribution('etapas_percentuais', ETAPAS_OBRA)
-                st.rerun()
-
-            custo_etapa = custo_direto_total_final * (percent_input / 100) # Custo calculado sobre o total ajustado
+            current_percent = float(etapa_info['percentual'])
+            for chave in (f"slider_etapa_{etapa}", f"input_etapa_{etapa}"):
+                if chave not in st.session_state: st.session_state[chave] = current_percent
+
+            slider_col.slider("slider", min_val, max_val, step=0.1, key=f"slider_etapa_{etapa}", label_visibility="collapsed",
+                              on_change=lambda e=etapa: editar_etapa(e, st.session_state[f"slider_etapa_{e}"], "Manual"))
+            input_col.number_input("input", min_val, max_val, step=0.1, key=f"input_etapa_{etapa}", label_visibility="collapsed",
+                                   on_change=lambda e=etapa: editar_etapa(e, st.session_state[f"input_etapa_{e}"], "Manual"))
+
+            custo_etapa = custo_direto_total_final * (current_percent / 100) # Custo calculado sobre o total ajustado
             c[5].markdown(f"<p style='text-align: center;'>R$ {fmt_br(custo_etapa)}</p>", unsafe_allow_html=True)
-            
-            if c[6].button("⬅️", key=f"apply_{etapa}", help=f"Aplicar percentual de referência ({ref_val:.2f}%)", use_container_width=True):
-                if ref_nome:
-                    st.session_state.etapas_percentuais[etapa]['percentual'] = ref_val
-                    st.session_state.etapas_percentuais[etapa]['fonte'] = ref_nome
-                    handle_percentage_redistribution('etapas_percentuais', ETAPAS_OBRA)
-                    st.rerun()
+
+            c[6].button("⬅️", key=f"apply_{etapa}", help=f"Aplicar percentual de referência ({ref_val:.2f}%)", use_container_width=True,
+                        disabled=not ref_nome, on_click=editar_etapa, args=(etapa, ref_val, ref_nome))
+
+
+@st.fragment
+def painel_semelhantes():
+    historico = obter_historico('direto')
+    with st.expander("🔎 Obras Semelhantes do Histórico", expanded=False):
+        if not len(historico):
+            st.info("Nenhuma obra arquivada no histórico ainda.")
+            return
+        c1, c2 = st.columns([1, 3])
+        c1.number_input("Nº de obras", min_value=1, max_value=50, value=5, step=1, key="sim_k")
+        c2.multiselect("Comparar por", list(GRUPOS_SIMILARIDADE), default=list(GRUPOS_PADRAO), key="sim_grupos",
+                       format_func=GRUPOS_SIMILARIDADE.get)
+        if not st.session_state.sim_grupos:
+            st.warning("Escolha ao menos um critério de comparação.")
+            return
+        vizinhos, faixa = buscar_semelhantes(historico)
+        st.dataframe(vizinhos.rename(columns={"id": "ID", "nome": "Obra", "data": "Arquivada em", "distancia": "Distância",
+                                              "similaridade": "Similaridade"}),
+                     use_container_width=True, hide_index=True,
+                     column_config={"Distância": st.column_config.NumberColumn(format="%.3f"),
+                                    "Similaridade": st.column_config.ProgressColumn(min_value=0.0, max_value=1.0, format="%.2f")})
+        st.markdown(f"##### Faixa de cada etapa entre as {len(vizinhos)} obras")
+        faixa = faixa.rename(columns={"p10": "P10 (%)", "p50": "Mediana (%)", "p90": "P90 (%)"})
+        faixa["Seu Projeto (%)"] = [st.session_state.etapas_percentuais.get(e, {}).get('percentual') for e in faixa.index]
+        faixa["Fora da faixa"] = (faixa["Seu Projeto (%)"] < faixa["P10 (%)"]) | (faixa["Seu Projeto (%)"] > faixa["P90 (%)"])
+        st.dataframe(faixa.reset_index().rename(columns={"item": "Etapa"}), use_container_width=True, hide_index=True,
+                     column_config={c: st.column_config.NumberColumn(format="%.2f") for c in ("P10 (%)", "Mediana (%)", "P90 (%)", "Seu Projeto (%)")})
+
+
+# --- Editor de pavimentos ---
+# Uma única tabela (st.data_editor) dentro de um formulário: as edições ficam no navegador
+# e são aplicadas de uma vez ao confirmar, e o número de widgets não cresce com os pavimentos.
+
+COLUNAS_EDITOR = {
+    "_index": st.column_config.NumberColumn("Nº", disabled=True),
+    "nome": st.column_config.TextColumn("Nome", required=True),
+    "tipo": st.column_config.SelectboxColumn("Tipo", options=list(TIPOS_PAVIMENTO), required=True, width="large"),
+    "rep": st.column_config.NumberColumn("Rep.", min_value=1, step=1, required=True),
+    "coef": st.column_config.NumberColumn("Coef.", min_value=0.0, max_value=max(v[1] for v in TIPOS_PAVIMENTO.values()), step=0.01, format="%.2f",
+                                          help="Limitado à faixa do tipo de pavimento ao aplicar."),
+    "area": st.column_config.NumberColumn("Área (m²)", min_value=0.0, step=10.0, format="%.2f", required=True),
+    "area_eq": st.column_config.NumberColumn("Área Eq. Total", format="%.2f", disabled=True),
+    "area_constr": st.column_config.NumberColumn("Área Constr.", format="%.2f", disabled=True),
+    "constr": st.column_config.CheckboxColumn("Considerar A.C?"),
+}
+
+def chave_editor():
+    # A versão muda a cada alteração aplicada, para o editor recomeçar a partir dos dados atuais
+    return f"editor_pavimentos_{st.session_state.setdefault('pavimentos_versao', 0)}"
+
+def gravar_pavimentos(pavimentos):
+    st.session_state.pavimentos = pavimentos
+    st.session_state.pavimentos_versao = st.session_state.get('pavimentos_versao', 0) + 1
+
+def aplicar_edicoes():
+    """Aplica de uma vez as alterações acumuladas no editor (editadas, removidas e novas)."""
+    delta = st.session_state.get(chave_editor(), {})
+    linhas = [p.copy() for p in st.session_state.pavimentos]
+    for indice, mudancas in delta.get("edited_rows", {}).items():
+        linhas[int(indice)].update(mudancas)
+    removidas = set(delta.get("deleted_rows", []))
+    linhas = [p for i, p in enumerate(linhas) if i not in removidas] + list(delta.get("added_rows", []))
+    gravar_pavimentos(normalizar_pavimentos(linhas))
+
+def interpretar_intervalo(texto, total):
+    """'3-10, 12' -> índices 0-based [2..9, 11]; linhas fora da tabela são ignoradas."""
+    indices = []
+    for parte in texto.replace(";", ",").split(","):
+        parte = parte.strip()
+        if not parte: continue
+        inicio, _, fim = parte.partition("-")
+        inicio, fim = int(inicio), int(fim or inicio)
+        indices.extend(i - 1 for i in range(min(inicio, fim), max(inicio, fim) + 1) if 1 <= i <= total)
+    return sorted(set(indices))
+
+def aplicar_operacao_em_lote():
+    pavimentos = [p.copy() for p in st.session_state.pavimentos]
+    try:
+        indices = interpretar_intervalo(st.session_state.lote_linhas, len(pavimentos))
+    except ValueError:
+        st.session_state.lote_erro = "Intervalo inválido. Use, por exemplo: 3-10, 12"
+        return
+    if not indices:
+        st.session_state.lote_erro = "Nenhuma linha da tabela no intervalo informado."
+        return
+    operacao, valor = st.session_state.lote_operacao, st.session_state.lote_valor
+    if operacao == "Duplicar linhas":
+        # As cópias entram logo após a última linha selecionada, na mesma ordem
+        copias = [pavimentos[i].copy() for i in indices]
+        pavimentos[indices[-1] + 1:indices[-1] + 1] = copias
+    elif operacao == "Remover linhas":
+        pavimentos = [p for i, p in enumerate(pavimentos) if i not in set(indices)]
+    elif operacao == "Definir repetição":
+        # O campo de valor é decimal (serve também ao coeficiente); a repetição não é arredondada
+        if valor < 1 or valor != int(valor):
+            st.session_state.lote_erro = "A repetição deve ser um número inteiro maior ou igual a 1."
+            return
+        for i in indices: pavimentos[i]["rep"] = int(valor)
+    else:
+        for i in indices: pavimentos[i]["coef"] = valor
+    gravar_pavimentos(normalizar_pavimentos(pavimentos))
+    st.session_state.lote_erro = None
+
+def importar_csv():
+    arquivo = st.session_state.get("csv_pavimentos")
+    if arquivo is None:
+        st.session_state.lote_erro = "Selecione um arquivo CSV."
+        return
+    try:
+        # Aceita "," ou ";" como separador; com ";" os decimais são lidos com vírgula
+        conteudo = arquivo.getvalue().decode("utf-8-sig")
+        sep = ";" if conteudo.split("\n", 1)[0].count(";") > conteudo.split("\n", 1)[0].count(",") else ","
+        df_csv = pd.read_csv(io.StringIO(conteudo), sep=sep, decimal="," if sep == ";" else ".")
+        df_csv.columns = [str(c).strip().lower() for c in df_csv.columns]
+        if "area" not in df_csv:
+            raise ValueError("o arquivo precisa ter ao menos a coluna 'area' (opcionais: nome, tipo, rep, coef, constr)")
+        importados = normalizar_pavimentos(df_csv.to_dict("records"))
+    except (ValueError, UnicodeDecodeError, pd.errors.ParserError) as e:
+        st.session_state.lote_erro = f"Não foi possível importar o CSV: {e}"
+        return
+    substituir = st.session_state.csv_modo == "Substituir"
+    gravar_pavimentos(importados if substituir else st.session_state.pavimentos + importados)
+    st.session_state.lote_erro = None
+
+
+@st.fragment
+def secao_pavimentos():
+    info['pavimentos'] = st.session_state.pavimentos
+    modelo = ViabilityModel.from_project(info)
+
+    with st.expander("🏢 Dados dos Pavimentos", expanded=True):
+        colunas = [c for c in COLUNAS_EDITOR if c != "_index"]
+        df_editor = modelo.pavimentos_df.reindex(columns=colunas)
+        df_editor.index = pd.RangeIndex(1, len(df_editor) + 1)  # mesma numeração usada nas operações em lote
+        if df_editor.empty:
+            df_editor = df_editor.astype({"nome": str, "tipo": str, "rep": int, "coef": float, "area": float, "area_eq": float, "area_constr": float, "constr": bool})
+        with st.form("form_pavimentos", border=False):
+            st.data_editor(df_editor, key=chave_editor(), column_config=COLUNAS_EDITOR, column_order=colunas,
+                           num_rows="dynamic", hide_index=False, use_container_width=True)
+            c1, c2 = st.columns([0.25, 0.75])
+            c1.form_submit_button("✅ Aplicar alterações", on_click=aplicar_edicoes, type="primary")
+            c2.caption(f"{len(st.session_state.pavimentos)} pavimentos. As edições na tabela só valem após aplicar.")
+
+        with st.popover("🧰 Operações em lote"):
+            with st.form("form_lote", border=False):
+                st.radio("Operação", ["Duplicar linhas", "Definir repetição", "Definir coeficiente", "Remover linhas"], key="lote_operacao", horizontal=True)
+                st.text_input("Linhas (numeração da tabela, a partir de 1)", placeholder="ex.: 3-10, 12", key="lote_linhas")
+                st.number_input("Valor (repetição ou coeficiente)", min_value=0.0, value=1.0, step=0.01, key="lote_valor")
+                st.form_submit_button("Aplicar", on_click=aplicar_operacao_em_lote)
+            st.divider()
+            with st.form("form_csv", border=False):
+                st.file_uploader("Importar pavimentos de CSV (colunas: nome, tipo, rep, coef, area, constr)", type="csv", key="csv_pavimentos")
+                st.radio("Modo", ["Acrescentar", "Substituir"], key="csv_modo", horizontal=True)
+                st.form_submit_button("Importar", on_click=importar_csv)
+            st.download_button("Exportar CSV", pd.DataFrame(st.session_state.pavimentos, columns=list(DEFAULT_PAVIMENTO)).to_csv(index=False).encode("utf-8"),
+                               file_name=f"Pavimentos_{info['nome']}.csv", mime="text/csv")
+        if st.session_state.get("lote_erro"):
+            st.error(st.session_state.lote_erro)
+
+    if not modelo.pavimentos_df.empty:
+        secao_resumo(modelo)
+        tabela_etapas(modelo.custo_direto_total)
+        painel_semelhantes()
+
+
+info['pavimentos'] = st.session_state.pavimentos
+info['custos_indiretos_obra'] = st.session_state.custos_indiretos_obra
+info['duracao_obra'] = st.session_state.duracao_obra
+
+secao_pavimentos()
@@ -8,6 +8,7 @@ from utils import (
     JSON_PATH, HISTORICO_DIRETO_PATH, HISTORICO_INDIRETO_PATH,
     load_json, save_to_historico
 )
+from viability import ViabilityModel
 from st_aggrid import AgGrid, GridOptionsBuilder, JsCode
 
 st.set_page_config(page_title="Custos Indiretos", layout="wide", page_icon="💸")
@@ -67,9 +68,7 @@ st.subheader("Análise e Detalhamento de Custos Indiretos do Projeto")
 
 
 # Cálculos Preliminares
-custos_config = info.get('custos_config', {})
-preco_medio_venda_m2 = custos_config.get('preco_medio_venda_m2', 10000.0)
-vgv_total = info.get('area_privativa', 0) * preco_medio_venda_m2
+vgv_total = ViabilityModel.from_project(info).vgv_total
 
 # Bloco principal com a nova tabela AgGrid e Gráficos
 with st.expander("Detalhamento de Custos Indiretos", expanded=True):
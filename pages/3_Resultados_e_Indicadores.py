@@ -2,9 +2,11 @@
 import streamlit as st
 import pandas as pd
 from utils import *
-import json
-import requests
-import time
+from datetime import datetime
+from viability import ViabilityModel
+from ai_analysis import analise_em_cache, analise_status, cancel_analise, carregar_benchmarks, chave_analise, montar_prompt, submit_analise
+from sensitivity import sensitivity_analysis, tornado_chart
+from report_jobs import submit_report, job_status, cancel_job, cache_stats
 
 st.set_page_config(page_title="Resultados e Indicadores", layout="wide")
 
@@ -33,40 +35,22 @@ info = st.session_state.projeto_info
 st.title("📈 Resultados e Indicadores Chave")
 
 # --- CÁLCULOS GERAIS ---
-pavimentos_df = pd.DataFrame(info.get('pavimentos', []))
-custos_config = info.get('custos_config', {})
-custo_direto_total, area_construida_total = 0, 0
-if not pavimentos_df.empty:
-    custo_area_privativa = custos_config.get('custo_area_privativa', 4500.0)
-    pavimentos_df["area_total"] = pavimentos_df["area"] * pavimentos_df["rep"]
-    pavimentos_df["area_eq"] = pavimentos_df["area_total"] * pavimentos_df["coef"]
-    pavimentos_df["area_constr"] = pavimentos_df.apply(lambda r: r["area_total"] if r["constr"] else 0.0, axis=1)
-    pavimentos_df["custo_direto"] = pavimentos_df["area_eq"] * custo_area_privativa
-    custo_direto_total = pavimentos_df["custo_direto"].sum()
-    area_construida_total = pavimentos_df["area_constr"].sum()
-
-preco_medio_venda_m2 = custos_config.get('preco_medio_venda_m2', 10000.0)
-vgv_total = info.get('area_privativa', 0) * preco_medio_venda_m2
-
-custos_indiretos_percentuais = info.get('custos_indiretos_percentuais', {})
-custo_indireto_calculado = 0
-if custos_indiretos_percentuais:
-    for item, values in custos_indiretos_percentuais.items():
-        percentual = values.get('percentual', 0)
-        custo_indireto_calculado += vgv_total * (float(percentual) / 100)
-
-custo_terreno_total = info.get('area_terreno', 0) * custos_config.get('custo_terreno_m2', 2500.0)
-
-# Obter o custo indireto de obra da session_state de forma segura
-custo_indireto_obra_total = 0
-if 'custos_indiretos_obra' in st.session_state and 'duracao_obra' in st.session_state:
-    for item, valor_mensal in st.session_state.custos_indiretos_obra.items():
-        custo_indireto_obra_total += valor_mensal * st.session_state.duracao_obra
-
-# TOTAIS - incluindo os custos indiretos de obra
-valor_total_despesas = custo_direto_total + custo_indireto_calculado + custo_terreno_total + custo_indireto_obra_total
-lucratividade_valor = vgv_total - valor_total_despesas
-lucratividade_percentual = (lucratividade_valor / vgv_total) * 100 if vgv_total > 0 else 0
+# Os custos de obra editados nas outras páginas ficam na session_state até serem salvos
+if 'custos_indiretos_obra' in st.session_state: info['custos_indiretos_obra'] = st.session_state.custos_indiretos_obra
+if 'duracao_obra' in st.session_state: info['duracao_obra'] = st.session_state.duracao_obra
+
+modelo = ViabilityModel.from_project(info)
+vgv_total = modelo.vgv_total
+custo_direto_total = modelo.custo_direto_total
+custo_indireto_calculado = modelo.custo_indireto_calculado
+custo_indireto_obra_total = modelo.custo_indireto_obra_total
+custo_terreno_total = modelo.custo_terreno_total
+area_construida_total = modelo.area_construida_total
+valor_total_despesas = modelo.valor_total_despesas
+lucratividade_valor = modelo.lucratividade_valor
+lucratividade_percentual = modelo.lucratividade_percentual
+p_direto, p_indireto_venda = modelo.p_direto, modelo.p_indireto_venda
+p_indireto_obra, p_terreno = modelo.p_indireto_obra, modelo.p_terreno
 
 # --- APRESENTAÇÃO DOS RESULTADOS ---
 with st.container(border=True):
@@ -81,11 +65,6 @@ with st.container(border=True):
     st.subheader("Composição do Custo Total")
     comp_cols = st.columns(4) # Alterado para 4 colunas
     if valor_total_despesas > 0:
-        p_direto = (custo_direto_total / valor_total_despesas * 100)
-        p_indireto_venda = (custo_indireto_calculado / valor_total_despesas * 100)
-        p_indireto_obra = (custo_indireto_obra_total / valor_total_despesas * 100)
-        p_terreno = (custo_terreno_total / valor_total_despesas * 100)
-
         comp_cols[0].markdown(render_metric_card(f"Custo Direto ({p_direto:.2f}%)", f"R$ {fmt_br(custo_direto_total)}", cores[6]), unsafe_allow_html=True)
         comp_cols[1].markdown(render_metric_card(f"Indiretos Venda ({p_indireto_venda:.2f}%)", f"R$ {fmt_br(custo_indireto_calculado)}", cores[7]), unsafe_allow_html=True)
         comp_cols[2].markdown(render_metric_card(f"Indiretos Obra ({p_indireto_obra:.2f}%)", f"R$ {fmt_br(custo_indireto_obra_total)}", "#ff7f0e"), unsafe_allow_html=True) # Novo card
@@ -93,135 +72,57 @@ with st.container(border=True):
     st.divider()
     st.subheader("Indicadores por Área Construída")
     ind_cols = st.columns(4)
-    ind_cols[0].markdown(render_metric_card("Terreno / Custo Total", f"{(custo_terreno_total / valor_total_despesas * 100 if valor_total_despesas > 0 else 0):.2f}%", cores[4]), unsafe_allow_html=True)
-    ind_cols[1].markdown(render_metric_card("Custo Direto / m²", f"R$ {fmt_br(custo_direto_total / area_construida_total if area_construida_total > 0 else 0)}", cores[5]), unsafe_allow_html=True)
-    ind_cols[2].markdown(render_metric_card("Custo Indireto / m²", f"R$ {fmt_br((custo_indireto_calculado + custo_indireto_obra_total) / area_construida_total if area_construida_total > 0 else 0)}", cores[6]), unsafe_allow_html=True)
-    ind_cols[3].markdown(render_metric_card("Custo Total / m²", f"R$ {fmt_br(valor_total_despesas / area_construida_total if area_construida_total > 0 else 0)}", cores[7]), unsafe_allow_html=True)
+    ind_cols[0].markdown(render_metric_card("Terreno / Custo Total", f"{p_terreno:.2f}%", cores[4]), unsafe_allow_html=True)
+    ind_cols[1].markdown(render_metric_card("Custo Direto / m²", f"R$ {fmt_br(modelo.custo_direto_m2)}", cores[5]), unsafe_allow_html=True)
+    ind_cols[2].markdown(render_metric_card("Custo Indireto / m²", f"R$ {fmt_br(modelo.custo_indireto_m2)}", cores[6]), unsafe_allow_html=True)
+    ind_cols[3].markdown(render_metric_card("Custo Total / m²", f"R$ {fmt_br(modelo.custo_total_m2)}", cores[7]), unsafe_allow_html=True)
+
+# --- SENSIBILIDADE ---
+@st.fragment
+def painel_sensibilidade():
+    with st.expander("🌪️ Análise de Sensibilidade", expanded=False):
+        c1, c2, c3 = st.columns([2, 1.5, 1])
+        variacao = c1.slider("Variação de cada entrada (±%)", 1, 50, 10, key="sens_variacao")
+        metrica = c2.radio("Métrica", ["Margem (%)", "Lucro Bruto (R$)"], horizontal=True, key="sens_metrica")
+        n = c3.number_input("Entradas no gráfico", 5, 50, 15, key="sens_n")
+        analise = sensitivity_analysis(modelo, variacao / 100)
+        if analise.empty:
+            st.info("Sem entradas para analisar.")
+            return
+        por_margem = metrica == "Margem (%)"
+        base = lucratividade_percentual if por_margem else lucratividade_valor
+        st.plotly_chart(tornado_chart(analise, base, "margem" if por_margem else "lucro", int(n),
+                                      f"Impacto de ±{variacao}% em cada entrada"), use_container_width=True)
+        tabela = analise.rename(columns={"entrada": "Entrada", "grupo": "Grupo", "valor_base": "Valor Atual",
+                                         "margem_baixa": f"Margem −{variacao}% (%)", "margem_alta": f"Margem +{variacao}% (%)",
+                                         "lucro_baixo": f"Lucro −{variacao}% (R$)", "lucro_alto": f"Lucro +{variacao}% (R$)",
+                                         "impacto_margem": "Impacto Margem (p.p.)", "impacto_lucro": "Impacto Lucro (R$)"})
+        if not por_margem:
+            tabela = tabela.sort_values("Impacto Lucro (R$)", ascending=False)
+        st.dataframe(tabela, use_container_width=True, hide_index=True, height=300,
+                     column_config={c: st.column_config.NumberColumn(format="%.2f") for c in tabela.columns if c not in ("Entrada", "Grupo")})
+
+painel_sensibilidade()
 
 st.divider()
 
-# --- DEFINIÇÃO DA LÓGICA DE GERAÇÃO DA ANÁLISE ---
-def generate_ai_analysis():
-    """Gera a análise de viabilidade com IA e exibe o resultado."""
-    # Prepara o prompt com os dados mais importantes
-    prompt_data = {
-        "nome_projeto": info.get('nome', 'Projeto Sem Nome'),
-        "vgv_total": vgv_total,
-        "custo_total": valor_total_despesas,
-        "lucro_bruto": lucratividade_valor,
-        "margem_lucro_percentual": lucratividade_percentual,
-        "custo_direto": custo_direto_total,
-        "custo_indireto_venda": custo_indireto_calculado,
-        "custo_indireto_obra": custo_indireto_obra_total,
-        "custo_terreno": custo_terreno_total,
-        "area_privativa": info.get('area_privativa', 0),
-        "area_terreno": info.get('area_terreno', 0),
-        "area_construida": area_construida_total,
-        "composicao_custos": {
-            "Custo Direto": p_direto,
-            "Custo Indireto de Venda": p_indireto_venda,
-            "Custo Indireto de Obra": p_indireto_obra,
-            "Custo do Terreno": p_terreno
-        }
-    }
-
-    # Dados de benchmark da pesquisa na web
-    benchmark_data = {
-        "profit_margin_benchmark": "Pesquisas de 2024/2025 indicam que a rentabilidade de empreendimentos imobiliários no Brasil pode chegar a 19%, com valores específicos como 17,2% em São Paulo. Uma margem de lucro bruta acima de 15% é considerada promissora.",
-        "cost_per_sqm_benchmark": "Segundo dados do SINAPI (IBGE), o custo nacional por metro quadrado em dezembro de 2024 foi de R$ 1.790,66, com valores regionais que variam, por exemplo, R$ 1.847,11 no Sudeste em 2025.",
-        "cost_proportions_info": "A composição de custos de um projeto é um indicador chave de sua saúde financeira. O custo do terreno, por exemplo, tem se valorizado e pode impactar significativamente o valor final do imóvel."
-    }
-
-    prompt = f"""
-    Act as a senior real estate development viability analyst. Your task is to analyze a project's data and generate a detailed and analytical report in Portuguese.
-
-    The report should have the following sections, formatted with simple numbered headings followed by the content:
+# --- EXIBIÇÃO DA ANÁLISE ---
+def render_secoes(texto):
+    """Exibe o texto da análise (completo ou parcial, durante o streaming) com os cabeçalhos numerados em negrito."""
+    # Divide o texto em seções baseadas nos cabeçalhos numerados
+    sections = texto.split('\n\n')
     
-    1. Avaliação da Viabilidade Financeira
-    Start with a paragraph summarizing the financial health of the project. Compare the Gross Profit Margin with the following market benchmarks: "{benchmark_data['profit_margin_benchmark']}". Explain the implications of the project's Gross Profit and its overall attractiveness.
-    
-    2. Análise Detalhada dos Custos
-    Analyze the composition of the Total Cost. Present the absolute values and percentages of each cost type (Direct Cost, Indirect Sales Cost, Indirect Construction Cost, and Land Cost). Use the following context to enrich your analysis: "{benchmark_data['cost_proportions_info']}".
-
-    3. Análise de Desempenho por Área
-    Provide and interpret the cost per square meter (m²) indicators for Direct Cost, Indirect Cost, and Total Cost. Compare these costs with the following market benchmark: "{benchmark_data['cost_per_sqm_benchmark']}".
-
-    4. Recomendações Estratégicas
-    Provide a list of 3 to 5 actionable strategic recommendations to improve the project's viability. The recommendations should be specific. For example, cite examples of where cost reduction can occur or how revenue can be increased.
-
-    5. Conclusão e Próximos Passos
-    A final paragraph that summarizes the analysis and offers a perspective on the next steps, such as conducting deeper market studies or starting the detailing phase.
-
-    Below is the project data. Use it for the analysis. The values are in Brazilian Reais (R$).
-    
-    Project Data:
-    - Name: {prompt_data['nome_projeto']}
-    - VGV Total: R$ {prompt_data['vgv_total']:.2f}
-    - Custo Total: R$ {prompt_data['custo_total']:.2f}
-    - Lucro Bruto: R$ {prompt_data['lucro_bruto']:.2f}
-    - Margem de Lucro: {prompt_data['margem_lucro_percentual']:.2f}%
-    - Custo Direto: R$ {prompt_data['custo_direto']:.2f}
-    - Custo Indireto de Venda: R$ {prompt_data['custo_indireto_venda']:.2f}
-    - Custo Indireto de Obra: R$ {prompt_data['custo_indireto_obra']:.2f}
-    - Custo do Terreno: R$ {prompt_data['custo_terreno']:.2f}
-    - Área Privativa: {prompt_data['area_privativa']:.2f} m²
-    - Área Construída: {prompt_data['area_construida']:.2f} m²
-    - Composição do Custo (%): {prompt_data['composicao_custos']}
-    """
-    
-    # Adiciona a exibição de loading
-    with st.spinner("Gerando análise com I.A...."):
-        try:
-            API_KEY = st.session_state.gemini_api_key
-            url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.5-flash-preview-05-20:generateContent?key={API_KEY}"
-            
-            payload = {
-                "contents": [
-                    {
-                        "parts": [
-                            {"text": prompt}
-                        ]
-                    }
-                ],
-                "generationConfig": {
-                    "temperature": 0.5,
-                    "topK": 1,
-                    "topP": 1,
-                    "maxOutputTokens": 2048,
-                    "responseMimeType": "text/plain"
-                }
-            }
-
-            headers = {'Content-Type': 'application/json'}
-            
-            max_retries = 5
-            base_delay = 1.0
-            for i in range(max_retries):
-                response = requests.post(url, headers=headers, data=json.dumps(payload))
-                if response.status_code == 200:
-                    break
-                elif response.status_code == 429 and i < max_retries - 1:
-                    delay = base_delay * (2 ** i)
-                    st.warning(f"Limite de taxa atingido. Tentando novamente em {delay:.1f} segundos...")
-                    time.sleep(delay)
-                else:
-                    response.raise_for_status()
-            
-            if response.status_code == 200:
-                result = response.json()
-                if result and 'candidates' in result and len(result['candidates']) > 0 and 'content' in result['candidates'][0] and 'parts' in result['candidates'][0]['content'] and len(result['candidates'][0]['content']['parts']) > 0:
-                    analysis = result['candidates'][0]['content']['parts'][0]['text']
-                    return analysis
-                else:
-                    st.error("A I.A. não conseguiu gerar uma resposta válida. Por favor, tente novamente com dados diferentes ou ajuste o prompt.")
+    # Itera sobre as seções e formata cada uma individualmente
+    for section in sections:
+        if section.strip():
+            if section.startswith("1. ") or section.startswith("2. ") or section.startswith("3. ") or section.startswith("4. ") or section.startswith("5. "):
+                parts = section.split('\n', 1)
+                header = parts[0].strip()
+                content = parts[1].strip() if len(parts) > 1 else ""
+                st.markdown(f"**{header}**")
+                st.markdown(content)
             else:
-                st.error(f"Erro ao se comunicar com a API da I.A.: {response.status_code} - {response.text}. Tente novamente mais tarde.")
-
-        except requests.exceptions.RequestException as e:
-            st.error(f"Erro de conexão com a API da I.A.: {e}")
-        except Exception as e:
-            st.error(f"Ocorreu um erro inesperado: {e}")
-    return None
+                st.markdown(section.strip())
 
 # --- DEFINIÇÃO DO DIALOG (POP-UP) PARA A API KEY ---
 @st.dialog("Adicionar Chave da API")
@@ -238,45 +139,108 @@ def api_key_dialog():
             else:
                 st.error("Por favor, insira uma chave da API.")
 
-# Adiciona o botão de análise com IA
-if st.button("Gerar Análise de Viabilidade com I.A.", type="primary"):
-    if "gemini_api_key" not in st.session_state or not st.session_state.gemini_api_key:
+# Adiciona o botão de análise com IA; uma análise em cache para o mesmo prompt não precisa da chave da API
+benchmarks_ia = carregar_benchmarks()  # os mesmos do lote `batch_ai`, para que as chaves coincidam
+prompt_ia = montar_prompt(info, modelo, benchmarks_ia)
+# Análise gravada no projeto (ex.: pelo lote `batch_ai`) para os dados atuais
+if not st.session_state.get("ai_analysis") and (info.get("analise_ia") or {}).get("chave") == chave_analise(prompt_ia):
+    st.session_state.ai_analysis = {**info["analise_ia"], "do_cache": True}
+gerar = st.button("Gerar Análise de Viabilidade com I.A.", type="primary")
+regerar = st.session_state.get("ai_regerar", False)  # botão exibido junto com uma análise vinda do cache
+if gerar or regerar:
+    if (regerar or analise_em_cache(prompt_ia) is None) and not st.session_state.get("gemini_api_key"):
         api_key_dialog()
     else:
-        # Tenta gerar a análise e exibe-a no expander
-        analysis_text = generate_ai_analysis()
-        if analysis_text:
-            st.session_state.ai_analysis = analysis_text
+        # A análise é gerada em segundo plano; o painel abaixo exibe o texto à medida que chega
+        if st.session_state.get("ai_job"):
+            cancel_analise(st.session_state.ai_job)
+        st.session_state.ai_erro = None
+        st.session_state.ai_job = submit_analise(prompt_ia, st.session_state.get("gemini_api_key"), usar_cache=not regerar)
+
+if st.session_state.get("ai_job"):
+    estado_inicial, _, resultado, mensagem = analise_status(st.session_state.ai_job)
+    if estado_inicial == "concluido":  # ex.: recuperada do cache
+        st.session_state.ai_analysis = {**resultado, "benchmarks": benchmarks_ia.get("versao")}
+        st.session_state.ai_job = None
+    elif estado_inicial == "erro":
+        st.session_state.ai_erro = mensagem
+        st.session_state.ai_job = None
+
+if st.session_state.get("ai_erro"):
+    st.error(f"Erro ao gerar a análise com I.A.: {st.session_state.ai_erro}. Tente novamente mais tarde.")
+
+if st.session_state.get("ai_job"):
+    @st.fragment(run_every=0.5 if estado_inicial in ("na_fila", "aguardando", "gerando") else None)
+    def painel_analise():
+        estado, texto, resultado, mensagem = analise_status(st.session_state.ai_job)
+        if estado in ("concluido", "erro"):
+            if estado == "concluido":
+                st.session_state.ai_analysis = {**resultado, "benchmarks": benchmarks_ia.get("versao")}
+            else:
+                st.session_state.ai_erro = mensagem
+            st.session_state.ai_job = None
+            st.rerun()  # exibe a análise completa (ou o erro) e interrompe a atualização periódica do fragmento
+        elif estado in ("na_fila", "aguardando", "gerando"):
+            with st.expander("🤖 Análise de Viabilidade com I.A.", expanded=True):
+                if estado == "aguardando":
+                    st.warning(mensagem)
+                elif not texto:
+                    st.caption("Gerando análise com I.A....")
+                render_secoes(texto)
+                if st.button("Cancelar", key="ai_cancelar"):
+                    cancel_analise(st.session_state.ai_job)
+                    st.session_state.ai_job = None
+                    st.rerun()
+        else:
+            st.session_state.ai_job = None
+
+    painel_analise()
 
 # Exibe a análise em um expander se ela existir na session_state
-if "ai_analysis" in st.session_state and st.session_state.ai_analysis:
+elif "ai_analysis" in st.session_state and st.session_state.ai_analysis:
+    analise = st.session_state.ai_analysis
     with st.expander("🤖 Análise de Viabilidade com I.A.", expanded=True):
-        # Divide o texto em seções baseadas nos cabeçalhos numerados
-        sections = st.session_state.ai_analysis.split('\n\n')
-        
-        # Itera sobre as seções e formata cada uma individualmente
-        for section in sections:
-            if section.strip():
-                if section.startswith("1. ") or section.startswith("2. ") or section.startswith("3. ") or section.startswith("4. ") or section.startswith("5. "):
-                    parts = section.split('\n', 1)
-                    header = parts[0].strip()
-                    content = parts[1].strip() if len(parts) > 1 else ""
-                    st.markdown(f"**{header}**")
-                    st.markdown(content)
-                else:
-                    st.markdown(section.strip())
-
-# Botão de download do relatório PDF
+        gerada_em = datetime.fromtimestamp(analise["criado_em"]).strftime("%d/%m/%Y %H:%M")
+        versao = f" Benchmarks de mercado: versão {analise['benchmarks']}." if analise.get("benchmarks") else ""
+        if analise["do_cache"]:
+            c1, c2 = st.columns([3, 1])
+            c1.caption(f"♻️ Análise recuperada do cache (gerada em {gerada_em} por {analise['modelo']}).{versao}")
+            c2.button("🔄 Gerar nova análise", key="ai_regerar", help="Ignora a análise em cache e consulta a I.A. novamente")
+        else:
+            st.caption(f"Análise gerada em {gerada_em} por {analise['modelo']}.{versao}")
+        render_secoes(analise["texto"])
+
+# Botão de download do relatório PDF (renderizado em segundo plano, fora da thread do script)
 if st.button("Gerar e Baixar Relatório PDF", type="primary"):
-    with st.spinner("Gerando seu relatório..."):
-        pdf_data = generate_pdf_report(
-            info, vgv_total, valor_total_despesas, lucratividade_valor, lucratividade_percentual,
-            custo_direto_total, custo_indireto_calculado, custo_terreno_total, area_construida_total,
-            custos_config, custos_indiretos_percentuais, pavimentos_df, custo_indireto_obra_total
-        )
-        st.download_button(
-            label="Relatório Concluído! Clique aqui para baixar.",
-            data=pdf_data,
-            file_name=f"Relatorio_{info['nome']}.pdf",
-            mime="application/pdf"
-        )
+    if st.session_state.get("pdf_job"):
+        cancel_job(st.session_state.pdf_job)
+    st.session_state.pdf_job = submit_report(info, modelo)
+    st.session_state.pdf_job_nome = info['nome']
+
+if st.session_state.get("pdf_job"):
+    estado_inicial = job_status(st.session_state.pdf_job)[0]
+
+    @st.fragment(run_every=1.0 if estado_inicial in ("na_fila", "renderizando") else None)
+    def painel_relatorio():
+        estado, progresso, pdf_data, erro = job_status(st.session_state.pdf_job)
+        if estado == "na_fila":
+            st.progress(0.0, text="Relatório na fila de geração...")
+        elif estado == "renderizando":
+            st.progress(progresso, text="Gerando seu relatório...")
+        elif estado == "concluido":
+            if estado_inicial != "concluido":
+                st.rerun()  # interrompe a atualização periódica do fragmento
+            st.download_button(
+                label="Relatório Concluído! Clique aqui para baixar.",
+                data=pdf_data,
+                file_name=f"Relatorio_{st.session_state.pdf_job_nome}.pdf",
+                mime="application/pdf"
+            )
+            cache = cache_stats()
+            st.caption(f"Cache de relatórios: {cache['acertos']} acertos / {cache['geracoes']} gerações neste servidor.")
+        elif estado == "erro":
+            st.error(f"Não foi possível gerar o relatório: {erro}")
+        else:
+            st.session_state.pdf_job = None
+
+    painel_relatorio()
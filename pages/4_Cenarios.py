@@ -0,0 +1,168 @@
+# pages/4_Cenarios.py
+import math
+import time
+import streamlit as st
+import plotly.express as px
+from utils import DEFAULT_CUSTOS_INDIRETOS, fmt_br, project_bounded_simplex, render_metric_card, render_sidebar
+from storage import get_storage
+from viability import ViabilityModel
+from goal_seek import METAS, goal_seek, goal_seek_projetos
+from scenarios import MAX_CENARIOS, PARAMETROS_CENARIO, base_do_modelo, evaluate_scenarios, grade_de_cenarios, cenarios_dataframe
+
+st.set_page_config(page_title="Cenários", layout="wide")
+
+if "projeto_info" not in st.session_state:
+    st.error("Nenhum projeto carregado. Por favor, selecione um projeto na página inicial.")
+    if st.button("Voltar para a seleção de projetos"):
+        st.switch_page("Início.py")
+    st.stop()
+
+render_sidebar(form_key="sidebar_cenarios")
+
+info = st.session_state.projeto_info
+if 'custos_indiretos_obra' in st.session_state: info['custos_indiretos_obra'] = st.session_state.custos_indiretos_obra
+if 'duracao_obra' in st.session_state: info['duracao_obra'] = st.session_state.duracao_obra
+
+st.title("🧮 Análise de Cenários")
+st.subheader("Compare combinações de preço, custos, prazo e custos indiretos de uma só vez")
+
+modelo = ViabilityModel.from_project(info)
+base = base_do_modelo(modelo)
+
+with st.expander("⚙️ Faixas dos Parâmetros", expanded=True):
+    with st.form("form_cenarios"):
+        cols = st.columns([3, 2, 2, 1])
+        cols[0].markdown("**Parâmetro**"); cols[1].markdown("**Mínimo**"); cols[2].markdown("**Máximo**"); cols[3].markdown("**Passos**")
+        faixas = {}
+        for nome, rotulo in PARAMETROS_CENARIO.items():
+            atual = float(base[nome])
+            c = st.columns([3, 2, 2, 1])
+            c[0].container(height=38, border=False).write(f"{rotulo} — atual: {fmt_br(atual)}")
+            minimo = c[1].number_input("min", min_value=0.0, value=round(atual * 0.9, 2), key=f"cen_min_{nome}", label_visibility="collapsed")
+            maximo = c[2].number_input("max", min_value=0.0, value=round(atual * 1.1, 2), key=f"cen_max_{nome}", label_visibility="collapsed")
+            passos = c[3].number_input("passos", min_value=1, max_value=200, value=5, step=1, key=f"cen_passos_{nome}", label_visibility="collapsed")
+            faixas[nome] = (minimo, max(minimo, maximo), passos)
+        avaliar = st.form_submit_button("▶️ Avaliar Cenários", use_container_width=True, type="primary")
+
+total_cenarios = math.prod(int(passos) for _, _, passos in faixas.values())
+if avaliar and total_cenarios > MAX_CENARIOS:
+    st.warning(f"A grade teria {total_cenarios:,} cenários; reduza os passos para no máximo {MAX_CENARIOS:,} combinações.".replace(",", "."))
+elif avaliar:
+    inicio = time.perf_counter()
+    parametros = grade_de_cenarios(faixas)
+    resultados = evaluate_scenarios(
+        base,
+        preco_medio_venda_m2=parametros["preco_medio_venda_m2"],
+        custo_area_privativa=parametros["custo_area_privativa"],
+        custo_terreno_m2=parametros["custo_terreno_m2"],
+        duracao_obra=parametros["duracao_obra"],
+        custos_indiretos_percentuais=parametros["percentual_indireto"],
+    )
+    st.session_state.cenarios_df = cenarios_dataframe(parametros, resultados)
+    st.session_state.cenarios_tempo = time.perf_counter() - inicio
+
+if "cenarios_df" in st.session_state:
+    df = st.session_state.cenarios_df
+    margens = df["margem_lucro_percentual"]
+    with st.container(border=True):
+        cols = st.columns(4)
+        cols[0].markdown(render_metric_card("Cenários Avaliados", f"{len(df):,}".replace(",", "."), "#00829d"), unsafe_allow_html=True)
+        cols[1].markdown(render_metric_card("Maior Margem", f"{margens.max():.2f}%", "#3c763d"), unsafe_allow_html=True)
+        cols[2].markdown(render_metric_card("Menor Margem", f"{margens.min():.2f}%", "#a94442"), unsafe_allow_html=True)
+        cols[3].markdown(render_metric_card("Cenários com Prejuízo", f"{(df['lucro_bruto'] < 0).mean() * 100:.1f}%", "#6a42c1"), unsafe_allow_html=True)
+        st.caption(f"Tempo de cálculo: {st.session_state.cenarios_tempo * 1000:.1f} ms")
+
+    with st.expander("📊 Distribuição da Margem de Lucro", expanded=True):
+        fig = px.histogram(df, x="margem_lucro_percentual", nbins=50, title="Margem de Lucro por Cenário")
+        fig.update_layout(xaxis_title="Margem de Lucro (%)", yaxis_title="Nº de Cenários")
+        st.plotly_chart(fig, use_container_width=True)
+
+    with st.expander("📑 Resultados", expanded=True):
+        ordem = st.radio("Ordenar por:", ["Maior margem", "Menor margem"], horizontal=True)
+        limite = st.number_input("Linhas exibidas", min_value=10, max_value=5000, value=200, step=10)
+        exibidos = df.sort_values("margem_lucro_percentual", ascending=(ordem == "Menor margem")).head(int(limite))
+        st.dataframe(
+            exibidos.rename(columns={**PARAMETROS_CENARIO, "vgv_total": "VGV (R$)", "custo_total": "Custo Total (R$)",
+                                     "lucro_bruto": "Lucro Bruto (R$)", "margem_lucro_percentual": "Margem (%)", "custo_total_m2": "Custo Total / m² (R$)"})
+            [list(PARAMETROS_CENARIO.values()) + ["VGV (R$)", "Custo Total (R$)", "Lucro Bruto (R$)", "Margem (%)", "Custo Total / m² (R$)"]],
+            use_container_width=True, hide_index=True,
+            column_config={
+                "VGV (R$)": st.column_config.NumberColumn(format="R$ %.2f"), "Custo Total (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
+                "Lucro Bruto (R$)": st.column_config.NumberColumn(format="R$ %.2f"), "Margem (%)": st.column_config.NumberColumn(format="%.2f%%"),
+                "Custo Total / m² (R$)": st.column_config.NumberColumn(format="R$ %.2f"),
+            })
+        st.download_button("Baixar todos os cenários (CSV)", df.to_csv(index=False).encode("utf-8"), file_name=f"Cenarios_{info['nome']}.csv", mime="text/csv")
+
+
+# --- BUSCA DE META ---
+def aplicar_meta(parametro, valor):
+    """Grava no projeto carregado o valor encontrado pela busca de meta. Retorna uma mensagem de erro, ou None."""
+    if parametro == "duracao_obra":
+        # A duração é em meses inteiros: arredonda para cima (o prazo não pode ser menor que o calculado)
+        valor = st.session_state.duracao_obra = info["duracao_obra"] = max(1, math.ceil(valor - 1e-9))
+    elif parametro == "percentual_indireto":
+        custos = st.session_state.get("custos_indiretos_percentuais", info.get("custos_indiretos_percentuais", {}))
+        custos = {k: (v.copy() if isinstance(v, dict) else {"percentual": v, "fonte": "Manual"}) for k, v in custos.items()}
+        if not custos:
+            return "O projeto não tem custos indiretos de venda para ajustar."
+        # Mesma regra da página de Custos Indiretos: a diferença é repartida proporcionalmente, dentro de (mín, máx) de cada item
+        itens = list(custos)
+        minimos = [DEFAULT_CUSTOS_INDIRETOS.get(k, (0.0, 0.0, 100.0))[0] for k in itens]
+        maximos = [DEFAULT_CUSTOS_INDIRETOS.get(k, (0.0, 0.0, 100.0))[2] for k in itens]
+        if not sum(minimos) - 1e-9 <= valor <= sum(maximos) + 1e-9:
+            return (f"A meta exige {fmt_br(valor)}% de custos indiretos de venda, fora do intervalo permitido pelos limites "
+                    f"dos itens ({fmt_br(sum(minimos))}% a {fmt_br(sum(maximos))}%).")
+        atuais = [custos[k]["percentual"] for k in itens]
+        for k, novo in zip(itens, project_bounded_simplex(atuais, minimos, maximos, valor, pesos=atuais)):
+            custos[k]["percentual"] = float(novo)
+        st.session_state.custos_indiretos_percentuais = info["custos_indiretos_percentuais"] = custos
+        # Ponto de partida da próxima redistribuição na página de Custos Indiretos
+        st.session_state.previous_custos_indiretos_percentuais = {k: v.copy() for k, v in custos.items()}
+    else:
+        info.setdefault("custos_config", {})[parametro] = valor
+    st.session_state.meta_aplicada = (PARAMETROS_CENARIO[parametro], valor)
+    return None
+
+
+@st.fragment
+def painel_meta():
+    with st.expander("🎯 Busca de Meta", expanded=False):
+        st.caption("Encontra o valor de uma entrada que leva o indicador ao alvo, mantendo as demais entradas fixas.")
+        c1, c2, c3 = st.columns([2, 1.5, 2])
+        metrica = c1.selectbox("Indicador", list(METAS), format_func=METAS.get, key="meta_metrica")
+        padrao = {"margem_lucro_percentual": 15.0, "lucro_bruto": 0.0, "custo_total_m2": round(float(modelo.custo_total_m2), 2)}[metrica]
+        alvo = c2.number_input("Alvo", value=padrao, format="%.2f", key=f"meta_alvo_{metrica}")
+        parametro = c3.selectbox("Entrada a ajustar", list(PARAMETROS_CENARIO), format_func=PARAMETROS_CENARIO.get, key="meta_parametro")
+
+        solucao = float(goal_seek(base, parametro, metrica, alvo)[0])
+        atual = float(base[parametro])
+        if math.isnan(solucao):
+            st.warning("O alvo não é atingível ajustando apenas esta entrada.")
+        else:
+            cols = st.columns(3)
+            cols[0].metric("Valor atual", fmt_br(atual))
+            cols[1].metric("Valor que atinge o alvo", fmt_br(solucao), f"{(solucao / atual - 1) * 100:+.2f}%" if atual else None)
+            if cols[2].button("Aplicar ao projeto", use_container_width=True, help="Atualiza o projeto carregado (salve-o pela barra lateral para persistir)"):
+                erro = aplicar_meta(parametro, solucao)
+                if erro:
+                    st.error(erro)
+                else:
+                    st.rerun()  # a página inteira, não só o fragmento: a faixa de cenários parte dos valores atuais
+        if "meta_aplicada" in st.session_state:
+            rotulo, valor = st.session_state.pop("meta_aplicada")
+            st.success(f"{rotulo} atualizado para {fmt_br(valor)}.")
+
+        if st.button("Resolver para todos os projetos salvos", key="meta_todos"):
+            with st.spinner("Calculando..."):
+                inicio = time.perf_counter()
+                st.session_state.meta_projetos = goal_seek_projetos(get_storage().iter_projects(), parametro, metrica, alvo)
+                st.session_state.meta_projetos_tempo = time.perf_counter() - inicio
+        if "meta_projetos" in st.session_state:
+            df = st.session_state.meta_projetos
+            st.caption(f"{len(df)} projetos em {st.session_state.meta_projetos_tempo:.2f} s")
+            st.dataframe(df.rename(columns={"id": "ID", "nome": "Projeto", "valor_atual": "Valor Atual", "valor_meta": "Valor Meta",
+                                            "variacao_percentual": "Variação (%)"}),
+                         use_container_width=True, hide_index=True,
+                         column_config={c: st.column_config.NumberColumn(format="%.2f") for c in ("Valor Atual", "Valor Meta", "Variação (%)")})
+
+painel_meta()
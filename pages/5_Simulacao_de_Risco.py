@@ -0,0 +1,86 @@
+# pages/5_Simulacao_de_Risco.py
+import time
+import streamlit as st
+import plotly.graph_objects as go
+from utils import fmt_br, render_metric_card, render_sidebar
+from viability import ViabilityModel
+from montecarlo import simulate_margin, histograma_reduzido
+
+st.set_page_config(page_title="Simulação de Risco", layout="wide")
+
+if "projeto_info" not in st.session_state:
+    st.error("Nenhum projeto carregado. Por favor, selecione um projeto na página inicial.")
+    if st.button("Voltar para a seleção de projetos"):
+        st.switch_page("Início.py")
+    st.stop()
+
+render_sidebar(form_key="sidebar_simulacao_risco")
+
+info = st.session_state.projeto_info
+if 'custos_indiretos_obra' in st.session_state: info['custos_indiretos_obra'] = st.session_state.custos_indiretos_obra
+if 'duracao_obra' in st.session_state: info['duracao_obra'] = st.session_state.duracao_obra
+if 'etapas_percentuais' in st.session_state: info['etapas_percentuais'] = st.session_state.etapas_percentuais
+if 'custos_indiretos_percentuais' in st.session_state: info['custos_indiretos_percentuais'] = st.session_state.custos_indiretos_percentuais
+
+st.title("🎲 Simulação de Risco (Monte Carlo)")
+st.subheader("Distribuição da margem de lucro considerando as faixas de cada etapa e custo indireto")
+
+modelo = ViabilityModel.from_project(info)
+
+with st.expander("⚙️ Parâmetros da Simulação", expanded=True):
+    with st.form("form_simulacao"):
+        c1, c2, c3 = st.columns(3)
+        n_sorteios = c1.select_slider("Nº de Sorteios", options=[10_000, 100_000, 500_000, 1_000_000, 2_000_000], value=1_000_000,
+                                      format_func=lambda n: f"{n:,}".replace(",", "."))
+        distribuicao = c2.radio("Distribuição", ["triangular", "pert"], format_func=lambda d: d.upper() if d == "pert" else d.capitalize(), horizontal=True)
+        usar_seed = c3.checkbox("Semente fixa (resultado reprodutível)", value=True)
+        seed = c3.number_input("Semente", min_value=0, value=42, step=1)
+
+        st.markdown("**Preço Médio de Venda (R$/m²)**")
+        p = st.columns(3)
+        preco_atual = modelo.preco_medio_venda_m2
+        preco_min = p[0].number_input("Mínimo", min_value=0.0, value=round(preco_atual * 0.85, 2), key="mc_preco_min")
+        preco_moda = p[1].number_input("Mais provável", min_value=0.0, value=preco_atual, key="mc_preco_moda")
+        preco_max = p[2].number_input("Máximo", min_value=0.0, value=round(preco_atual * 1.10, 2), key="mc_preco_max")
+
+        st.markdown("**Custo de Construção (R$/m²)**")
+        c = st.columns(3)
+        custo_atual = modelo.custo_area_privativa
+        custo_min = c[0].number_input("Mínimo", min_value=0.0, value=round(custo_atual * 0.95, 2), key="mc_custo_min")
+        custo_moda = c[1].number_input("Mais provável", min_value=0.0, value=custo_atual, key="mc_custo_moda")
+        custo_max = c[2].number_input("Máximo", min_value=0.0, value=round(custo_atual * 1.20, 2), key="mc_custo_max")
+
+        simular = st.form_submit_button("▶️ Executar Simulação", use_container_width=True, type="primary")
+
+if simular:
+    faixa_preco = tuple(sorted((preco_min, preco_moda, preco_max)))
+    faixa_custo = tuple(sorted((custo_min, custo_moda, custo_max)))
+    try:
+        inicio = time.perf_counter()
+        st.session_state.simulacao_risco = simulate_margin(
+            modelo, info, n_sorteios=n_sorteios, preco_m2=faixa_preco, custo_m2=faixa_custo,
+            distribuicao=distribuicao, seed=int(seed) if usar_seed else None)
+        st.session_state.simulacao_risco_tempo = time.perf_counter() - inicio
+    except ValueError as e:
+        st.error(f"Não foi possível executar a simulação: {e}")
+
+if "simulacao_risco" in st.session_state:
+    r = st.session_state.simulacao_risco
+    with st.container(border=True):
+        cols = st.columns(4)
+        cols[0].markdown(render_metric_card("Margem P5", f"{r['p5']:.2f}%", "#a94442"), unsafe_allow_html=True)
+        cols[1].markdown(render_metric_card("Margem P50", f"{r['p50']:.2f}%", "#00829d"), unsafe_allow_html=True)
+        cols[2].markdown(render_metric_card("Margem P95", f"{r['p95']:.2f}%", "#3c763d"), unsafe_allow_html=True)
+        cols[3].markdown(render_metric_card("Probabilidade de Prejuízo", f"{r['prob_prejuizo'] * 100:.2f}%", "#6a42c1"), unsafe_allow_html=True)
+        n_fmt = f"{r['n_sorteios']:,}".replace(",", ".")
+        st.caption(f"{n_fmt} sorteios ({r['distribuicao']}, semente: {r['seed'] if r['seed'] is not None else 'aleatória'}) "
+                   f"em {st.session_state.simulacao_risco_tempo:.2f} s — lucro médio R$ {fmt_br(r['lucro_medio'])} "
+                   f"(desvio R$ {fmt_br(r['lucro_desvio'])}), margem atual {modelo.lucratividade_percentual:.2f}%")
+
+    with st.expander("📊 Distribuição da Margem de Lucro", expanded=True):
+        centros, contagem = histograma_reduzido(r["bordas"], r["contagem"])
+        fig = go.Figure(go.Bar(x=centros, y=contagem / r["n_sorteios"] * 100, marker_color="#00829d"))
+        for q, cor in (("p5", "#a94442"), ("p50", "#333"), ("p95", "#3c763d")):
+            fig.add_vline(x=r[q], line_dash="dash", line_color=cor, annotation_text=q.upper())
+        fig.update_layout(xaxis_title="Margem de Lucro (%)", yaxis_title="Frequência (%)", bargap=0)
+        st.plotly_chart(fig, use_container_width=True)
@@ -0,0 +1,114 @@
+# pages/6_Fluxo_de_Caixa.py
+import time
+import numpy as np
+import pandas as pd
+import streamlit as st
+import plotly.graph_objects as go
+from utils import fmt_br, render_metric_card, render_sidebar
+from viability import ViabilityModel
+from cashflow import (COMPONENTES, CURVAS_S, PREMISSAS_PADRAO, base_fluxo, fluxo_de_caixa, fluxo_dataframe,
+                      indicadores_fluxo, vpl)
+
+st.set_page_config(page_title="Fluxo de Caixa", layout="wide")
+
+if "projeto_info" not in st.session_state:
+    st.error("Nenhum projeto carregado. Por favor, selecione um projeto na página inicial.")
+    if st.button("Voltar para a seleção de projetos"):
+        st.switch_page("Início.py")
+    st.stop()
+
+render_sidebar(form_key="sidebar_fluxo_caixa")
+
+info = st.session_state.projeto_info
+if 'custos_indiretos_obra' in st.session_state: info['custos_indiretos_obra'] = st.session_state.custos_indiretos_obra
+if 'duracao_obra' in st.session_state: info['duracao_obra'] = st.session_state.duracao_obra
+if 'etapas_percentuais' in st.session_state: info['etapas_percentuais'] = st.session_state.etapas_percentuais
+if 'custos_indiretos_percentuais' in st.session_state: info['custos_indiretos_percentuais'] = st.session_state.custos_indiretos_percentuais
+
+st.title("💵 Fluxo de Caixa")
+st.subheader("Distribuição mensal de receitas e custos, exposição máxima, VPL e TIR")
+
+modelo = ViabilityModel.from_project(info)
+base = base_fluxo(modelo)
+# As premissas ficam no projeto e são salvas junto com ele
+premissas = {**PREMISSAS_PADRAO, **(info.get("fluxo_caixa") or {})}
+
+with st.expander("⚙️ Premissas", expanded=True):
+    with st.form("form_fluxo_caixa"):
+        c = st.columns(4)
+        inicio_obra = c[0].number_input("Início da obra (mês)", min_value=0, max_value=60, value=int(premissas["inicio_obra"]), step=1)
+        meses_vendas = c[1].number_input("Período de vendas (meses)", min_value=1, max_value=120, value=int(premissas["meses_vendas"]), step=1)
+        meses_terreno = c[2].number_input("Parcelas do terreno", min_value=1, max_value=60, value=int(premissas["meses_terreno"]), step=1)
+        taxa = c[3].number_input("Taxa de desconto (% a.a.)", min_value=0.0, max_value=100.0, value=float(premissas["taxa_desconto"]), step=0.5)
+        c = st.columns(4)
+        curva_vendas = c[0].selectbox("Curva de vendas", list(CURVAS_S), index=list(CURVAS_S).index(premissas["curva_vendas"]))
+        curva_obra = c[1].selectbox("Curva das etapas da obra", list(CURVAS_S), index=list(CURVAS_S).index(premissas["curva_obra"]))
+        entrada = c[2].number_input("Entrada (% da venda)", min_value=0.0, max_value=100.0, value=float(premissas["percentual_entrada"]), step=1.0)
+        obra = c[3].number_input("Parcelas até as chaves (%)", min_value=0.0, max_value=100.0, value=float(premissas["percentual_obra"]), step=1.0)
+        st.caption(f"Duração da obra: {modelo.duracao_obra} meses (página Administração da Obra). "
+                   "O saldo de cada venda (100% − entrada − parcelas) é recebido nas chaves, no mês seguinte ao fim da obra.")
+        if st.form_submit_button("Aplicar", use_container_width=True, type="primary"):
+            if entrada + obra > 100:
+                st.error("Entrada e parcelas até as chaves devem somar no máximo 100%.")
+            else:
+                premissas.update(inicio_obra=int(inicio_obra), meses_vendas=int(meses_vendas), meses_terreno=int(meses_terreno),
+                                 taxa_desconto=float(taxa), curva_vendas=curva_vendas, curva_obra=curva_obra,
+                                 percentual_entrada=float(entrada), percentual_obra=float(obra))
+                info["fluxo_caixa"] = premissas
+
+parametros = {k: v for k, v in premissas.items() if k != "taxa_desconto"}
+fluxo = fluxo_de_caixa(base, **parametros)
+ind = {k: v[0] for k, v in indicadores_fluxo(fluxo, premissas["taxa_desconto"]).items()}
+
+with st.container(border=True):
+    cols = st.columns(4)
+    cols[0].markdown(render_metric_card("Exposição Máxima", f"R$ {fmt_br(ind['exposicao_maxima'])}", "#a94442"), unsafe_allow_html=True)
+    cols[1].markdown(render_metric_card(f"VPL ({premissas['taxa_desconto']:.1f}% a.a.)", f"R$ {fmt_br(ind['vpl'])}", "#00829d"), unsafe_allow_html=True)
+    cols[2].markdown(render_metric_card("TIR", "—" if np.isnan(ind["tir_anual"]) else f"{ind['tir_anual']:.2f}% a.a.", "#3c763d"), unsafe_allow_html=True)
+    cols[3].markdown(render_metric_card("Payback", "—" if np.isnan(ind["payback_mes"]) else f"Mês {int(ind['payback_mes'])}", "#6a42c1"), unsafe_allow_html=True)
+    st.caption(f"Exposição máxima no mês {int(ind['mes_exposicao_maxima'])}; lucro nominal R$ {fmt_br(fluxo['saldo'].sum())}.")
+
+with st.expander("📈 Fluxo Mensal", expanded=True):
+    meses = np.arange(fluxo["saldo"].shape[1])
+    fig = go.Figure()
+    for c, cor in zip(COMPONENTES, ("#3c763d", "#8a6d3b", "#31708f", "#fd7e14", "#6a42c1")):
+        fig.add_bar(x=meses, y=fluxo[c][0], name=COMPONENTES[c], marker_color=cor)
+    fig.add_scatter(x=meses, y=fluxo["acumulado"][0], name="Saldo Acumulado", mode="lines", line=dict(color="#a94442", width=3), yaxis="y2")
+    fig.update_layout(barmode="relative", xaxis_title="Mês", yaxis_title="R$ no mês",
+                      yaxis2=dict(title="R$ acumulado", overlaying="y", side="right"), legend=dict(orientation="h", y=-0.2))
+    st.plotly_chart(fig, use_container_width=True)
+
+with st.expander("📉 VPL por Taxa de Desconto", expanded=False):
+    taxas = np.arange(0.0, 50.5, 0.5)
+    fig = go.Figure(go.Scatter(x=taxas, y=vpl(fluxo["saldo"][0], taxas), mode="lines", line=dict(color="#00829d")))
+    fig.add_hline(y=0, line_dash="dash", line_color="#555")
+    fig.update_layout(xaxis_title="Taxa de desconto (% a.a.)", yaxis_title="VPL (R$)")
+    st.plotly_chart(fig, use_container_width=True)
+
+
+@st.fragment
+def painel_prazos():
+    with st.expander("⏱️ Prazo da Obra × Indicadores", expanded=False):
+        c1, c2 = st.columns(2)
+        minimo, maximo = c1.slider("Durações avaliadas (meses)", 1, 120, (max(1, modelo.duracao_obra - 6), modelo.duracao_obra + 12), key="fc_prazos")
+        atrasos = c2.slider("Atraso no início da obra (meses)", 0, 24, (0, 6), key="fc_atrasos")
+        # Todas as combinações de duração e início são calculadas juntas, uma linha por cronograma
+        duracoes, inicios = np.meshgrid(np.arange(minimo, maximo + 1), premissas["inicio_obra"] + np.arange(atrasos[0], atrasos[1] + 1), indexing="ij")
+        inicio = time.perf_counter()
+        cenarios = fluxo_de_caixa(base, **{**parametros, "inicio_obra": inicios.ravel()}, duracao_obra=duracoes.ravel())
+        r = indicadores_fluxo(cenarios, premissas["taxa_desconto"])
+        st.caption(f"{duracoes.size} cronogramas em {(time.perf_counter() - inicio) * 1000:.1f} ms")
+        tabela = pd.DataFrame({"Duração (meses)": duracoes.ravel(), "Início da Obra (mês)": inicios.ravel(),
+                               "Exposição Máxima (R$)": r["exposicao_maxima"], "VPL (R$)": r["vpl"], "TIR (% a.a.)": r["tir_anual"],
+                               "Lucro Nominal (R$)": cenarios["saldo"].sum(axis=1)})
+        st.dataframe(tabela, use_container_width=True, hide_index=True, height=300,
+                     column_config={c: st.column_config.NumberColumn(format="%.2f") for c in tabela.columns[2:]})
+
+painel_prazos()
+
+with st.expander("📑 Tabela Mensal", expanded=False):
+    tabela = fluxo_dataframe(fluxo)
+    st.dataframe(tabela, use_container_width=True, hide_index=True,
+                 column_config={c: st.column_config.NumberColumn(format="%.2f") for c in tabela.columns[1:]})
+    st.download_button("Baixar fluxo de caixa (CSV)", tabela.to_csv(index=False).encode("utf-8"),
+                       file_name=f"Fluxo_de_Caixa_{info['nome']}.csv", mime="text/csv")
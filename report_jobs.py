@@ -0,0 +1,130 @@
+# report_jobs.py
+"""
+Geração de relatórios PDF em segundo plano.
+
+Os relatórios são renderizados num pool de processos limitado, compartilhado por
+todas as sessões do servidor, para que o WeasyPrint não prenda a thread do
+script do Streamlit. Cada pedido recebe um id de job, guardado pela página na
+session_state e consultado periodicamente até o PDF ficar pronto.
+O tamanho do pool é definido pela variável de ambiente `PDF_WORKERS`.
+"""
+import copy
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from utils import generate_pdf_report, pdf_cache, report_cache_key
+
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+JOB_TTL_SEGUNDOS = 3600
+
+_executor = None
+_jobs = {}
+_lock = threading.Lock()
+_duracao_media = 5.0  # estimativa inicial (s) para a barra de progresso
+# Pedidos atendidos pelo cache (na hora ou no processo do pool) e PDFs renderizados.
+# Os contadores de `pdf_cache` só enxergam o processo em que rodam.
+_estatisticas = {"acertos": 0, "geracoes": 0}
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            # "spawn": o servidor do Streamlit tem várias threads, e fork nesse cenário não é seguro
+            _executor = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def _descartar_executor():
+    """Um pool quebrado (processo morto) não aceita mais jobs; o próximo pedido cria outro."""
+    global _executor
+    with _lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _render_job(info):
+    """Executado no processo do pool."""
+    from viability import ViabilityModel
+    inicio, misses = time.perf_counter(), pdf_cache.misses
+    pdf = generate_pdf_report(info, ViabilityModel.from_project(info))
+    return pdf, time.perf_counter() - inicio, pdf_cache.misses > misses
+
+
+def submit_report(info, modelo):
+    """Agenda a geração do relatório e retorna o id do job. PDFs já em cache ficam prontos na hora."""
+    _limpar_jobs_antigos()
+    job_id = uuid.uuid4().hex
+    job = {"nome": info.get("nome", ""), "criado_em": time.time(), "future": None, "pdf": None, "erro": None}
+    pdf = pdf_cache.get(report_cache_key(info, modelo))
+    if pdf is not None:
+        job["pdf"] = pdf
+        with _lock:
+            _estatisticas["acertos"] += 1
+    else:
+        # Envia uma cópia profunda: o dicionário da sessão (e suas listas aninhadas) continua sendo editado enquanto o job roda
+        job["future"] = _get_executor().submit(_render_job, copy.deepcopy(info))
+    with _lock:
+        _jobs[job_id] = job
+    return job_id
+
+
+def job_status(job_id):
+    """
+    Retorna (estado, progresso, pdf, erro), com estado em
+    "desconhecido", "na_fila", "renderizando", "concluido" ou "erro".
+    O progresso é estimado pela duração média das últimas renderizações.
+    """
+    global _duracao_media
+    with _lock:
+        job = _jobs.get(job_id)
+    if job is None:
+        return "desconhecido", 0.0, None, None
+    future = job["future"]
+    if job["pdf"] is None and job["erro"] is None and future is not None and future.done():
+        try:
+            job["pdf"], duracao, gerado = future.result()
+            with _lock:
+                _estatisticas["geracoes" if gerado else "acertos"] += 1
+                if gerado:
+                    _duracao_media = 0.8 * _duracao_media + 0.2 * duracao
+        except BrokenProcessPool as e:
+            _descartar_executor()
+            job["erro"] = str(e)
+        except Exception as e:  # o erro é exibido na página
+            job["erro"] = str(e)
+    if job["erro"] is not None:
+        return "erro", 1.0, None, job["erro"]
+    if job["pdf"] is not None:
+        return "concluido", 1.0, job["pdf"], None
+    if not future.running():
+        return "na_fila", 0.0, None, None
+    job.setdefault("inicio_render", time.time())
+    decorrido = time.time() - job["inicio_render"]
+    return "renderizando", min(decorrido / _duracao_media, 0.95), None, None
+
+
+def cache_stats():
+    """Pedidos de relatório deste servidor: {"acertos": atendidos pelo cache, "geracoes": PDFs renderizados}."""
+    with _lock:
+        return dict(_estatisticas)
+
+
+def cancel_job(job_id):
+    with _lock:
+        job = _jobs.pop(job_id, None)
+    if job and job["future"] is not None:
+        job["future"].cancel()
+
+
+def _limpar_jobs_antigos():
+    limite = time.time() - JOB_TTL_SEGUNDOS
+    with _lock:
+        for job_id in [j for j, job in _jobs.items() if job["criado_em"] < limite]:
+            del _jobs[job_id]
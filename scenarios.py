@@ -0,0 +1,119 @@
+# scenarios.py
+"""
+Avaliação vetorizada de cenários de viabilidade.
+
+O modelo de viabilidade é linear em cada parâmetro de mercado/custo, então N
+cenários podem ser avaliados de uma só vez por broadcasting sobre arrays NumPy,
+sem reconstruir o projeto nem rodar o Streamlit para cada combinação.
+"""
+import numpy as np
+import pandas as pd
+
+# Parâmetros que podem variar entre cenários (nome, rótulo)
+PARAMETROS_CENARIO = {
+    "preco_medio_venda_m2": "Preço Médio Venda (R$/m²)",
+    "custo_area_privativa": "Custo de Construção (R$/m²)",
+    "custo_terreno_m2": "Custo do Terreno (R$/m²)",
+    "duracao_obra": "Duração da Obra (meses)",
+    "percentual_indireto": "Custos Indiretos de Venda (% VGV)",
+}
+# Limite de combinações de uma grade (a malha é alocada inteira na memória)
+MAX_CENARIOS = 1_000_000
+
+
+def base_do_modelo(modelo):
+    """Extrai de um `ViabilityModel` as grandezas fixas de um projeto (as que não variam entre cenários)."""
+    return {
+        "area_privativa": modelo.area_privativa,
+        "area_equivalente": modelo.area_equivalente_total,
+        "area_terreno": modelo.area_terreno,
+        "area_construida": modelo.area_construida_total,
+        "custo_mensal_obra": modelo.custo_mensal_obra,
+        # valores atuais dos parâmetros, usados quando um deles não é informado
+        "preco_medio_venda_m2": modelo.preco_medio_venda_m2,
+        "custo_area_privativa": modelo.custo_area_privativa,
+        "custo_terreno_m2": modelo.custo_terreno_m2,
+        "duracao_obra": modelo.duracao_obra,
+        "percentual_indireto": sum(p for p, _ in modelo.custos_indiretos.values()),
+    }
+
+
+def evaluate_scenarios(base, preco_medio_venda_m2=None, custo_area_privativa=None, custo_terreno_m2=None,
+                       duracao_obra=None, custos_indiretos_percentuais=None):
+    """
+    Avalia N cenários de uma vez.
+
+    `base` é o dicionário de `base_do_modelo` (seus valores também podem ser arrays,
+    por exemplo um por projeto). Cada parâmetro aceita um escalar ou um array (N,);
+    `custos_indiretos_percentuais` aceita ainda uma matriz (N, itens), somada por linha.
+    Parâmetros omitidos assumem o valor atual do projeto.
+    Retorna um dicionário de arrays com os resultados de cada cenário.
+    """
+    def _param(valor, nome):
+        return np.asarray(base[nome] if valor is None else valor, dtype=float)
+
+    preco = _param(preco_medio_venda_m2, "preco_medio_venda_m2")
+    custo_m2 = _param(custo_area_privativa, "custo_area_privativa")
+    terreno_m2 = _param(custo_terreno_m2, "custo_terreno_m2")
+    duracao = _param(duracao_obra, "duracao_obra")
+    percentual = _param(custos_indiretos_percentuais, "percentual_indireto")
+    if percentual.ndim == 2:
+        percentual = percentual.sum(axis=1)
+
+    area_privativa = np.asarray(base["area_privativa"], dtype=float)
+    area_construida = np.asarray(base["area_construida"], dtype=float)
+
+    vgv = area_privativa * preco
+    custo_direto = np.asarray(base["area_equivalente"], dtype=float) * custo_m2
+    custo_indireto_venda = vgv * (percentual / 100)
+    custo_indireto_obra = np.asarray(base["custo_mensal_obra"], dtype=float) * duracao
+    custo_terreno = np.asarray(base["area_terreno"], dtype=float) * terreno_m2
+    custo_total = custo_direto + custo_indireto_venda + custo_indireto_obra + custo_terreno
+    lucro = vgv - custo_total
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margem = np.where(vgv > 0, lucro / vgv * 100, 0.0)
+        custo_m2_total = np.where(area_construida > 0, custo_total / area_construida, 0.0)
+
+    return {
+        "vgv_total": vgv,
+        "custo_direto": custo_direto,
+        "custo_indireto_venda": custo_indireto_venda,
+        "custo_indireto_obra": custo_indireto_obra,
+        "custo_terreno": custo_terreno,
+        "custo_total": custo_total,
+        "lucro_bruto": lucro,
+        "margem_lucro_percentual": margem,
+        "custo_total_m2": custo_m2_total,
+    }
+
+
+def grade_de_cenarios(faixas):
+    """
+    Produto cartesiano das faixas informadas.
+
+    `faixas` mapeia o nome do parâmetro para (mínimo, máximo, nº de passos).
+    Retorna um dicionário parâmetro -> array (N,), com N = produto dos passos.
+    Levanta ValueError se N passar de `MAX_CENARIOS`.
+    """
+    nomes = list(faixas)
+    total = int(np.prod([max(int(passos), 1) for _, _, passos in faixas.values()], dtype=np.float64))
+    if total > MAX_CENARIOS:
+        raise ValueError(f"Grade com {total:,} cenários excede o limite de {MAX_CENARIOS:,}.")
+    eixos = []
+    for nome in nomes:
+        minimo, maximo, passos = faixas[nome]
+        eixo = np.linspace(minimo, maximo, max(int(passos), 1))
+        if nome == "duracao_obra":
+            eixo = np.unique(np.round(eixo))
+        eixos.append(eixo)
+    malha = np.meshgrid(*eixos, indexing="ij")
+    return {nome: m.ravel() for nome, m in zip(nomes, malha)}
+
+
+def cenarios_dataframe(parametros, resultados):
+    """Junta parâmetros e resultados num DataFrame (uma linha por cenário)."""
+    n = len(next(iter(resultados.values())))
+    dados = {nome: np.broadcast_to(valores, (n,)) for nome, valores in parametros.items()}
+    dados.update(resultados)
+    return pd.DataFrame(dados)
@@ -0,0 +1,101 @@
+# sensitivity.py
+"""
+Análise de sensibilidade analítica da margem e do lucro bruto.
+
+O lucro é linear em cada entrada isoladamente:
+    lucro = VGV * (1 - s/100) - custo direto - custo de obra - custo do terreno,
+com VGV = área privativa * preço, s = soma dos percentuais indiretos de venda,
+custo direto = custo/m² * soma(área * rep * coef), custo de obra = soma(custos
+mensais) * duração e custo do terreno = área do terreno * custo/m².
+Multiplicar uma entrada x por (1 + d) muda o lucro em exatamente d * g, com
+g = x * dlucro/dx, e g é a própria parcela de receita ou custo que depende de x.
+Assim todas as entradas são avaliadas de uma vez, sem recalcular o modelo.
+A margem é lucro / VGV: para entradas fora do VGV a variação também é exata e
+linear; para preço e área privativa ela é calculada em forma fechada.
+
+Os percentuais das etapas da obra não entram na análise: eles apenas repartem o
+custo direto entre as etapas, sem alterar os totais.
+"""
+import numpy as np
+import pandas as pd
+
+GRUPOS = ("Mercado", "Terreno", "Custo direto", "Pavimentos", "Indiretos de venda", "Indiretos de obra")
+
+
+def _entradas(modelo):
+    """Lista (rótulo, grupo, valor atual, g, entra_no_vgv) de todas as entradas do modelo."""
+    vgv = modelo.vgv_total
+    receita_liquida = vgv - modelo.custo_indireto_calculado
+    entradas = [
+        ("Preço médio de venda (R$/m²)", "Mercado", modelo.preco_medio_venda_m2, receita_liquida, True),
+        ("Área privativa (m²)", "Mercado", modelo.area_privativa, receita_liquida, True),
+        ("Custo do terreno (R$/m²)", "Terreno", modelo.custo_terreno_m2, -modelo.custo_terreno_total, False),
+        ("Área do terreno (m²)", "Terreno", modelo.area_terreno, -modelo.custo_terreno_total, False),
+        ("Custo de construção (R$/m² equivalente)", "Custo direto", modelo.custo_area_privativa, -modelo.custo_direto_total, False),
+        ("Duração da obra (meses)", "Indiretos de obra", modelo.duracao_obra, -modelo.custo_indireto_obra_total, False),
+    ]
+    for item, (percentual, custo) in modelo.custos_indiretos.items():
+        entradas.append((f"{item} (% VGV)", "Indiretos de venda", percentual, -custo, False))
+    for item, mensal in modelo.custos_indiretos_obra.items():
+        entradas.append((f"{item} (R$/mês)", "Indiretos de obra", float(mensal), -float(mensal) * modelo.duracao_obra, False))
+    df = modelo.pavimentos_df
+    if not df.empty:
+        # Área e coeficiente de cada pavimento têm o mesmo efeito: a parcela de custo direto do pavimento
+        custos = -df["custo_direto"].to_numpy(dtype=float)
+        for i, (nome, area, coef, g) in enumerate(zip(df["nome"].tolist(), df["area"].tolist(), df["coef"].tolist(), custos)):
+            entradas.append((f"Pav. {i + 1} – {nome}: área (m²)", "Pavimentos", float(area), g, False))
+            entradas.append((f"Pav. {i + 1} – {nome}: coeficiente", "Pavimentos", float(coef), g, False))
+    return entradas
+
+
+def sensitivity_analysis(modelo, variacao=0.10):
+    """
+    Efeito de variar cada entrada em -variacao e +variacao (ex.: 0.10 = ±10%), uma de cada vez.
+
+    Retorna um DataFrame ordenado pelo impacto na margem, com as colunas: entrada, grupo,
+    valor_base, lucro_baixo, lucro_alto, margem_baixa, margem_alta, impacto_margem
+    (maior variação absoluta da margem, em pontos percentuais) e impacto_lucro (R$).
+    """
+    colunas = ["entrada", "grupo", "valor_base", "lucro_baixo", "lucro_alto", "margem_baixa", "margem_alta", "impacto_margem", "impacto_lucro"]
+    entradas = _entradas(modelo)
+    if not entradas:
+        return pd.DataFrame(columns=colunas)
+    rotulos, grupos, base, g, no_vgv = (list(c) for c in zip(*entradas))
+    g, no_vgv = np.asarray(g, dtype=float), np.asarray(no_vgv, dtype=bool)
+    d = np.array([-variacao, variacao])[None, :]
+
+    lucro0, vgv0 = modelo.lucratividade_valor, modelo.vgv_total
+    lucro = lucro0 + g[:, None] * d
+    # VGV só muda para preço e área privativa, e na mesma proporção da entrada
+    vgv = np.where(no_vgv[:, None], vgv0 * (1 + d), vgv0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margem = np.where(vgv > 0, lucro / vgv * 100, 0.0)
+    margem0 = modelo.lucratividade_percentual
+
+    resultado = pd.DataFrame({
+        "entrada": rotulos, "grupo": grupos, "valor_base": np.asarray(base, dtype=float),
+        "lucro_baixo": lucro[:, 0], "lucro_alto": lucro[:, 1],
+        "margem_baixa": margem[:, 0], "margem_alta": margem[:, 1],
+        "impacto_margem": np.abs(margem - margem0).max(axis=1),
+        "impacto_lucro": np.abs(lucro - lucro0).max(axis=1),
+    })
+    return resultado.sort_values(["impacto_margem", "impacto_lucro"], ascending=False, kind="stable").reset_index(drop=True)
+
+
+def tornado_chart(analise, base, metrica="margem", n=15, titulo=None):
+    """
+    Gráfico tornado (plotly) das `n` entradas de maior impacto. `metrica` é "margem"
+    (pontos percentuais) ou "lucro" (R$); `base` é o valor atual da métrica.
+    """
+    import plotly.graph_objects as go
+
+    baixo, alto, impacto = ("margem_baixa", "margem_alta", "impacto_margem") if metrica == "margem" else ("lucro_baixo", "lucro_alto", "impacto_lucro")
+    dados = analise.nlargest(n, impacto).iloc[::-1]  # maior impacto no topo
+    fig = go.Figure()
+    fig.add_bar(y=dados["entrada"], x=dados[baixo] - base, base=base, orientation="h", name="Entrada −", marker_color="#a94442")
+    fig.add_bar(y=dados["entrada"], x=dados[alto] - base, base=base, orientation="h", name="Entrada +", marker_color="#3c763d")
+    fig.add_vline(x=base, line_dash="dash", line_color="#555")
+    fig.update_layout(barmode="overlay", title=titulo, height=max(300, 28 * len(dados) + 120),
+                      xaxis_title="Margem de lucro (%)" if metrica == "margem" else "Lucro bruto (R$)", yaxis_title=None,
+                      legend=dict(orientation="h", y=-0.15))
+    return fig
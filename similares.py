@@ -0,0 +1,160 @@
+# similares.py
+"""
+Busca das obras do histórico mais parecidas com um projeto (k vizinhos mais próximos).
+
+Cada entrada do histórico vira uma linha de uma matriz com três grupos de colunas:
+- percentuais: o percentual de cada etapa/item;
+- atributos:   área privativa, área do terreno, nº de unidades e nº de pavimentos (em log);
+- mix:         fração da área de cada tipo de pavimento.
+As colunas são padronizadas (média 0, desvio 1) e cada grupo tem o mesmo peso
+total, independente do número de colunas. Entradas antigas sem atributos ou mix
+são comparadas apenas pelas colunas que têm: a distância é a média ponderada dos
+quadrados das diferenças nas colunas presentes em ambos.
+
+A matriz é montada uma vez por versão do histórico (ver `historico.Historico.indice`);
+cada busca são quatro produtos matriz-vetor e um `argpartition`, então mesmo
+100 mil entradas respondem em milissegundos.
+"""
+import numpy as np
+import pandas as pd
+
+GRUPOS = {"percentuais": "Percentuais das etapas", "atributos": "Áreas e unidades", "mix": "Tipos de pavimento"}
+# Critérios padrão: só características do projeto, sem os percentuais que a referência vai sugerir
+GRUPOS_PADRAO = ("atributos", "mix")
+ATRIBUTOS = ("area_privativa", "area_terreno", "num_unidades", "num_pavimentos")
+FAIXA = (10, 50, 90)  # percentis da faixa de cada etapa entre os vizinhos
+
+
+def atributos_projeto(info):
+    """Atributos e mix de pavimentos (fração da área por tipo) de um projeto, no formato guardado no histórico."""
+    pavimentos = info.get("pavimentos") or []
+    areas = {}
+    for p in pavimentos:
+        areas[p["tipo"]] = areas.get(p["tipo"], 0.0) + float(p.get("area", 0) or 0) * int(p.get("rep", 1) or 1)
+    total = sum(areas.values())
+    atributos = {
+        "area_privativa": float(info.get("area_privativa", 0) or 0),
+        "area_terreno": float(info.get("area_terreno", 0) or 0),
+        "num_unidades": int(info.get("num_unidades", 0) or 0),
+        "num_pavimentos": sum(int(p.get("rep", 1) or 1) for p in pavimentos),
+    }
+    return atributos, ({tipo: a / total for tipo, a in areas.items()} if total > 0 else {})
+
+
+class IndiceSimilares:
+    """Matriz padronizada das entradas de um histórico, pronta para consultas."""
+
+    def __init__(self, entradas, itens, percentuais):
+        self.entradas = entradas
+        self.itens = list(itens)
+        self.percentuais = percentuais  # matriz original (n × itens), usada nas faixas
+        self.posicoes_por_nome = {}
+        for i, e in enumerate(entradas):
+            self.posicoes_por_nome.setdefault(e.get("nome", ""), []).append(i)
+        self.tipos = list(dict.fromkeys(t for e in entradas for t in (e.get("mix_pavimentos") or {})))
+        self.grupos = {"percentuais": slice(0, len(self.itens)),
+                       "atributos": slice(len(self.itens), len(self.itens) + len(ATRIBUTOS)),
+                       "mix": slice(len(self.itens) + len(ATRIBUTOS), len(self.itens) + len(ATRIBUTOS) + len(self.tipos))}
+        x = np.hstack([percentuais, self._atributos(e.get("atributos") for e in entradas),
+                       self._mix(e.get("mix_pavimentos") for e in entradas)]) if entradas else np.empty((0, self.grupos["mix"].stop))
+        self.media = np.zeros(x.shape[1])
+        self.desvio = np.ones(x.shape[1])
+        presentes = ~np.isnan(x)
+        if len(x):
+            contagem = presentes.sum(axis=0)
+            soma = np.where(presentes, x, 0.0).sum(axis=0)
+            self.media = np.divide(soma, contagem, out=np.zeros(x.shape[1]), where=contagem > 0)
+            variancia = np.where(presentes, (x - self.media) ** 2, 0.0).sum(axis=0)
+            desvio = np.sqrt(np.divide(variancia, contagem, out=np.zeros(x.shape[1]), where=contagem > 0))
+            self.desvio = np.where(desvio > 1e-12, desvio, 1.0)
+        z = np.where(presentes, (x - self.media) / self.desvio, 0.0)
+        # Termos da expansão de Σ w·m·(x − q)², pré-calculados para a consulta virar produtos matriz-vetor
+        self._m = presentes.astype(float)
+        self._z = z
+        self._z2 = z * z
+
+    def _atributos(self, linhas):
+        linhas = list(linhas)
+        return np.array([[np.log1p(float(a[c])) if a and a.get(c) is not None else np.nan for c in ATRIBUTOS] for a in linhas],
+                        dtype=float).reshape(len(linhas), len(ATRIBUTOS))
+
+    def _mix(self, linhas):
+        # Entrada com mix: tipos ausentes valem 0; entrada sem mix: a linha toda fica de fora (NaN)
+        linhas = list(linhas)
+        return np.array([[float(m.get(t, 0.0)) if m else np.nan for t in self.tipos] for m in linhas],
+                        dtype=float).reshape(len(linhas), len(self.tipos))
+
+    def vetor(self, percentuais=None, atributos=None, mix=None):
+        """Vetor de consulta (não padronizado) de um projeto; grupos não informados ficam NaN."""
+        percentuais = percentuais or {}
+        p = np.array([float(percentuais[i]) if percentuais.get(i) is not None else np.nan for i in self.itens], dtype=float)
+        return np.concatenate([p, self._atributos([atributos])[0], self._mix([mix])[0]])
+
+    def buscar(self, q, k=5, pesos=None, excluir=()):
+        """
+        Os `k` vizinhos mais próximos do vetor `q` (de `vetor`). `pesos` mapeia grupo -> peso
+        (padrão: 1 para cada grupo). Retorna (posições das entradas, distâncias), da mais próxima.
+        """
+        pesos = {g: 1.0 for g in GRUPOS} if pesos is None else pesos
+        w = np.zeros(len(q))
+        for grupo, fatia in self.grupos.items():
+            n = fatia.stop - fatia.start
+            if n and pesos.get(grupo, 0):
+                w[fatia] = pesos[grupo] / n
+        qz = (np.asarray(q, dtype=float) - self.media) / self.desvio
+        usar = ~np.isnan(qz) & (w > 0)
+        wq = np.where(usar, w, 0.0)
+        qz = np.where(usar, qz, 0.0)
+        # Σ w·m·(z − q)² = Σ w·m·z² − 2 Σ w·m·z·q + Σ w·m·q², só nas colunas presentes nos dois
+        peso_presente = self._m @ wq
+        soma = self._z2 @ wq - 2 * (self._z @ (wq * qz)) + self._m @ (wq * qz * qz)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            dist = np.sqrt(np.maximum(soma, 0.0) / peso_presente)
+        dist = np.where(peso_presente > 0, dist, np.inf)
+        if len(excluir):
+            dist[np.asarray(excluir, dtype=int)] = np.inf
+        k = min(k, int(np.isfinite(dist).sum()))
+        if k <= 0:
+            return np.empty(0, dtype=int), np.empty(0)
+        posicoes = np.argpartition(dist, k - 1)[:k]
+        posicoes = posicoes[np.argsort(dist[posicoes], kind="stable")]
+        return posicoes, dist[posicoes]
+
+    def faixa(self, posicoes, percentis=FAIXA):
+        """Percentis de cada etapa/item entre as entradas `posicoes` (DataFrame itens × percentis)."""
+        colunas = [f"p{p}" for p in percentis]
+        if not len(posicoes) or not self.itens:
+            return pd.DataFrame(columns=colunas, index=pd.Index(self.itens, name="item"), dtype=float)
+        valores = self.percentuais[posicoes]
+        if not np.isnan(valores).any():
+            faixa = np.percentile(valores, percentis, axis=0).T
+        else:
+            faixa = np.full((len(self.itens), len(percentis)), np.nan)
+            presentes = ~np.isnan(valores).all(axis=0)
+            if presentes.any():
+                faixa[presentes] = np.nanpercentile(valores[:, presentes], percentis, axis=0).T
+        return pd.DataFrame(faixa, index=pd.Index(self.itens, name="item"), columns=colunas)
+
+
+def projetos_similares(historico, info, percentuais=None, k=5, pesos=None):
+    """
+    As `k` obras de `historico` (um `historico.Historico`) mais parecidas com o projeto `info`.
+    `percentuais` são os do projeto (ex.: da session_state); sem eles, o grupo é ignorado.
+    `pesos` mapeia grupo -> peso (padrão: 1 para cada grupo de `GRUPOS_PADRAO`). As entradas
+    arquivadas do próprio projeto (mesmo nome) ficam de fora.
+    Retorna (DataFrame dos vizinhos, DataFrame da faixa de percentis de cada etapa entre eles).
+    """
+    indice = historico.indice
+    atributos, mix = atributos_projeto(info)
+    pesos = {g: 1.0 for g in GRUPOS_PADRAO} if pesos is None else pesos
+    excluir = indice.posicoes_por_nome.get(info.get("nome", ""), []) if info.get("nome") else []
+    posicoes, dist = indice.buscar(indice.vetor(percentuais, atributos, mix or None), k, pesos, excluir)
+    vizinhos = pd.DataFrame({
+        "id": [indice.entradas[i]["id"] for i in posicoes],
+        "nome": [indice.entradas[i].get("nome", "") for i in posicoes],
+        "data": [indice.entradas[i].get("data") for i in posicoes],
+        "distancia": dist,
+        # 1 para uma obra idêntica, tendendo a 0 com a distância (em desvios-padrão)
+        "similaridade": 1.0 / (1.0 + dist),
+    })
+    return vizinhos, indice.faixa(posicoes)
@@ -0,0 +1,416 @@
+# storage.py
+"""
+Camada de armazenamento de projetos e do histórico de custos.
+
+Dois backends com a mesma interface:
+- `JSONStorage`: os arquivos `projects.json`, `historico_direto.json` e
+  `historico_indireto.json` (formato original, reescritos a cada gravação);
+- `SQLiteStorage`: banco SQLite em modo WAL, com projetos indexados por id,
+  tabelas de histórico e gravações transacionais.
+
+Ambos mantêm, a cada gravação, um índice leve de projetos (id, nome, datas e
+KPIs principais) para que a listagem não precise desserializar os projetos.
+
+O backend é escolhido pela variável de ambiente `STORAGE_BACKEND` ("sqlite",
+padrão, ou "json"). Na primeira abertura do banco SQLite os arquivos JSON
+existentes são migrados automaticamente; a migração também pode ser feita com
+`python -m storage migrar`.
+"""
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+JSON_PATH = "projects.json"
+HISTORICO_DIRETO_PATH = "historico_direto.json"
+HISTORICO_INDIRETO_PATH = "historico_indireto.json"
+HISTORICO_PATHS = {"direto": HISTORICO_DIRETO_PATH, "indireto": HISTORICO_INDIRETO_PATH}
+INDEX_PATH = "projects_index.json"
+# KPIs guardados no índice de projetos, ao lado de id, nome, created_at e updated_at
+CAMPOS_RESUMO = ("vgv_total", "custo_total", "lucro_bruto", "margem_lucro_percentual")
+DB_PATH = os.environ.get("STORAGE_DB_PATH", "parametrico.db")
+BACKENDS = ("sqlite", "json")
+
+
+# --- Arquivos JSON ---
+
+def init_storage(path):
+    if not os.path.exists(path):
+        with open(path, "w", encoding="utf-8") as f: json.dump([], f, ensure_ascii=False, indent=4)
+def load_json(path):
+    init_storage(path)
+    with open(path, "r", encoding="utf-8") as f: return json.load(f)
+def save_json(data, path):
+    # Grava num arquivo temporário e substitui o original, para nunca deixar um JSON truncado
+    pasta = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", encoding="utf-8", dir=pasta, suffix=".tmp", delete=False) as f:
+        json.dump(data, f, ensure_ascii=False, indent=4)
+    os.replace(f.name, path)
+
+
+def iter_json_array(path, tamanho_bloco=1 << 16):
+    """
+    Lê os elementos de um arquivo com uma lista JSON um a um, sem carregar o
+    arquivo inteiro: a memória usada é proporcional ao maior elemento, não à lista.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf, fim, bloco = "", False, tamanho_bloco
+        inicio_lista = False
+        while True:
+            i = 0
+            while i < len(buf) and buf[i] in " \t\r\n,":
+                i += 1
+            if not inicio_lista and i < len(buf):
+                if buf[i] != "[":
+                    raise ValueError(f"{path}: esperado uma lista JSON")
+                inicio_lista, i = True, i + 1
+                buf = buf[i:]
+                continue
+            if i < len(buf) and buf[i] == "]":
+                return
+            try:
+                elemento, j = decoder.raw_decode(buf, i)
+                # Um elemento que termina exatamente no fim do buffer pode estar incompleto (ex.: número)
+                if j < len(buf) or fim:
+                    yield elemento
+                    buf, bloco = buf[j:], tamanho_bloco
+                    continue
+            except json.JSONDecodeError:
+                if fim:
+                    raise
+            if fim:
+                return
+            pedaco = f.read(bloco)
+            fim = not pedaco
+            buf = buf[i:] + pedaco
+            # Elementos maiores que o bloco: dobra a leitura para não redecodificar do início muitas vezes
+            bloco *= 2
+
+
+def _agora():
+    return datetime.utcnow().isoformat()
+
+
+def _resumo(info, kpis):
+    """Linha do índice de projetos: identificação + KPIs (ausentes ficam como None)."""
+    kpis = kpis or {}
+    resumo = {"id": info["id"], "nome": info.get("nome", ""), "created_at": info.get("created_at"), "updated_at": info.get("updated_at")}
+    resumo.update({campo: kpis.get(campo) for campo in CAMPOS_RESUMO})
+    return resumo
+
+
+class JSONStorage:
+    """Backend original: uma lista JSON por arquivo, relida e reescrita a cada operação."""
+
+    nome = "json"
+
+    def __init__(self, projects_path=JSON_PATH, historico_paths=None, index_path=INDEX_PATH):
+        self.projects_path = projects_path
+        self.historico_paths = historico_paths or HISTORICO_PATHS
+        self.index_path = index_path
+        self._lock = threading.Lock()
+        init_storage(self.projects_path)
+
+    def list_projects(self):
+        return load_json(self.projects_path)
+
+    def iter_projects(self):
+        """Percorre os projetos sem carregar o arquivo inteiro na memória."""
+        return iter_json_array(self.projects_path)
+
+    def load_project(self, pid):
+        return next((p for p in load_json(self.projects_path) if p["id"] == pid), None)
+
+    def save_project(self, info, kpis=None):
+        with self._lock:
+            projs = load_json(self.projects_path)
+            info["updated_at"] = _agora()
+            if info.get("id"):
+                projs = [p if p["id"] != info["id"] else info for p in projs]
+            else:
+                pid = (max(p["id"] for p in projs) + 1) if projs else 1
+                info["id"] = pid; info["created_at"] = info["updated_at"]; projs.append(info)
+            save_json(projs, self.projects_path)
+            if os.path.exists(self.index_path):
+                indice = [r for r in load_json(self.index_path) if r["id"] != info["id"]] + [_resumo(info, kpis)]
+                save_json(sorted(indice, key=lambda r: r["id"]), self.index_path)
+        return info
+
+    def update_project_field(self, pid, campo, valor):
+        """Altera apenas `campo` do projeto gravado (sem tocar nos demais nem em updated_at). Retorna False se não existir."""
+        with self._lock:
+            projs = load_json(self.projects_path)
+            for p in projs:
+                if p["id"] == pid:
+                    p[campo] = valor
+                    save_json(projs, self.projects_path)
+                    return True
+        return False
+
+    def delete_project(self, pid):
+        with self._lock:
+            projs = [p for p in load_json(self.projects_path) if p["id"] != pid]; save_json(projs, self.projects_path)
+            if os.path.exists(self.index_path):
+                save_json([r for r in load_json(self.index_path) if r["id"] != pid], self.index_path)
+
+    def list_project_summaries(self, resumir):
+        """
+        Lê apenas o índice de projetos. Se o índice ainda não existe, ele é
+        construído uma vez a partir dos projetos, usando `resumir(info) -> kpis`.
+        """
+        if not os.path.exists(self.index_path):
+            with self._lock:
+                indice = [_resumo(p, resumir(p)) for p in load_json(self.projects_path)]
+                save_json(indice, self.index_path)
+            return indice
+        return load_json(self.index_path)
+
+    def load_historico(self, tipo):
+        return load_json(self.historico_paths[tipo])
+
+    def append_historico(self, tipo, entrada):
+        with self._lock:
+            historico = load_json(self.historico_paths[tipo])
+            entrada["id"] = (max(p["id"] for p in historico) + 1) if historico else 1
+            historico.append(entrada)
+            save_json(historico, self.historico_paths[tipo])
+        return entrada
+
+    def versao_historico(self, tipo):
+        """Identifica o conteúdo atual do histórico (mtime e tamanho do arquivo), sem lê-lo."""
+        try:
+            st = os.stat(self.historico_paths[tipo])
+        except FileNotFoundError:
+            return None
+        return (st.st_mtime_ns, st.st_size)
+
+
+# --- SQLite ---
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL,
+    created_at TEXT,
+    updated_at TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS project_index (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL,
+    created_at TEXT,
+    updated_at TEXT,
+    vgv_total REAL,
+    custo_total REAL,
+    lucro_bruto REAL,
+    margem_lucro_percentual REAL
+);
+CREATE TABLE IF NOT EXISTS historico_direto (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL,
+    data TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS historico_indireto (
+    id INTEGER PRIMARY KEY,
+    nome TEXT NOT NULL,
+    data TEXT,
+    payload TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS meta (
+    chave TEXT PRIMARY KEY,
+    valor TEXT
+);
+"""
+TABELAS_HISTORICO = {"direto": "historico_direto", "indireto": "historico_indireto"}
+
+
+class SQLiteStorage:
+    """Backend SQLite (WAL): leituras não bloqueiam gravações e cada gravação é uma transação."""
+
+    nome = "sqlite"
+
+    def __init__(self, db_path=DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._conexao().executescript(SCHEMA)
+
+    def _conexao(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: as transações são abertas explicitamente em _transacao
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transacao(self):
+        conn = self._conexao()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def list_projects(self):
+        return [json.loads(payload) for (payload,) in self._conexao().execute("SELECT payload FROM projects ORDER BY id")]
+
+    def iter_projects(self, tamanho_lote=500):
+        """Percorre os projetos pelo cursor, lendo `tamanho_lote` linhas do banco por vez."""
+        cursor = self._conexao().execute("SELECT payload FROM projects ORDER BY id")
+        while True:
+            linhas = cursor.fetchmany(tamanho_lote)
+            if not linhas:
+                return
+            for (payload,) in linhas:
+                yield json.loads(payload)
+
+    def load_project(self, pid):
+        row = self._conexao().execute("SELECT payload FROM projects WHERE id = ?", (pid,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_project(self, info, kpis=None):
+        with self._transacao() as conn:
+            info["updated_at"] = _agora()
+            if not info.get("id"):
+                info["id"] = conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM projects").fetchone()[0]
+                info["created_at"] = info["updated_at"]
+            conn.execute(
+                "INSERT INTO projects (id, nome, created_at, updated_at, payload) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT(id) DO UPDATE SET nome = excluded.nome, updated_at = excluded.updated_at, payload = excluded.payload",
+                (info["id"], info.get("nome", ""), info.get("created_at"), info["updated_at"], json.dumps(info, ensure_ascii=False)))
+            self._indexar(conn, [_resumo(info, kpis)])
+        return info
+
+    def update_project_field(self, pid, campo, valor):
+        """Altera apenas `campo` do projeto gravado, lendo e regravando o payload na mesma transação."""
+        with self._transacao() as conn:
+            row = conn.execute("SELECT payload FROM projects WHERE id = ?", (pid,)).fetchone()
+            if row is None:
+                return False
+            info = json.loads(row[0])
+            info[campo] = valor
+            conn.execute("UPDATE projects SET payload = ? WHERE id = ?", (json.dumps(info, ensure_ascii=False), pid))
+        return True
+
+    def delete_project(self, pid):
+        with self._transacao() as conn:
+            conn.execute("DELETE FROM projects WHERE id = ?", (pid,))
+            conn.execute("DELETE FROM project_index WHERE id = ?", (pid,))
+
+    def _indexar(self, conn, resumos):
+        colunas = ("id", "nome", "created_at", "updated_at") + CAMPOS_RESUMO
+        conn.executemany(f"INSERT OR REPLACE INTO project_index ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})",
+                         [tuple(r[c] for c in colunas) for r in resumos])
+
+    def list_project_summaries(self, resumir):
+        """
+        Lê apenas a tabela `project_index`. Projetos sem linha no índice (ex.:
+        vindos da migração) são resumidos uma única vez com `resumir(info) -> kpis`.
+        """
+        conn = self._conexao()
+        if conn.execute("SELECT 1 FROM meta WHERE chave = 'indice_projetos'").fetchone() is None:
+            with self._transacao() as conn_tx:
+                faltantes = conn_tx.execute("SELECT p.payload FROM projects p LEFT JOIN project_index i ON i.id = p.id WHERE i.id IS NULL")
+                self._indexar(conn_tx, [_resumo(info, resumir(info)) for info in (json.loads(payload) for (payload,) in faltantes.fetchall())])
+                conn_tx.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('indice_projetos', ?)", (_agora(),))
+        colunas = ("id", "nome", "created_at", "updated_at") + CAMPOS_RESUMO
+        return [dict(zip(colunas, row)) for row in conn.execute(f"SELECT {', '.join(colunas)} FROM project_index ORDER BY id")]
+
+    def load_historico(self, tipo):
+        tabela = TABELAS_HISTORICO[tipo]
+        return [json.loads(payload) for (payload,) in self._conexao().execute(f"SELECT payload FROM {tabela} ORDER BY id")]
+
+    def append_historico(self, tipo, entrada):
+        tabela = TABELAS_HISTORICO[tipo]
+        with self._transacao() as conn:
+            entrada["id"] = conn.execute(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {tabela}").fetchone()[0]
+            conn.execute(f"INSERT INTO {tabela} (id, nome, data, payload) VALUES (?, ?, ?, ?)",
+                         (entrada["id"], entrada.get("nome", ""), entrada.get("data"), json.dumps(entrada, ensure_ascii=False)))
+            conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (f"versao_{tabela}", _agora()))
+        return entrada
+
+    def versao_historico(self, tipo):
+        """Identifica o conteúdo atual do histórico: consultas pela chave primária, sem ler a tabela."""
+        tabela = TABELAS_HISTORICO[tipo]
+        conn = self._conexao()
+        versao = conn.execute("SELECT valor FROM meta WHERE chave = ?", (f"versao_{tabela}",)).fetchone()
+        return (versao[0] if versao else None, conn.execute(f"SELECT MAX(id) FROM {tabela}").fetchone()[0])
+
+    def migrado(self):
+        return self._conexao().execute("SELECT 1 FROM meta WHERE chave = 'migrado_de_json'").fetchone() is not None
+
+    def import_json(self, projects_path=JSON_PATH, historico_paths=None):
+        """Importa os arquivos JSON numa única transação, preservando os ids. Retorna as contagens."""
+        historico_paths = historico_paths or HISTORICO_PATHS
+        contagem = {}
+        with self._transacao() as conn:
+            projs = load_json(projects_path) if os.path.exists(projects_path) else []
+            conn.executemany(
+                "INSERT OR REPLACE INTO projects (id, nome, created_at, updated_at, payload) VALUES (?, ?, ?, ?, ?)",
+                [(p["id"], p.get("nome", ""), p.get("created_at"), p.get("updated_at", p.get("created_at")), json.dumps(p, ensure_ascii=False)) for p in projs])
+            # Os projetos importados são reindexados na próxima listagem
+            conn.executemany("DELETE FROM project_index WHERE id = ?", [(p["id"],) for p in projs])
+            conn.execute("DELETE FROM meta WHERE chave = 'indice_projetos'")
+            contagem["projects"] = len(projs)
+            for tipo, tabela in TABELAS_HISTORICO.items():
+                path = historico_paths[tipo]
+                historico = load_json(path) if os.path.exists(path) else []
+                conn.executemany(f"INSERT OR REPLACE INTO {tabela} (id, nome, data, payload) VALUES (?, ?, ?, ?)",
+                                 [(h["id"], h.get("nome", ""), h.get("data"), json.dumps(h, ensure_ascii=False)) for h in historico])
+                contagem[tabela] = len(historico)
+                conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (f"versao_{tabela}", _agora()))
+            conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('migrado_de_json', ?)", (_agora(),))
+        return contagem
+
+
+# --- Seleção do backend ---
+
+_storage = None
+_storage_lock = threading.Lock()
+
+
+def get_storage():
+    """Retorna o backend configurado (um por processo)."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                _storage = create_storage(os.environ.get("STORAGE_BACKEND", "sqlite"))
+    return _storage
+
+
+def create_storage(backend, db_path=DB_PATH):
+    if backend == "json":
+        return JSONStorage()
+    if backend == "sqlite":
+        storage = SQLiteStorage(db_path)
+        # Migração única: na primeira abertura, traz os dados dos arquivos JSON, se houver
+        if not storage.migrado() and any(os.path.exists(p) for p in (JSON_PATH, *HISTORICO_PATHS.values())):
+            storage.import_json()
+        return storage
+    raise ValueError(f"Backend de armazenamento desconhecido: {backend} (opções: {', '.join(BACKENDS)})")
+
+
+def migrate_json_to_sqlite(db_path=DB_PATH, projects_path=JSON_PATH, historico_paths=None):
+    """Migração explícita dos arquivos JSON para o banco SQLite."""
+    return SQLiteStorage(db_path).import_json(projects_path, historico_paths)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "migrar":
+        print("Uso: python -m storage migrar [caminho_do_banco]")
+        sys.exit(1)
+    destino = sys.argv[2] if len(sys.argv) > 2 else DB_PATH
+    for tabela, n in migrate_json_to_sqlite(destino).items():
+        print(f"{tabela}: {n} registros migrados para {destino}")
@@ -0,0 +1,158 @@
+# tools/gemini_stub_server.py
+"""
+Substituto local da API do Gemini, para testar a análise com I.A. sem rede nem chave.
+
+Responde ao `generateContent` (JSON, após `--atraso` segundos) e ao
+`streamGenerateContent?alt=sse` (eventos SSE, um por trecho, com `--atraso`
+segundos entre eles) reproduzindo respostas prontas: os arquivos .txt de
+`--respostas` em rodízio, ou um texto padrão com as cinco seções da análise. As primeiras `--falhas` requisições recebem 429 com
+`Retry-After: --retry-after`, para exercitar as novas tentativas.
+
+Uso:
+    python tools/gemini_stub_server.py --porta 8765 [--atraso 0.05] [--falhas 1] [--respostas pasta/]
+    GEMINI_API_BASE=http://127.0.0.1:8765/v1beta streamlit run Início.py
+"""
+import argparse
+import itertools
+import json
+import os
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+RESPOSTA_PADRAO = """1. Avaliação da Viabilidade Financeira
+O projeto apresenta margem compatível com as referências de mercado.
+
+2. Análise Detalhada dos Custos
+O custo direto é a maior parcela do custo total, seguido pelo terreno.
+
+3. Análise de Desempenho por Área
+Os custos por m² estão acima da referência do SINAPI, como esperado para o padrão.
+
+4. Recomendações Estratégicas
+- Revisar o orçamento das etapas de maior peso.
+- Negociar o terreno em permuta.
+- Ajustar o mix de unidades ao preço de venda.
+
+5. Conclusão e Próximos Passos
+Recomenda-se aprofundar o estudo de mercado antes do detalhamento."""
+ROTA = re.compile(r"^/v1beta/models/(?P<modelo>[^/:]+):(?P<metodo>generateContent|streamGenerateContent)$")
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # mantém a conexão aberta entre requisições (keep-alive)
+
+    def log_message(self, formato, *args):
+        if not self.server.silencioso:
+            super().log_message(formato, *args)
+
+    def _json(self, status, corpo, cabecalhos=()):
+        dados = json.dumps(corpo).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(dados)))
+        for nome, valor in cabecalhos:
+            self.send_header(nome, valor)
+        self.end_headers()
+        self.wfile.write(dados)
+
+    def do_POST(self):
+        caminho, _, _ = self.path.partition("?")
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        rota = ROTA.match(caminho)
+        if rota is None:
+            self._json(404, {"error": {"code": 404, "message": f"rota desconhecida: {caminho}"}})
+            return
+        servidor = self.server
+        with servidor.lock:
+            servidor.requisicoes += 1
+            falhar = servidor.requisicoes <= servidor.falhas
+            texto = next(servidor.respostas)
+        if falhar:
+            self._json(429, {"error": {"code": 429, "message": "Resource has been exhausted"}},
+                       [("Retry-After", str(servidor.retry_after))])
+            return
+        if rota["metodo"] == "generateContent":
+            if servidor.atraso: time.sleep(servidor.atraso)  # simula o tempo de geração
+            self._json(200, _evento(texto, fim=True))
+            return
+        # SSE com codificação "chunked": cada trecho é enviado assim que "gerado"
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        trechos = _trechos(texto, servidor.tamanho_trecho)
+        try:
+            for i, trecho in enumerate(trechos):
+                if servidor.atraso: time.sleep(servidor.atraso)
+                dados = f"data: {json.dumps(_evento(trecho, fim=i == len(trechos) - 1))}\r\n\r\n".encode("utf-8")
+                self.wfile.write(f"{len(dados):X}\r\n".encode() + dados + b"\r\n")
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+        except (BrokenPipeError, ConnectionResetError):
+            self.close_connection = True  # o cliente cancelou
+
+
+def _evento(texto, fim=False):
+    candidata = {"content": {"parts": [{"text": texto}], "role": "model"}, "index": 0}
+    if fim:
+        candidata["finishReason"] = "STOP"
+    return {"candidates": [candidata]}
+
+
+def _trechos(texto, tamanho):
+    return [texto[i:i + tamanho] for i in range(0, len(texto), tamanho)] or [""]
+
+
+def criar_servidor(porta=0, respostas=None, atraso=0.0, falhas=0, retry_after=1, tamanho_trecho=40, silencioso=True):
+    """Servidor (ainda parado) na porta `porta` (0: uma livre); `respostas` é uma lista de textos."""
+    servidor = ThreadingHTTPServer(("127.0.0.1", porta), StubHandler)
+    servidor.daemon_threads = True
+    servidor.respostas = itertools.cycle(respostas or [RESPOSTA_PADRAO])
+    servidor.atraso, servidor.falhas, servidor.retry_after = atraso, falhas, retry_after
+    servidor.tamanho_trecho, servidor.silencioso = tamanho_trecho, silencioso
+    servidor.requisicoes = 0
+    servidor.lock = threading.Lock()
+    return servidor
+
+
+def iniciar(**kwargs):
+    """Inicia o servidor numa thread e retorna (servidor, url base para `GEMINI_API_BASE`)."""
+    servidor = criar_servidor(**kwargs)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor, f"http://127.0.0.1:{servidor.server_address[1]}/v1beta"
+
+
+def ler_respostas(diretorio):
+    respostas = []
+    for nome in sorted(os.listdir(diretorio)):
+        if nome.endswith(".txt"):
+            with open(os.path.join(diretorio, nome), encoding="utf-8") as f:
+                respostas.append(f.read())
+    return respostas
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Substituto local da API do Gemini (respostas prontas).")
+    parser.add_argument("--porta", type=int, default=8765)
+    parser.add_argument("--respostas", help="pasta com arquivos .txt usados como respostas, em rodízio")
+    parser.add_argument("--atraso", type=float, default=0.05, help="segundos entre os trechos do streaming (e antes da resposta sem streaming)")
+    parser.add_argument("--tamanho-trecho", type=int, default=40, help="caracteres por trecho do streaming")
+    parser.add_argument("--falhas", type=int, default=0, help="quantas das primeiras requisições recebem 429")
+    parser.add_argument("--retry-after", type=int, default=1, help="valor do cabeçalho Retry-After nas respostas 429")
+    args = parser.parse_args(argv)
+
+    servidor = criar_servidor(args.porta, ler_respostas(args.respostas) if args.respostas else None, args.atraso,
+                              args.falhas, args.retry_after, args.tamanho_trecho, silencioso=False)
+    print(f"GEMINI_API_BASE=http://127.0.0.1:{servidor.server_address[1]}/v1beta", file=sys.stderr)
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,13 +1,15 @@
 # utils.py
 import streamlit as st
 import pandas as pd
+import numpy as np
 import json
 import os
+import threading
 from datetime import datetime
-from weasyprint import HTML
 import base64
 from io import BytesIO
 import matplotlib.pyplot as plt
+from disk_cache import DiskCache, hash_chave
 
 # --- CONSTANTES GLOBAIS e outras funções ---
 
@@ -17,12 +19,77 @@ def fmt_br(valor):
     """
     if pd.isna(valor) or valor is None:
         return "0,00"
-    s = f"{valor:,.2f}"
-    return s.replace(",", "X").replace(".", ",").replace("X", ".")
+    return f"{valor:,.2f}".translate(_TABELA_BR)
 
-JSON_PATH = "projects.json"
-HISTORICO_DIRETO_PATH = "historico_direto.json"
-HISTORICO_INDIRETO_PATH = "historico_indireto.json"
+# Troca "," por "." e vice-versa numa única passada
+_TABELA_BR = str.maketrans(",.", ".,")
+
+# Acima disto (em R$) os centavos não cabem na precisão do float: esses valores são formatados um a um
+_LIMITE_VETORIZADO = 2.0 ** 52 / 100
+# Textos pré-montados de cada grupo de 3 dígitos e dos centavos, consultados por índice (evita int -> str elemento a elemento)
+_GRUPO_INICIAL = np.array([str(i) for i in range(1000)])
+_GRUPO_MILHAR = np.array([f".{i:03d}" for i in range(1000)])
+_GRUPO_CENTAVOS = np.array([f",{i:02d}" for i in range(100)])
+
+def _centavos(valores):
+    """
+    Arredonda valores float (finitos, não negativos) para centavos inteiros como `format(v, ".2f")`:
+    pelo valor binário exato, com empate para o par.
+    """
+    produto = valores * 100
+    # Erro exato do produto (Dekker): valores * 100 == produto + erro, sem arredondamento
+    t = valores * 134217729.0
+    alto = t - (t - valores)
+    erro = (alto * 100 - produto) + (valores - alto) * 100
+    centavos = np.rint(produto)
+    # `rint` desempata pelo par; só é empate de verdade se o produto foi exato
+    centavos += ((produto - centavos == 0.5) & (erro > 0)).astype(float) - ((produto - centavos == -0.5) & (erro < 0))
+    return centavos.astype(np.int64)
+
+def _fmt_br_plano(arr):
+    """Formata um array 1-D não vazio com operações de array (divisão inteira, tabelas de grupos e `np.char`)."""
+    grandes = None
+    if arr.dtype.kind in "iu":
+        # Inteiros direto, sem passar por float (mantém a precisão de valores grandes)
+        inteiros, centavos, negativos = np.abs(arr.astype(np.int64)), np.zeros(arr.shape, dtype=np.int64), arr < 0
+    else:
+        arr = pd.to_numeric(arr, errors="coerce").astype(float)
+        arr = np.where(np.isnan(arr), 0.0, arr)
+        grandes = ~(np.abs(arr) < _LIMITE_VETORIZADO)  # inclui ±inf
+        inteiros, centavos = np.divmod(_centavos(np.where(grandes, 0.0, np.abs(arr))), 100)
+        negativos = np.signbit(arr)  # como format(): -0.001 vira "-0,00"
+    # Milhares: o grupo mais significativo sem zeros à esquerda, seguido dos demais com 3 dígitos
+    n_grupos = np.ones(inteiros.shape, dtype=np.int64)
+    while 1000 ** int(n_grupos.max()) <= inteiros.max():
+        n_grupos += inteiros >= 1000 ** int(n_grupos.max())
+    texto = np.char.add(np.where(negativos, "-", ""), _GRUPO_INICIAL[inteiros // 1000 ** (n_grupos - 1)])
+    for k in range(int(n_grupos.max()) - 2, -1, -1):
+        texto = np.char.add(texto, np.where(n_grupos > k + 1, _GRUPO_MILHAR[inteiros // 1000 ** k % 1000], ""))
+    resultado = np.char.add(texto, _GRUPO_CENTAVOS[centavos]).astype(object)
+    if grandes is not None and grandes.any():
+        resultado[grandes] = [format(v, ",.2f").translate(_TABELA_BR) for v in arr[grandes].tolist()]
+    return resultado
+
+def fmt_br_array(valores):
+    """
+    Versão vetorizada de `fmt_br` para uma Series, array ou lista: mesma saída, elemento a
+    elemento (NaN/None viram "0,00"). Retorna uma Series com o mesmo índice quando
+    recebe uma Series, senão um array de strings.
+    """
+    arr = np.asarray(valores)
+    resultado = _fmt_br_plano(arr.ravel()) if arr.size else np.empty(0, dtype=object)
+    resultado = resultado.reshape(np.shape(valores))
+    if isinstance(valores, pd.Series):
+        return pd.Series(resultado, index=valores.index, name=valores.name)
+    return resultado
+
+from storage import (
+    JSON_PATH, HISTORICO_DIRETO_PATH, HISTORICO_INDIRETO_PATH,
+    CAMPOS_RESUMO, init_storage, load_json, save_json, get_storage
+)
+from historico import obter_historico, invalidar as invalidar_historico
+from similares import atributos_projeto
+from historico_colunar import registrar as registrar_colunar
 
 TIPOS_PAVIMENTO = {
     "Área Privativa (Autônoma)": (1.00, 1.00), "Áreas de lazer ambientadas": (2.00, 4.00), "Varandas": (0.75, 1.00),
@@ -32,6 +99,28 @@ TIPOS_PAVIMENTO = {
     "Piscinas": (0.50, 0.75), "Quintais / Calçadas / Jardins": (0.10, 0.30), "Projeção Terreno sem Benfeitoria": (0.00, 0.00),
 }
 DEFAULT_PAVIMENTO = {"nome": "Pavimento Tipo", "tipo": "Área Privativa (Autônoma)", "rep": 1, "coef": 1.00, "area": 100.0, "constr": True}
+CAMPOS_PAVIMENTO = tuple(DEFAULT_PAVIMENTO)
+
+def normalizar_pavimentos(registros):
+    """
+    Converte linhas vindas do editor ou de um CSV em pavimentos válidos: completa campos
+    ausentes com DEFAULT_PAVIMENTO, converte os tipos e limita o coeficiente à faixa do
+    tipo de pavimento. Levanta ValueError para tipos de pavimento desconhecidos.
+    """
+    pavimentos = []
+    for n, registro in enumerate(registros, start=1):
+        pav = DEFAULT_PAVIMENTO.copy()
+        pav.update({k: v for k, v in registro.items() if k in CAMPOS_PAVIMENTO and v is not None and not (isinstance(v, float) and pd.isna(v))})
+        if pav['tipo'] not in TIPOS_PAVIMENTO:
+            raise ValueError(f"Linha {n}: tipo de pavimento desconhecido '{pav['tipo']}'")
+        min_c, max_c = TIPOS_PAVIMENTO[pav['tipo']]
+        constr = pav['constr']
+        if isinstance(constr, str): constr = constr.strip().lower() in ("sim", "s", "true", "1", "x")
+        pavimentos.append({
+            "nome": str(pav['nome']), "tipo": pav['tipo'], "rep": max(1, int(pav['rep'])),
+            "coef": float(min(max(float(pav['coef']), min_c), max_c)), "area": max(0.0, float(pav['area'])), "constr": bool(constr),
+        })
+    return pavimentos
 
 ETAPAS_OBRA = {
     "Serviços Preliminares e Fundações":        (7.0, 8.0, 9.0),
@@ -76,26 +165,20 @@ DEFAULT_CUSTOS_INDIRETOS_OBRA = {
     "Despesas de Escritório e Apoio": 800.0,
 }
 
-def init_storage(path):
-    if not os.path.exists(path):
-        with open(path, "w", encoding="utf-8") as f: json.dump([], f, ensure_ascii=False, indent=4)
-def load_json(path):
-    init_storage(path);
-    with open(path, "r", encoding="utf-8") as f: return json.load(f)
-def save_json(data, path):
-    with open(path, "w", encoding="utf-8") as f: json.dump(data, f, ensure_ascii=False, indent=4)
 def list_projects():
-    return load_json(JSON_PATH)
+    return get_storage().list_projects()
+def resumo_kpis(info):
+    """KPIs gravados no índice de projetos (ver `storage.CAMPOS_RESUMO`)."""
+    from viability import ViabilityModel
+    return {k: v for k, v in ViabilityModel.from_project(info).indicadores().items() if k in CAMPOS_RESUMO}
+def list_project_summaries():
+    return get_storage().list_project_summaries(resumo_kpis)
 def save_project(info):
-    projs = load_json(JSON_PATH)
-    if info.get("id"):
-        projs = [p if p["id"] != info["id"] else info for p in projs]
-    else:
-        pid = (max(p["id"] for p in projs) + 1) if projs else 1
-        info["id"] = pid; info["created_at"] = datetime.utcnow().isoformat(); projs.append(info)
-    save_json(projs, JSON_PATH)
+    return get_storage().save_project(info, resumo_kpis(info))
 def load_project(pid):
-    project_data = next((p for p in load_json(JSON_PATH) if p["id"] == pid), None)
+    return normalize_project(get_storage().load_project(pid))
+def normalize_project(project_data):
+    """Converte percentuais no formato antigo (número) para {"percentual": ..., "fonte": ...}."""
     if project_data and 'etapas_percentuais' in project_data:
         etapas = project_data['etapas_percentuais']
         if etapas and isinstance(list(etapas.values())[0], (int, float)):
@@ -106,39 +189,136 @@ def load_project(pid):
             project_data['custos_indiretos_percentuais'] = {k: {"percentual": v, "fonte": "Manual"} for k, v in custos.items()}
     return project_data
 def delete_project(pid):
-    projs = [p for p in load_json(JSON_PATH) if p["id"] != pid]; save_json(projs, JSON_PATH)
+    get_storage().delete_project(pid)
+def load_historico(tipo_custo):
+    # Lista compartilhada pelo cache do processo: somente leitura
+    return obter_historico(tipo_custo).entradas
 def save_to_historico(info, tipo_custo):
-    path = HISTORICO_DIRETO_PATH if tipo_custo == 'direto' else HISTORICO_INDIRETO_PATH
     session_key = 'etapas_percentuais' if tipo_custo == 'direto' else 'custos_indiretos_percentuais'
-    historico = load_json(path)
     percentuais = {k: v['percentual'] for k, v in info[session_key].items()}
-    nova_entrada = { "id": (max(p["id"] for p in historico) + 1) if historico else 1, "nome": info["nome"],
-        "data": datetime.now().strftime("%Y-%m-%d"), "percentuais": percentuais }
-    historico.append(nova_entrada)
-    save_json(historico, path)
+    atributos, mix = atributos_projeto(info)
+    nova_entrada = { "nome": info["nome"], "data": datetime.now().strftime("%Y-%m-%d"), "percentuais": percentuais,
+                     "atributos": atributos, "mix_pavimentos": mix }
+    storage = get_storage()
+    storage.append_historico(tipo_custo, nova_entrada)
+    invalidar_historico(tipo_custo)
+    registrar_colunar(tipo_custo, nova_entrada, storage)
     st.toast(f"Custos {tipo_custo} de '{info['nome']}' arquivados no histórico!", icon="📚")
 
 def render_metric_card(title, value, color="#31708f"):
     return f"""<div style="background-color:{color}; border-radius:6px; padding:15px; text-align:center; height:100%;"><div style="color:#fff; font-size:16px; margin-bottom:4px;">{title}</div><div style="color:#fff; font-size:24px; font-weight:bold;">{value}</div></div>"""
 
-def handle_percentage_redistribution(session_key, constants_dict):
+def project_bounded_simplex(valores, minimos, maximos, total, pesos=None, fixos=None):
+    """
+    Projeta `valores` no conjunto {x : minimos <= x <= maximos, soma(x) = total},
+    mantendo os itens marcados em `fixos` (máscara booleana) inalterados.
+    A solução tem a forma x_i = clip(valores_i - tau * pesos_i, min_i, max_i): com pesos
+    proporcionais aos valores anteriores, a diferença é repartida proporcionalmente, como
+    antes, mas sem quebrar o total quando algum item encosta no limite. O tau é achado
+    ordenando os pontos de quebra de cada item, em O(n log n).
+    Se o total não couber nos limites dos itens livres, eles ficam no limite mais próximo.
+    """
+    y = np.asarray(valores, dtype=float)
+    lo, hi = np.asarray(minimos, dtype=float), np.asarray(maximos, dtype=float)
+    fixos = np.zeros(len(y), dtype=bool) if fixos is None else np.asarray(fixos, dtype=bool)
+    w = np.ones(len(y)) if pesos is None else np.asarray(pesos, dtype=float)
+    livres = ~fixos & (hi > lo)
+    w = np.where(livres & (w > 0), w, 0.0)
+    if livres.any() and not (w > 0).any():
+        w = livres.astype(float)  # sem pesos válidos: repartição igual entre os livres
+    livres &= w > 0
+    x = np.clip(y, lo, hi)
+    x[fixos] = y[fixos]
+    alvo = total - x[~livres].sum()
+    yl, lol, hil, wl = y[livres], lo[livres], hi[livres], w[livres]
+    if alvo >= hil.sum():
+        x[livres] = hil
+        return x
+    if alvo <= lol.sum():
+        x[livres] = lol
+        return x
+    # g(tau) = soma(clip(y - tau*w, lo, hi)) é linear por partes e decrescente; quebras em
+    # (y - hi)/w (o item deixa o máximo) e (y - lo)/w (o item chega ao mínimo)
+    quebras = np.concatenate([(yl - hil) / wl, (yl - lol) / wl])
+    inclinacao = np.concatenate([-wl, wl])
+    ordem = np.argsort(quebras, kind="stable")
+    quebras, inclinacao = quebras[ordem], np.cumsum(inclinacao[ordem])
+    g = hil.sum() + np.concatenate([[0.0], np.cumsum(inclinacao[:-1] * np.diff(quebras))])
+    k = int(np.searchsorted(-g, -alvo))  # primeira quebra com g <= alvo
+    tau = quebras[k] if g[k] == alvo or inclinacao[k - 1] == 0 else quebras[k - 1] + (g[k - 1] - alvo) / -inclinacao[k - 1]
+    xl = np.clip(yl - tau * wl, lol, hil)
+    # Resíduo de arredondamento vai para o item livre com mais folga
+    residuo = alvo - xl.sum()
+    folga = np.where(residuo > 0, hil - xl, xl - lol)
+    xl[np.argmax(folga)] += residuo
+    x[livres] = xl
+    return x
+
+def handle_percentage_redistribution(session_key, constants_dict, fixos=()):
+    """
+    Após a edição de um item em st.session_state[session_key], ajusta os demais para
+    manter o total anterior, dentro dos limites (mín, máx) de `constants_dict`. O item
+    editado e os itens em `fixos` não são alterados (o editado é limitado ao intervalo
+    possível). Não força rerun: chame de um callback do widget (on_change) para que a
+    edição custe uma única execução da página. Retorna o item editado, ou None.
+    """
     previous_key = f"previous_{session_key}"
     if previous_key not in st.session_state: st.session_state[previous_key] = {k: v.copy() for k, v in st.session_state[session_key].items()}
     current, previous = st.session_state[session_key], st.session_state[previous_key]
-    if current == previous: return
+    if current == previous: return None
     changed_item_key = next((k for k, v in current.items() if v['percentual'] != previous.get(k, {}).get('percentual')), None)
-    if not changed_item_key: return
+    if not changed_item_key: return None
     st.session_state.redistribution_occured = True
-    delta = current[changed_item_key]['percentual'] - previous[changed_item_key]['percentual']
-    total_others = sum(v['percentual'] for k, v in previous.items() if k != changed_item_key)
-    if total_others > 0:
-        for item, values in current.items():
-            if item != changed_item_key:
-                min_val, _, max_val = constants_dict[item]
-                proportion = previous[item]['percentual'] / total_others
-                new_percent = values['percentual'] - (delta * proportion)
-                current[item]['percentual'] = max(min_val, min(new_percent, max_val))
-    st.session_state[previous_key] = {k: v.copy() for k, v in current.items()}; st.rerun()
+    itens = list(current)
+    limites = np.array([constants_dict[k][::2] for k in itens], dtype=float)
+    fixo = np.array([k == changed_item_key or k in fixos for k in itens])
+    total = sum(previous.get(k, current[k])['percentual'] for k in itens)
+    # O item editado só pode ir até onde os itens livres conseguem compensar
+    i = itens.index(changed_item_key)
+    livres = ~fixo
+    resto = total - sum(current[k]['percentual'] for k, f in zip(itens, fixo) if f and k != changed_item_key)
+    minimo, maximo = max(limites[i, 0], resto - limites[livres, 1].sum()), min(limites[i, 1], resto - limites[livres, 0].sum())
+    current[changed_item_key]['percentual'] = float(min(max(current[changed_item_key]['percentual'], minimo), maximo))
+    novos = project_bounded_simplex(
+        [current[k]['percentual'] for k in itens], limites[:, 0], limites[:, 1], total,
+        pesos=[previous.get(k, current[k])['percentual'] for k in itens], fixos=fixo)
+    for k, valor in zip(itens, novos):
+        current[k]['percentual'] = float(valor)
+    st.session_state[previous_key] = {k: v.copy() for k, v in current.items()}
+    return changed_item_key
+
+def usar_catalogo(info, form_key):
+    from cost_catalog import aplicar_catalogo
+    if 'pavimentos' in st.session_state:
+        # Os coeficientes substituídos pelo padrão valem também para os pavimentos em edição
+        info['pavimentos'] = [p.copy() for p in st.session_state.pavimentos]
+    aplicar_catalogo(info, st.session_state[f"cat_regiao_{form_key}"], st.session_state[f"cat_mes_{form_key}"], st.session_state[f"cat_padrao_{form_key}"])
+    if 'pavimentos' in st.session_state:
+        st.session_state.pavimentos = info['pavimentos']
+        st.session_state.pavimentos_versao = st.session_state.get('pavimentos_versao', 0) + 1
+
+def render_catalogo_custos(info, form_key):
+    """Escolha do custo de construção no catálogo (padrão, região e mês de referência)."""
+    from cost_catalog import PADRAO_BASE, PADROES, obter_catalogo
+    try:
+        catalogo = obter_catalogo()
+    except (OSError, ValueError) as e:
+        st.caption(f"Catálogo de custos indisponível: {e}")
+        return
+    escolha = info.get('custos_config', {}).get('catalogo') or {}
+    st.caption("Catálogo de custos")
+    regioes, meses = catalogo.regioes, catalogo.meses[::-1] or [None]
+    st.selectbox("Região", regioes, index=regioes.index(escolha['regiao']) if escolha.get('regiao') in regioes else 0, key=f"cat_regiao_{form_key}")
+    st.selectbox("Mês de referência", meses, index=meses.index(escolha['mes']) if escolha.get('mes') in meses else 0,
+                 format_func=lambda m: "Valores-base" if m is None else m, key=f"cat_mes_{form_key}")
+    padroes = catalogo.padroes
+    padrao = escolha.get('padrao') if escolha.get('padrao') in padroes else PADRAO_BASE if PADRAO_BASE in padroes else padroes[0]
+    st.selectbox("Padrão", padroes, index=padroes.index(padrao), format_func=lambda p: PADROES.get(p, p), key=f"cat_padrao_{form_key}")
+    padrao = st.session_state[f"cat_padrao_{form_key}"]
+    p = catalogo.indice_padrao[padrao]
+    custo = catalogo.custo_m2(st.session_state[f"cat_regiao_{form_key}"], st.session_state[f"cat_mes_{form_key}"], padrao) * catalogo.fator[p]
+    st.caption(f"R$ {fmt_br(custo)}/m² (fator de área {catalogo.fator[p]:.2f})")
+    st.button("Usar custo do catálogo", use_container_width=True, key=f"cat_usar_{form_key}", on_click=usar_catalogo, args=(info, form_key))
 
 def render_sidebar(form_key):
     st.sidebar.title("Estudo de Viabilidade")
@@ -164,6 +344,7 @@ def render_sidebar(form_key):
             custos_config['custo_terreno_m2'] = st.number_input("Custo do Terreno por m² (R$)", min_value=0.0, value=custos_config.get('custo_terreno_m2', 2500.0), format="%.2f")
             custos_config['custo_area_privativa'] = st.number_input("Custo de Construção (R$/m² privativo)", min_value=0.0, value=custos_config.get('custo_area_privativa', 4500.0), step=100.0, format="%.2f")
             info['custos_config'] = custos_config
+            render_catalogo_custos(info, form_key)
         st.sidebar.divider()
         if st.sidebar.button("💾 Salvar Todas as Alterações", use_container_width=True, type="primary"):
             if 'etapas_percentuais' in st.session_state: info['etapas_percentuais'] = st.session_state.etapas_percentuais
@@ -180,10 +361,63 @@ def render_sidebar(form_key):
                 if key in st.session_state: del st.session_state[key]
             st.switch_page("Início.py")
 
-def generate_pdf_report(info, vgv_total, valor_total_despesas, lucratividade_valor, lucratividade_percentual,
-                       custo_direto_total, custo_indireto_calculado, custo_terreno_total, area_construida_total,
-                       custos_config, custos_indiretos_percentuais, pavimentos_df, custo_indireto_obra_total):
-    
+# Incrementar sempre que o HTML/CSS do relatório mudar, para invalidar os PDFs em cache.
+# O HTML não pode depender de nada fora da chave, senão um acerto serve conteúdo desatualizado: por isso a
+# capa mostra só o dia da geração, que entra na chave.
+REPORT_TEMPLATE_VERSION = 4
+PDF_CACHE_DIR = os.environ.get("PDF_CACHE_DIR", os.path.join(".cache", "pdf"))
+PDF_CACHE_MAX_MB = float(os.environ.get("PDF_CACHE_MAX_MB", 256))
+pdf_cache = DiskCache(PDF_CACHE_DIR, PDF_CACHE_MAX_MB * 1024 * 1024, sufixo=".pdf")
+
+def report_cache_key(info, modelo, data=None):
+    """Chave do relatório: entradas do cálculo, nome do projeto, versão do template e dia da geração (padrão: hoje)."""
+    from viability import hash_entradas
+    data = data or datetime.now().strftime('%d/%m/%Y')
+    return hash_chave(REPORT_TEMPLATE_VERSION, info.get('nome'), modelo.chave or hash_entradas(info), data)
+
+def generate_pdf_report(info, modelo):
+    """Retorna o PDF do relatório, reaproveitando o cache em disco quando o projeto não mudou."""
+    data = datetime.now().strftime('%d/%m/%Y')
+    chave = report_cache_key(info, modelo, data)
+    pdf = pdf_cache.get(chave)
+    if pdf is None:
+        pdf = render_pdf(build_report_html(info, modelo, data))
+        pdf_cache.set(chave, pdf)
+    return pdf
+
+# Fontes e CSS do relatório ficam em assets/, sem nenhum acesso à rede durante a renderização
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+REPORT_CSS_PATH = os.path.join(ASSETS_DIR, "report.css")
+_render_lock = threading.Lock()
+_recursos_render = None
+
+def get_render_resources():
+    """`FontConfiguration` e folha de estilo do relatório, criadas uma única vez por processo."""
+    global _recursos_render
+    if _recursos_render is None:
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+        font_config = FontConfiguration()
+        _recursos_render = (font_config, CSS(filename=REPORT_CSS_PATH, font_config=font_config))
+    return _recursos_render
+
+def render_pdf(html_string):
+    """Renderiza o HTML do relatório reaproveitando fontes e CSS já carregados no processo."""
+    from weasyprint import HTML
+    with _render_lock:
+        font_config, css = get_render_resources()
+        return HTML(string=html_string, base_url=ASSETS_DIR).write_pdf(stylesheets=[css], font_config=font_config)
+
+def build_report_html(info, modelo, data=None):
+    """Monta o HTML do relatório a partir do projeto e do seu `ViabilityModel` já calculado; `data` é o dia exibido na capa."""
+    custos_config = info.get('custos_config', {})
+    pavimentos_df = modelo.pavimentos_df
+    vgv_total, valor_total_despesas = modelo.vgv_total, modelo.valor_total_despesas
+    lucratividade_valor, lucratividade_percentual = modelo.lucratividade_valor, modelo.lucratividade_percentual
+    custo_direto_total, custo_indireto_calculado = modelo.custo_direto_total, modelo.custo_indireto_calculado
+    custo_terreno_total, custo_indireto_obra_total = modelo.custo_terreno_total, modelo.custo_indireto_obra_total
+    area_construida_total = modelo.area_construida_total
+
     def create_html_card(title, value, color):
         return f"""
         <td style="background-color: {color}; color: white; border-radius: 8px; padding: 15px; text-align: center; width: 25%;">
@@ -224,18 +458,21 @@ def generate_pdf_report(info, vgv_total, valor_total_despesas, lucratividade_val
         total_area_eq = pavimentos_df["area_eq"].sum()
         total_area_constr = pavimentos_df["area_constr"].sum()
         
-        for index, row in pavimentos_df.iterrows():
-            tabela_pavimentos_html += f"""
+        # Colunas formatadas em lote; as linhas são montadas de uma vez com join
+        colunas = zip(pavimentos_df['nome'].tolist(), pavimentos_df['tipo'].tolist(), pavimentos_df['rep'].tolist(),
+                      pavimentos_df['coef'].tolist(), fmt_br_array(pavimentos_df['area']),
+                      fmt_br_array(pavimentos_df['area_eq']), fmt_br_array(pavimentos_df['area_constr']))
+        tabela_pavimentos_html += "".join(f"""
             <tr>
-                <td>{row['nome']}</td>
-                <td>{row['tipo']}</td>
-                <td style="text-align: center;">{row['rep']}</td>
-                <td style="text-align: right;">{row['coef']:.2f}</td>
-                <td style="text-align: right;">{fmt_br(row['area'])} m²</td>
-                <td style="text-align: right;">{fmt_br(row['area_eq'])} m²</td>
-                <td style="text-align: right;">{fmt_br(row['area_constr'])} m²</td>
+                <td>{nome}</td>
+                <td>{tipo}</td>
+                <td style="text-align: center;">{rep}</td>
+                <td style="text-align: right;">{coef:.2f}</td>
+                <td style="text-align: right;">{area} m²</td>
+                <td style="text-align: right;">{area_eq} m²</td>
+                <td style="text-align: right;">{area_constr} m²</td>
             </tr>
-            """
+            """ for nome, tipo, rep, coef, area, area_eq, area_constr in colunas)
         # Adiciona a linha de total
         tabela_pavimentos_html += f"""
         <tr style="font-weight: bold; background-color: #f2f2f2;">
@@ -250,9 +487,7 @@ def generate_pdf_report(info, vgv_total, valor_total_despesas, lucratividade_val
     if info.get('etapas_percentuais'):
         total_custo_etapas = 0
         total_percentual_etapas = 0
-        for etapa, (min_val, default_val, max_val) in ETAPAS_OBRA.items():
-            percentual = info['etapas_percentuais'].get(etapa, {}).get('percentual', 0)
-            custo = custo_direto_total * (float(percentual) / 100)
+        for etapa, (percentual, custo) in modelo.custos_etapas.items():
             tabela_etapas_html += f"""
             <tr>
                 <td>{etapa}</td>
@@ -272,12 +507,10 @@ def generate_pdf_report(info, vgv_total, valor_total_despesas, lucratividade_val
         """
     
     # Criar tabela de custos indiretos
-    if custos_indiretos_percentuais:
+    if modelo.custos_indiretos:
         total_custo_indireto = 0
         total_percentual_indireto = 0
-        for item, values in custos_indiretos_percentuais.items():
-            percentual = values.get('percentual', 0)
-            custo = vgv_total * (float(percentual) / 100)
+        for item, (percentual, custo) in modelo.custos_indiretos.items():
             tabela_custos_indiretos_html += f"""
             <tr>
                 <td>{item}</td>
@@ -296,103 +529,21 @@ def generate_pdf_report(info, vgv_total, valor_total_despesas, lucratividade_val
         </tr>
         """
     
-    relacao_ac_priv = area_construida_total / info.get('area_privativa', 1) if info.get('area_privativa', 1) > 0 else 0
+    relacao_ac_priv = modelo.relacao_ac_priv
     
     html_string = f"""
     <html>
     <head>
         <meta charset="UTF-8">
-        <link href="https://fonts.googleapis.com/css2?family=Roboto:wght@400;700&display=swap" rel="stylesheet">
         <style>
-            @page {{
-                size: A4;
-                margin: 1.5cm;
-                @top-center {{
-                    content: "Relatório de Viabilidade - {info.get('nome', 'N/A')}";
-                    font-family: 'Roboto', sans-serif;
-                    font-size: 14px;
-                    color: #888;
-                }}
-                @bottom-right {{
-                    content: "Página " counter(page) " de " counter(pages);
-                    font-family: 'Roboto', sans-serif;
-                    font-size: 10px;
-                    color: #888;
-                }}
-            }}
-            body {{
-                font-family: 'Roboto', sans-serif;
-                color: #333;
-            }}
-            .cover-page {{
-                height: 100%;
-                display: flex;
-                flex-direction: column;
-                justify-content: center;
-                align-items: center;
-                text-align: center;
-                page-break-after: always;
-            }}
-            .cover-page h1 {{
-                font-size: 36px;
-                color: #1a5276;
-                margin-bottom: 20px;
-            }}
-            .cover-page h2 {{
-                font-size: 28px;
-                color: #1f618d;
-                margin-bottom: 40px;
-            }}
-            .cover-page p {{
-                font-size: 16px;
-                color: #555;
-            }}
-            .page-break {{
-                page-break-before: always;
-            }}
-            h2.section-title {{
-                color: #1f618d;
-                border-bottom: 2px solid #aed6f1;
-                padding-bottom: 5px;
-                margin-top: 30px;
-                margin-bottom: 20px;
-            }}
-            table.card-container {{
-                width: 100%;
-                border-spacing: 10px;
-                margin-bottom: 20px;
-            }}
-            table.data-table {{
-                width: 100%;
-                border-collapse: collapse;
-                margin-top: 20px;
-            }}
-            table.data-table th, table.data-table td {{
-                border: 1px solid #ddd;
-                padding: 8px;
-                text-align: left;
-            }}
-            table.data-table th {{
-                background-color: #f2f2f2;
-                font-weight: bold;
-                font-size: 11px;
-            }}
-            table.data-table td {{
-                font-size: 10px;
-            }}
-            table.data-table tbody tr:nth-child(odd) {{
-                background-color: #f9f9f9;
-            }}
-            table.data-table tbody tr:hover {{
-                background-color: #f1f1f1;
-            }}
+            @page {{ @top-center {{ content: "Relatório de Viabilidade - {info.get('nome', 'N/A')}"; }} }}
         </style>
     </head>
     <body>
         <div class="cover-page">
             <h1>Relatório de Viabilidade de Empreendimento</h1>
             <h2>{info.get('nome', 'N/A')}</h2>
-            <p>Gerado em: {datetime.now().strftime('%d/%m/%Y %H:%M')}</p>
+            <p>Gerado em: {data or datetime.now().strftime('%d/%m/%Y')}</p>
         </div>
         
         <h2 class="section-title">Resumo Financeiro e de Área</h2>
@@ -477,4 +628,4 @@ def generate_pdf_report(info, vgv_total, valor_total_despesas, lucratividade_val
     </body>
     </html>
     """
-    return HTML(string=html_string).write_pdf()
+    return html_string
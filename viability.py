@@ -0,0 +1,183 @@
+# viability.py
+"""
+Motor de cálculo de viabilidade, independente do Streamlit.
+
+Recebe o dicionário de um projeto (como retornado por `load_project`) e calcula
+todos os totais e indicadores exibidos nas páginas e no relatório PDF. Os
+resultados são memorizados por um hash do conteúdo das entradas, de modo que
+reruns sem alteração no projeto são apenas uma consulta ao cache.
+"""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+
+from utils import ETAPAS_OBRA
+
+# Campos do projeto que influenciam o cálculo (e, portanto, a chave do cache)
+CAMPOS_CALCULO = (
+    "area_terreno", "area_privativa", "num_unidades", "custos_config", "pavimentos",
+    "etapas_percentuais", "custos_indiretos_percentuais", "custos_indiretos_obra", "duracao_obra",
+)
+CACHE_MAX_ITENS = 256
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def _percentual(valor):
+    """Aceita tanto o formato antigo (número) quanto o novo ({"percentual": ..., "fonte": ...})."""
+    if isinstance(valor, dict):
+        valor = valor.get('percentual', 0)
+    return float(valor or 0)
+
+
+def hash_entradas(info):
+    """Hash estável (sha256) apenas dos campos de `info` usados no cálculo."""
+    entradas = {campo: info.get(campo) for campo in CAMPOS_CALCULO}
+    payload = json.dumps(entradas, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def calcular_pavimentos(pavimentos, custo_area_privativa):
+    """Monta o DataFrame de pavimentos com as colunas derivadas, de forma vetorizada."""
+    if not pavimentos:
+        return pd.DataFrame()
+    # Colunas montadas a partir dos registros e o DataFrame criado de uma vez (inserir colunas uma a uma é lento)
+    campos = list(dict.fromkeys(k for p in pavimentos for k in p))
+    colunas = {campo: [p.get(campo) for p in pavimentos] for campo in campos}
+    area = np.asarray(colunas["area"], dtype=float)
+    rep = np.asarray(colunas["rep"], dtype=float)
+    coef = np.asarray(colunas["coef"], dtype=float)
+    constr = np.asarray(colunas["constr"], dtype=bool) if "constr" in colunas else np.ones(len(pavimentos), dtype=bool)
+    area_total = area * rep
+    area_eq = area_total * coef
+    colunas["area_total"] = area_total
+    colunas["area_eq"] = area_eq
+    colunas["area_constr"] = np.where(constr, area_total, 0.0)
+    colunas["custo_direto"] = area_eq * custo_area_privativa
+    return pd.DataFrame(colunas)
+
+
+class ViabilityModel:
+    """
+    Totais e indicadores de viabilidade de um projeto.
+
+    As instâncias obtidas por `from_project` são compartilhadas entre sessões
+    através do cache; trate os atributos (inclusive `pavimentos_df`) como somente leitura.
+    """
+
+    def __init__(self, info):
+        self.chave = None
+        custos_config = info.get('custos_config', {}) or {}
+        self.custo_area_privativa = float(custos_config.get('custo_area_privativa', 4500.0))
+        self.preco_medio_venda_m2 = float(custos_config.get('preco_medio_venda_m2', 10000.0))
+        self.custo_terreno_m2 = float(custos_config.get('custo_terreno_m2', 2500.0))
+        self.area_privativa = float(info.get('area_privativa', 0) or 0)
+        self.area_terreno = float(info.get('area_terreno', 0) or 0)
+        self.num_unidades = int(info.get('num_unidades', 0) or 0)
+        self.duracao_obra = int(info.get('duracao_obra', 12))
+        # Custos mensais de obra efetivamente usados. Sem valores no projeto não há custo: o padrão
+        # (DEFAULT_CUSTOS_INDIRETOS_OBRA) só entra quando as páginas de custos o colocam na sessão
+        self.custos_indiretos_obra = dict(info.get('custos_indiretos_obra') or {})
+
+        # --- Pavimentos ---
+        self.pavimentos_df = calcular_pavimentos(info.get('pavimentos', []), self.custo_area_privativa)
+        if self.pavimentos_df.empty:
+            self.custo_direto_total = 0.0
+            self.area_construida_total = 0.0
+            self.area_equivalente_total = 0.0
+            self.custo_por_tipo = pd.DataFrame(columns=["tipo", "custo_direto"])
+        else:
+            self.custo_direto_total = float(self.pavimentos_df["custo_direto"].sum())
+            self.area_construida_total = float(self.pavimentos_df["area_constr"].sum())
+            self.area_equivalente_total = float(self.pavimentos_df["area_eq"].sum())
+            self.custo_por_tipo = self.pavimentos_df.groupby("tipo")["custo_direto"].sum().reset_index()
+
+        # --- Receita e custos ---
+        self.vgv_total = self.area_privativa * self.preco_medio_venda_m2
+
+        etapas = info.get('etapas_percentuais', {}) or {}
+        self.custos_etapas = {}
+        for etapa in ETAPAS_OBRA:
+            percentual = _percentual(etapas.get(etapa, 0))
+            self.custos_etapas[etapa] = (percentual, self.custo_direto_total * percentual / 100)
+
+        indiretos = info.get('custos_indiretos_percentuais', {}) or {}
+        self.custos_indiretos = {item: (_percentual(v), self.vgv_total * _percentual(v) / 100) for item, v in indiretos.items()}
+        self.custo_indireto_calculado = sum(custo for _, custo in self.custos_indiretos.values())
+
+        self.custo_mensal_obra = float(sum(self.custos_indiretos_obra.values()))
+        self.custo_indireto_obra_total = self.custo_mensal_obra * self.duracao_obra
+        self.custo_terreno_total = self.area_terreno * self.custo_terreno_m2
+
+        # --- Totais ---
+        self.valor_total_despesas = (self.custo_direto_total + self.custo_indireto_calculado
+                                     + self.custo_terreno_total + self.custo_indireto_obra_total)
+        self.lucratividade_valor = self.vgv_total - self.valor_total_despesas
+        self.lucratividade_percentual = (self.lucratividade_valor / self.vgv_total) * 100 if self.vgv_total > 0 else 0
+
+        # --- Indicadores ---
+        total, ac = self.valor_total_despesas, self.area_construida_total
+        self.p_direto = self.custo_direto_total / total * 100 if total > 0 else 0
+        self.p_indireto_venda = self.custo_indireto_calculado / total * 100 if total > 0 else 0
+        self.p_indireto_obra = self.custo_indireto_obra_total / total * 100 if total > 0 else 0
+        self.p_terreno = self.custo_terreno_total / total * 100 if total > 0 else 0
+        self.custo_direto_m2 = self.custo_direto_total / ac if ac > 0 else 0
+        self.custo_indireto_m2 = (self.custo_indireto_calculado + self.custo_indireto_obra_total) / ac if ac > 0 else 0
+        self.custo_total_m2 = total / ac if ac > 0 else 0
+        self.custo_medio_unidade = self.custo_direto_total / self.num_unidades if self.num_unidades > 0 else 0
+        self.relacao_ac_priv = ac / self.area_privativa if self.area_privativa > 0 else 0
+
+    @classmethod
+    def from_project(cls, info):
+        """Retorna o modelo do projeto, reaproveitando o resultado se as entradas não mudaram."""
+        chave = hash_entradas(info)
+        with _cache_lock:
+            modelo = _cache.get(chave)
+            if modelo is not None:
+                _cache.move_to_end(chave)
+                return modelo
+        modelo = cls(info)
+        modelo.chave = chave
+        with _cache_lock:
+            _cache[chave] = modelo
+            while len(_cache) > CACHE_MAX_ITENS:
+                _cache.popitem(last=False)
+        return modelo
+
+    def indicadores(self):
+        """Dicionário com os KPIs escalares (útil para exportação e prompts)."""
+        return {
+            "vgv_total": self.vgv_total,
+            "custo_total": self.valor_total_despesas,
+            "lucro_bruto": self.lucratividade_valor,
+            "margem_lucro_percentual": self.lucratividade_percentual,
+            "custo_direto": self.custo_direto_total,
+            "custo_indireto_venda": self.custo_indireto_calculado,
+            "custo_indireto_obra": self.custo_indireto_obra_total,
+            "custo_terreno": self.custo_terreno_total,
+            "area_privativa": self.area_privativa,
+            "area_terreno": self.area_terreno,
+            "area_construida": self.area_construida_total,
+            "p_direto": self.p_direto,
+            "p_indireto_venda": self.p_indireto_venda,
+            "p_indireto_obra": self.p_indireto_obra,
+            "p_terreno": self.p_terreno,
+            "custo_direto_m2": self.custo_direto_m2,
+            "custo_indireto_m2": self.custo_indireto_m2,
+            "custo_total_m2": self.custo_total_m2,
+        }
+
+
+def compute_viability(info):
+    """Atalho para `ViabilityModel.from_project`."""
+    return ViabilityModel.from_project(info)
+
+
+def limpar_cache():
+    with _cache_lock:
+        _cache.clear()